@@ -0,0 +1,275 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+# ================== SETTINGS ==================
+# Mirrors the constants hard-coded in tjr v2.py
+DEFAULTS = {
+    "min_rr": 2.0,
+    "risk_percent": 1.0,
+    "disp_window": 20,
+    "disp_mult": 1.5,
+    "ob_window": 10,
+    "ob_mult": 1.5,
+    "ob_lookback": 500,  # BARS: the live OB scan only sees the fetched window
+    "key_level_pct": 0.03,
+    "killzones": ((8 * 60, 11 * 60), (13 * 60 + 30, 16 * 60 + 30)),  # UTC minutes
+    "server_offset": 0,  # Broker server time minus UTC, in seconds
+    "breakeven": True,
+    "spread": 0.0,  # Price units paid on entry
+}
+LTF_SECONDS = 300
+HTF_SECONDS = 14400
+
+
+# ================== DATA ==================
+def load_csv(path):
+    df = pd.read_csv(path)
+    if not np.issubdtype(df['time'].dtype, np.number):
+        df['time'] = pd.to_datetime(df['time']).astype('int64') // 10**9
+    return df
+
+
+def _columns(bars):
+    # Works for DataFrames, dicts of arrays and MT5 structured arrays alike
+    t = np.asarray(bars['time'], dtype=np.int64)
+    o, h, l, c = (np.asarray(bars[k], dtype=np.float64) for k in ('open', 'high', 'low', 'close'))
+    return t, o, h, l, c
+
+
+def rolling_mean(x, window):
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        csum = np.cumsum(np.insert(x, 0, 0.0))
+        out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def _last_index(mask):
+    # Index of the most recent True at or before each position, -1 if none
+    idx = np.where(mask, np.arange(len(mask)), -1)
+    return np.maximum.accumulate(idx)
+
+
+# ================== GATES ==================
+def displacement(o, c, window, mult):
+    bodies = np.abs(c - o)
+    avg = rolling_mean(bodies, window)
+    with np.errstate(invalid='ignore'):
+        return bodies > avg * mult
+
+
+def htf_bias(h4, decision_times):
+    # +1 bullish / -1 bearish / 0 none, as market_structure() would return
+    # from the H4 bars known at each decision time. A pivot is only known
+    # once the bar after it has closed, so there is no lookahead.
+    t, _, h, l, _ = _columns(h4)
+    n = len(t)
+    out = np.zeros(len(decision_times), dtype=np.int8)
+    if n < 3:
+        return out
+    ph = np.zeros(n, dtype=bool)
+    pl = np.zeros(n, dtype=bool)
+    ph[1:-1] = (h[:-2] < h[1:-1]) & (h[2:] < h[1:-1])
+    pl[1:-1] = (l[:-2] > l[1:-1]) & (l[2:] > l[1:-1])
+
+    def last_two(pivots, values):
+        idx = np.flatnonzero(pivots)
+        if len(idx) < 2:
+            return None
+        known = t[idx + 1] + HTF_SECONDS
+        k = np.searchsorted(known, decision_times, side='right') - 1
+        ok = k >= 1
+        k = np.maximum(k, 1)
+        return ok, values[idx][k], values[idx][k - 1]
+
+    highs, lows = last_two(ph, h), last_two(pl, l)
+    if highs is None or lows is None:
+        return out
+    ok = highs[0] & lows[0]
+    hh, lh = highs[1] > highs[2], highs[1] < highs[2]
+    hl, ll = lows[1] > lows[2], lows[1] < lows[2]
+    out[ok & hh & hl] = 1
+    out[ok & lh & (ll | hl)] = -1  # BEARISH_BOS or BEARISH_CHOCH
+    return out
+
+
+def key_levels(h1, decision_times):
+    # Previous server-day high/low from the H1 bars, as get_key_levels()
+    t, _, h, l, _ = _columns(h1)
+    days, starts = np.unique(t // 86400, return_index=True)
+    day_high = np.maximum.reduceat(h, starts)
+    day_low = np.minimum.reduceat(l, starts)
+    k = np.searchsorted(days, decision_times // 86400, side='left') - 1
+    ok = k >= 0
+    k = np.maximum(k, 0)
+    return ok, day_high[k], day_low[k]
+
+
+def in_killzones(decision_times, killzones, server_offset):
+    secs = (decision_times - server_offset) % 86400
+    inside = np.zeros(len(decision_times), dtype=bool)
+    for start, end in killzones:
+        inside |= (secs >= start * 60) & (secs <= end * 60)
+    return inside
+
+
+def signals(m5, h1, h4, corr=None, **params):
+    # Whole-series boolean gates. Bar j is judged at its close with bars <= j.
+    p = dict(DEFAULTS, **params)
+    t, o, h, l, c = _columns(m5)
+    n = len(t)
+    decision = t + LTF_SECONDS
+
+    bias = htf_bias(h4, decision)
+    bull, bear = bias > 0, bias < 0
+
+    ok_levels, key_high, key_low = key_levels(h1, decision)
+    band = (key_high - key_low) * p["key_level_pct"]
+    near = ok_levels & ((np.abs(c - key_high) < band) | (np.abs(c - key_low) < band))
+
+    disp = displacement(o, c, p["disp_window"], p["disp_mult"])
+    smt = disp & ((bull & (c > o)) | (bear & (c < o)))
+    if corr is not None:
+        tc, oc, _, _, cc = _columns(corr)
+        corr_disp = displacement(oc, cc, p["disp_window"], p["disp_mult"])
+        pos = np.minimum(np.searchsorted(tc, t), len(tc) - 1)
+        smt &= ~((tc[pos] == t) & corr_disp[pos])
+
+    sweep = (bull & (l < key_low)) | (bear & (h > key_high))
+
+    fvg = np.zeros(n, dtype=bool)
+    fvg[2:] = (bull[2:] & (l[2:] > h[:-2])) | (bear[2:] & (h[2:] < l[:-2]))
+
+    # Last strong candle only; the live bot also retraces into older zones
+    # that are still unmitigated (zones.py), so it can take more entries
+    bodies = np.abs(c - o)
+    with np.errstate(invalid='ignore'):
+        strong = bodies > rolling_mean(bodies, p["ob_window"]) * p["ob_mult"]
+    bull_ob = _last_index(strong & (c > o))
+    bear_ob = _last_index(strong & (c < o))
+    ob = np.where(bull, bull_ob, np.where(bear, bear_ob, -1))
+    has_ob = (ob >= 0) & (np.arange(n) - ob < p["ob_lookback"])
+    ob = np.maximum(ob, 0)
+    zone_low, zone_high = l[ob], h[ob]
+    retrace = has_ob & (zone_low <= c) & (c <= zone_high)
+
+    entry = (zone_low + zone_high) / 2
+    sl = np.where(bull, zone_low, zone_high)
+    tp = np.where(bull, key_high, key_low)
+    risk = np.abs(entry - sl)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rr_ok = (risk > 0) & (np.abs(entry - tp) / risk >= p["min_rr"])
+
+    gates = {
+        "killzone": in_killzones(decision, p["killzones"], p["server_offset"]),
+        "bias": bull | bear,
+        "near_key_level": near,
+        "smt": smt,
+        "sweep": sweep,
+        "displacement": disp,
+        "fvg_ob": fvg & has_ob,
+        "retrace": retrace,
+        "rr": rr_ok,
+    }
+    passed = np.ones(n, dtype=bool)
+    for mask in gates.values():
+        passed &= mask
+    return passed, bias, sl, tp, gates
+
+
+# ================== FILLS ==================
+def _first(cond, start, n, chunk=256):
+    # First index >= start where cond(lo, hi) is True, scanning in growing chunks
+    lo = start
+    while lo < n:
+        hi = min(n, lo + chunk)
+        hits = np.flatnonzero(cond(lo, hi))
+        if len(hits):
+            return lo + hits[0]
+        lo, chunk = hi, chunk * 2
+    return n
+
+
+def simulate(m5, passed, bias, sl, tp, **params):
+    p = dict(DEFAULTS, **params)
+    t, o, h, l, c = _columns(m5)
+    n = len(t)
+    trades = []
+    free_from = 0
+    for j in np.flatnonzero(passed):
+        k = j + 1  # Market order goes out as the next bar opens
+        if k < free_from or k >= n:
+            continue
+        d = int(bias[j])
+        fill = o[k] + p["spread"] * d
+        stop, target = sl[j], tp[j]
+        r = (fill - stop) * d
+        if r <= 0 or (target - fill) * d <= 0:
+            continue  # Broker would reject stops on the wrong side
+
+        if d > 0:
+            hit = lambda a, b, s: (l[a:b] <= s) | (h[a:b] >= target)
+            trigger = lambda a, b: h[a:b] >= fill + r
+        else:
+            hit = lambda a, b, s: (h[a:b] >= s) | (l[a:b] <= target)
+            trigger = lambda a, b: l[a:b] <= fill - r
+        exit_idx = _first(lambda a, b: hit(a, b, stop), k, n)
+        if p["breakeven"]:
+            be_idx = _first(trigger, k, n)
+            if be_idx < exit_idx:
+                stop = fill
+                exit_idx = _first(lambda a, b: hit(a, b, stop), be_idx + 1, n)
+
+        if exit_idx >= n:
+            exit_idx, exit_price, reason = n - 1, c[-1], "open"
+        else:
+            stop_hit = l[exit_idx] <= stop if d > 0 else h[exit_idx] >= stop
+            # Both touched in one bar: assume the stop filled first
+            exit_price, reason = (stop, "sl") if stop_hit else (target, "tp")
+            if stop_hit and stop == fill:
+                reason = "be"
+        trades.append((t[k], t[exit_idx], d, fill, sl[j], target, exit_price, reason,
+                       (exit_price - fill) * d / r))
+        free_from = exit_idx + 1
+
+    return pd.DataFrame(trades, columns=["entry_time", "exit_time", "direction", "entry", "sl",
+                                         "tp", "exit", "reason", "r"])
+
+
+def stats(trades, risk_percent=DEFAULTS["risk_percent"]):
+    r = trades["r"].to_numpy() if len(trades) else np.zeros(0)
+    equity = np.cumprod(1 + r * risk_percent / 100)
+    peak = np.maximum.accumulate(np.concatenate(([1.0], equity)))[1:]
+    gains, losses = r[r > 0].sum(), -r[r < 0].sum()
+    return {
+        "trades": len(r),
+        "win_rate": float((r > 0).mean()) if len(r) else 0.0,
+        "expectancy_r": float(r.mean()) if len(r) else 0.0,
+        "total_r": float(r.sum()),
+        "profit_factor": float(gains / losses) if losses else float("inf") if gains else 0.0,
+        "max_drawdown_pct": float(((peak - equity) / peak).max() * 100) if len(r) else 0.0,
+        "return_pct": float((equity[-1] - 1) * 100) if len(r) else 0.0,
+    }
+
+
+def run(m5, h1, h4, corr=None, **params):
+    passed, bias, sl, tp, gates = signals(m5, h1, h4, corr, **params)
+    trades = simulate(m5, passed, bias, sl, tp, **params)
+    result = stats(trades, params.get("risk_percent", DEFAULTS["risk_percent"]))
+    result["gates"] = {name: int(mask.sum()) for name, mask in gates.items()}
+    result["signals"] = int(passed.sum())
+    return trades, result
+
+
+# ================== CLI ==================
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print("usage: python backtest_v2.py m5.csv h1.csv h4.csv [correlated_m5.csv]")
+        sys.exit(1)
+    frames = [load_csv(path) for path in sys.argv[1:5]]
+    trades, result = run(*frames)
+    print(trades.to_string(index=False))
+    for key, value in result.items():
+        print(f"{key}: {value}")
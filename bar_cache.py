@@ -0,0 +1,208 @@
+from gateway import mt5
+import numpy as np
+import pandas as pd
+
+import bar_store
+import resample
+from features import FEATURES
+from scheduler import timeframe_seconds
+
+# ================== SETTINGS ==================
+PERSIST = True  # Warm-start from and append closed bars to bar_store
+DERIVE_FROM = mt5.TIMEFRAME_M5  # Build multiples of this locally; None fetches every timeframe
+
+
+# ================== ROLLING BAR STORE ==================
+class BarCache:
+    def __init__(self, symbol, timeframe, size=500, persist=PERSIST):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.size = size
+        self.capacity = size * 4  # Headroom so appends rarely compact
+        self.rates = None
+        self.count = 0
+        self.store = bar_store.get_store(symbol, timeframe) if persist else None
+
+    @property
+    def last_time(self):
+        return int(self.rates['time'][self.count - 1]) if self.count else None
+
+    def load(self):
+        if self.store is None:
+            return self.download()
+        # Closed bars from disk, then only the forming bar (and any missed) from the broker
+        self.store.sync(max(self.size, bar_store.HISTORY_BARS))
+        seed = self.store.rows(max(0, self.store.count - (self.size - 1)))
+        if not len(seed):
+            return self.download()
+        self.rates = np.empty(self.capacity, dtype=bar_store.RATES)
+        self.rates[:len(seed)] = seed
+        self.count = len(seed)
+        return self.update()
+
+    def download(self):
+        rates = mt5.copy_rates_from_pos(self.symbol, self.timeframe, 0, self.size)
+        if rates is None or len(rates) == 0:
+            return False
+        self.rates = np.empty(self.capacity, dtype=rates.dtype)
+        self.rates[:len(rates)] = rates
+        self.count = len(rates)
+        self.persist(0)
+        return True
+
+    def persist(self, start):
+        # Hand bars closed since `start` to the on-disk store
+        if self.store is None or self.count < 2:
+            return
+        if self.rates['time'][self.count - 2] > (self.store.last_time or -1):
+            self.store.append(self.rates[start:self.count - 1])
+
+    def update(self):
+        if not self.count:
+            return self.load()
+        last = self.last_time
+        n = 2  # Still-forming bar plus the one that may have just closed
+        while True:
+            fresh = mt5.copy_rates_from_pos(self.symbol, self.timeframe, 0, n)
+            if fresh is None or len(fresh) == 0:
+                return False
+            if fresh['time'][0] <= last:
+                break  # Overlaps the cache, nothing missed
+            if n >= self.size:
+                return self.download()  # Gap wider than the window, start over
+            n = min(n * 4, self.size)
+        # Overwrite from the first overlapping bar (the cached forming bar)
+        self.persist(self.put(fresh))
+        return True
+
+    def put(self, fresh):
+        # Write `fresh` over the cached bars from its first time on, compacting
+        # into a new buffer when this one is full (views handed out by
+        # window()/since() keep their bars); returns the index it landed at
+        times = self.rates['time'][:self.count]
+        start = int(np.searchsorted(times, fresh['time'][0]))
+        end = start + len(fresh)
+        if end > self.capacity:
+            rates = np.empty(self.capacity, dtype=self.rates.dtype)
+            rates[:self.size] = self.rates[start - self.size:start]
+            self.rates = rates
+            start, end = self.size, self.size + len(fresh)
+        self.rates[start:end] = fresh
+        self.count = end
+        return start
+
+    def window(self, bars, closed=False):
+        # Zero-copy view of the last `bars` bars, optionally without the forming one
+        end = self.count - 1 if closed else self.count
+        return self.rates[max(0, end - bars):end]
+
+    def since(self, time, closed=False):
+        # Zero-copy view of the bars opened after `time`
+        end = self.count - 1 if closed else self.count
+        start = int(np.searchsorted(self.rates['time'][:end], time, side='right'))
+        return self.rates[start:end]
+
+    def stamp(self, closed=False):
+        last = self.rates[self.count - 2 if closed else self.count - 1]
+        return int(last['time']), float(last['close']), int(last['tick_volume'])
+
+    def frame(self, bars, closed=False):
+        # One DataFrame per bar revision, shared by every caller in the cycle
+        slot, stamp = (self.symbol, self.timeframe, closed), self.stamp(closed)
+
+        def build():
+            df = pd.DataFrame(self.window(bars, closed))
+            df['time'] = pd.to_datetime(df['time'], unit='s')
+            return df
+        return FEATURES.get(slot, stamp, 'frame', (bars,), build)
+
+
+# ================== DERIVED TIMEFRAMES ==================
+class ResampledCache(BarCache):
+    # Higher timeframe built from the symbol's base cache: after the first
+    # build only the bucket(s) touched by new base bars are recomputed, so
+    # the broker is asked for one series per symbol instead of one per frame
+    def __init__(self, symbol, timeframe, size, base_timeframe):
+        super().__init__(symbol, timeframe, size, persist=False)
+        self.seconds = timeframe_seconds(timeframe)
+        self.base_timeframe = base_timeframe
+        self.ratio = self.seconds // timeframe_seconds(base_timeframe)
+        self.folded = None  # Time of the newest base bar aggregated so far
+
+    @property
+    def base(self):
+        # Looked up each time: the registry may swap in a larger base cache
+        return get_cache(self.symbol, self.base_timeframe, self.ratio * 2)
+
+    def load(self):
+        base = self.base
+        if not base.update():
+            return False
+        need = (self.size + 1) * self.ratio
+        store = base.store
+        if store is not None and store.count:
+            closed = store.rows(max(0, store.count - need))
+            history = np.concatenate((closed, base.since(int(closed['time'][-1]))))
+        else:
+            history = mt5.copy_rates_from_pos(self.symbol, self.base_timeframe, 0, need)
+            if history is None or len(history) == 0:
+                return False
+        bars = resample.aggregate(history, self.seconds)
+        if history['time'][0] != bars['time'][0]:
+            bars = bars[1:]  # History starts mid-bucket
+        bars = bars[-self.size:]
+        self.rates = np.empty(self.capacity, dtype=bars.dtype)
+        self.rates[:len(bars)] = bars
+        self.count = len(bars)
+        self.folded = int(history['time'][-1])
+        return self.count > 0
+
+    def update(self):
+        if not self.count:
+            return self.load()
+        base = self.base
+        if not base.update():
+            return False
+        first = int(resample.bucket(self.folded, self.seconds))
+        span = base.since(first - 1)
+        if not len(span) or span['time'][0] > self.folded:
+            return self.load()  # Base lost the bars we were folding (gap, reload)
+        self.put(resample.aggregate(span, self.seconds))  # The forming base bar changes every call
+        self.folded = int(span['time'][-1])
+        return True
+
+
+# ================== REGISTRY ==================
+_caches = {}
+
+
+def get_cache(symbol, timeframe, bars):
+    cache = _caches.get((symbol, timeframe))
+    if cache is None or cache.size < bars:
+        if DERIVE_FROM is not None and resample.derivable(timeframe_seconds(timeframe),
+                                                          timeframe_seconds(DERIVE_FROM)):
+            cache = ResampledCache(symbol, timeframe, bars, DERIVE_FROM)
+        else:
+            cache = BarCache(symbol, timeframe, bars)
+        _caches[(symbol, timeframe)] = cache
+    return cache
+
+
+def frame(symbol, timeframe, bars, closed=False):
+    # Refresh the store with only the bars newer than the cache and
+    # return the last `bars` bars, or None when the broker has no data
+    cache = get_cache(symbol, timeframe, bars + 1)
+    if not cache.update():
+        return None
+    return cache.frame(bars, closed)
+
+
+def rates(symbol, timeframe, bars, closed=False):
+    # The bots' bar window: a zero-copy structured view of the cache (time
+    # stays epoch seconds). A closed window never changes; an open one sees
+    # later updates of its forming bar. frame() is the DataFrame version,
+    # kept for bench.py's pandas reference path.
+    cache = get_cache(symbol, timeframe, bars + 1)
+    if not cache.update():
+        return None
+    return cache.window(bars, closed)
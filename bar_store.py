@@ -0,0 +1,173 @@
+from gateway import mt5
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+from scheduler import timeframe_seconds
+
+# ================== SETTINGS ==================
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bars")
+HISTORY_BARS = 50_000  # Pulled on a cold start
+MAX_BARS = 100_000  # Terminal's "Max bars in chart"; older gaps can't be refilled
+COLUMNS = (('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+           ('tick_volume', '<u8'), ('spread', '<i4'))
+# Layout returned by copy_rates_*; rows() fills real_volume with zeros
+RATES = np.dtype(list(COLUMNS) + [('real_volume', '<u8')])
+
+
+def timeframe_name(timeframe):
+    seconds = timeframe_seconds(timeframe)
+    for unit, size in (("W", 604800), ("D", 86400), ("H", 3600)):
+        if seconds % size == 0:
+            return f"{unit}{seconds // size}"
+    return f"M{seconds // 60}"
+
+
+def server_name():
+    info = mt5.account_info()
+    return getattr(info, 'server', None) or "default"
+
+
+# ================== COLUMN STORE ==================
+class BarStore:
+    # Closed bars only, one append-only raw column file per field under
+    # DATA_DIR/<server>/<symbol>_<timeframe>/. Reads are memory-mapped, so any range
+    # of years of M1 history is a zero-copy slice.
+    def __init__(self, symbol, timeframe, root=None):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        root = root or os.path.join(DATA_DIR, server_name())  # Brokers' bars differ, keep them apart
+        self.dir = os.path.join(root, f"{symbol}_{timeframe_name(timeframe)}")
+        self.maps = {}
+        self.mapped = 0
+        os.makedirs(self.dir, exist_ok=True)
+        self.count = self._recover()
+
+    def _path(self, field):
+        return os.path.join(self.dir, f"{field}.bin")
+
+    def _disk_count(self):
+        # Rows present in every column file
+        counts = []
+        for field, dtype in COLUMNS:
+            path = self._path(field)
+            counts.append(os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0)
+        return min(counts)
+
+    def _recover(self):
+        # A crash mid-append leaves some columns longer: cut them back
+        count = self._disk_count()
+        for field, dtype in COLUMNS:
+            path = self._path(field)
+            size = count * np.dtype(dtype).itemsize
+            if not os.path.exists(path) or os.path.getsize(path) != size:
+                with open(path, "ab") as f:
+                    f.truncate(size)
+        return count
+
+    @property
+    def last_time(self):
+        return int(self.column('time')[-1]) if self.count else None
+
+    # ----- Reads -----
+    def column(self, field):
+        if self.mapped != self.count:
+            self.maps = {}
+            self.mapped = self.count
+        col = self.maps.get(field)
+        if col is None:
+            dtype = dict(COLUMNS)[field]
+            if not self.count:
+                return np.zeros(0, dtype)
+            col = self.maps[field] = np.memmap(self._path(field), dtype, mode='r', shape=(self.count,))
+        return col
+
+    def columns(self, start=0, end=None):
+        # Zero-copy views of rows [start, end)
+        return {field: self.column(field)[start:end] for field, _ in COLUMNS}
+
+    def span(self, time_from=None, time_to=None):
+        # Row range of bars with time_from <= time <= time_to
+        times = self.column('time')
+        start = 0 if time_from is None else int(np.searchsorted(times, time_from))
+        end = self.count if time_to is None else int(np.searchsorted(times, time_to, side='right'))
+        return start, end
+
+    def rows(self, start=0, end=None):
+        # Copy rows into the copy_rates_* layout (for seeding BarCache)
+        cols = self.columns(start, end)
+        out = np.zeros(len(cols['time']), RATES)
+        for field, col in cols.items():
+            out[field] = col
+        return out
+
+    def frame(self, time_from=None, time_to=None):
+        # DataFrame for offline analysis; only the requested range is paged in
+        df = pd.DataFrame(self.columns(*self.span(time_from, time_to)))
+        df['time'] = pd.to_datetime(df['time'], unit='s')
+        return df
+
+    # ----- Writes -----
+    def append(self, rates):
+        # Append closed bars newer than the stored ones
+        last = self._last_on_disk()
+        if last is not None:
+            rates = rates[rates['time'] > last]
+        if not len(rates):
+            return 0
+        for field, dtype in COLUMNS:
+            with open(self._path(field), "ab") as f:
+                f.write(np.ascontiguousarray(rates[field], dtype=dtype).tobytes())
+        self.count = self._disk_count()
+        return len(rates)
+
+    def _last_on_disk(self):
+        # Another bot on the same symbol may have appended since we looked
+        count = self._disk_count()
+        if count != self.count:
+            self.count = count
+        return self.last_time
+
+    def sync(self, history=HISTORY_BARS):
+        # Backfill everything closed since the last stored bar; returns bars added
+        last = self._last_on_disk()
+        if last is None:
+            fresh = mt5.copy_rates_from_pos(self.symbol, self.timeframe, 0, history)
+        else:
+            n = 16
+            while True:
+                fresh = mt5.copy_rates_from_pos(self.symbol, self.timeframe, 0, n)
+                if fresh is None or len(fresh) == 0 or fresh['time'][0] <= last or n >= MAX_BARS:
+                    break
+                n = min(n * 8, MAX_BARS)
+        if fresh is None or len(fresh) < 2:
+            return 0
+        return self.append(fresh[:-1])  # Last one is still forming
+
+
+# ================== REGISTRY ==================
+_stores = {}
+
+
+def get_store(symbol, timeframe):
+    store = _stores.get((symbol, timeframe))
+    if store is None:
+        store = _stores[(symbol, timeframe)] = BarStore(symbol, timeframe)
+    return store
+
+
+# ================== CLI ==================
+if __name__ == "__main__":
+    # python bar_store.py XAUUSDm M1 [history bars] - backfill and summarize
+    if len(sys.argv) < 3:
+        print("usage: python bar_store.py SYMBOL TIMEFRAME [HISTORY_BARS]")
+        sys.exit(1)
+    if not mt5.initialize():
+        raise RuntimeError("MT5 failed to initialize")
+    symbol, tf = sys.argv[1], getattr(mt5, f"TIMEFRAME_{sys.argv[2].upper()}")
+    store = get_store(symbol, tf)
+    added = store.sync(int(sys.argv[3]) if len(sys.argv) > 3 else HISTORY_BARS)
+    times = store.column('time')
+    print(f"{store.dir}: {store.count} bars (+{added})" +
+          (f", {pd.to_datetime(times[0], unit='s')} .. {pd.to_datetime(times[-1], unit='s')}" if store.count else ""))
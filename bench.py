@@ -0,0 +1,374 @@
+import sys
+import argparse
+import tracemalloc
+from collections import defaultdict
+
+import time as sleep
+import numpy as np
+from collections import Counter
+
+import mt5sim
+
+# ================== SETTINGS ==================
+BOTS = {
+    "tjr v2": "tjr v2.py",
+    "tjr v1": "tjr v1.py",
+    "scalper": "tjr scalpper gold.py",
+    "test": "test.py",
+}
+# p95 wall-time budgets in milliseconds, per stage and end to end
+# (simulated broker, so these cover our own code plus the in-process call overhead)
+BUDGETS = {
+    "tjr v2": {"get_df": 14.0, "market_structure": 0.5, "get_key_levels": 0.5, "smt_divergence": 0.5,
+               "liquidity_sweep": 0.1, "displacement": 0.1, "fvg_ob": 1.5, "in_retrace": 0.5,
+               "place_trade": 9.0, "total": 28.0},
+    "tjr v1": {"get_df": 8.0, "market_structure": 0.1, "liquidity_sweep": 0.1, "displacement": 0.3,
+               "fair_value_gap": 0.1, "place_trade": 9.0, "total": 16.0},
+    "scalper": {"spread_ok": 2.0, "get_df": 6.0, "bias": 0.1, "displacement": 0.3,
+                "place_trade": 8.0, "total": 16.0},
+    "test": {"htf_trend": 4.0, "ltf_entry": 4.0, "execute_trade": 8.0, "total": 15.0},
+}
+
+
+# ================== LOADING ==================
+def load_bot(path):
+    # Settings, init and the bot's functions; its __main__ block doesn't run.
+    # Imported here so the loader binds the simulator the session installed.
+    import engine
+    return engine.load_script(path, name="bench")
+
+
+# ================== DECISION PATHS ==================
+# Each stage runs every cycle whatever the previous gate said, so the whole
+# path is measured; placeholder values stand in where a gate would stop.
+def v2_path(bot, sim):
+    s = {}
+
+    def get_df():
+        s['htf'] = bot['get_df'](bot['SYMBOL'], bot['HTF'])
+        s['itf'] = bot['get_df'](bot['SYMBOL'], bot['ITF'])
+        s['ltf'] = bot['get_df'](bot['SYMBOL'], bot['LTF'], closed=True)
+        s['corr'] = bot['get_df'](bot['CORRELATED_SYMBOL'], bot['LTF'], closed=True)
+
+    def market_structure():
+        s['bias'] = bot['market_structure'](bot['SYMBOL'], bot['HTF']) or "BULLISH_BOS"
+
+    def get_key_levels():
+        s['key_high'], s['key_low'] = bot['get_key_levels'](bot['SYMBOL'], bot['ITF'], s['itf'])
+
+    def fvg_ob():
+        bot['fair_value_gap'](bot['SYMBOL'], bot['LTF'], s['ltf'], s['bias'])
+        bot['order_block'](bot['SYMBOL'], bot['LTF'], s['bias'])
+
+    def place_trade():
+        tick = bot['mt5'].symbol_info_tick(bot['SYMBOL'])
+        bot['place_trade']("BUY", tick.bid, tick.bid - 2.0, tick.bid + 4.0)
+
+    return [
+        ("get_df", get_df),
+        ("market_structure", market_structure),
+        ("get_key_levels", get_key_levels),
+        ("smt_divergence", lambda: bot['smt_divergence'](bot['CORRELATED_SYMBOL'], s['ltf'], s['corr'], s['bias'])),
+        ("liquidity_sweep", lambda: bot['liquidity_sweep'](bot['SYMBOL'], bot['LTF'], s['ltf'], s['bias'],
+                                                           s['key_high'], s['key_low'])),
+        ("displacement", lambda: bot['displacement'](bot['SYMBOL'], bot['LTF'], s['ltf'])),
+        ("fvg_ob", fvg_ob),
+        ("in_retrace", lambda: bot['in_retrace'](bot['SYMBOL'], bot['LTF'], s['ltf']['close'][-1], s['bias'])),
+        ("place_trade", place_trade),
+    ]
+
+
+def v1_path(bot, sim):
+    s = {}
+
+    def get_df():
+        s['htf'] = bot['get_df'](bot['SYMBOL'], bot['HTF'])
+        s['ltf'] = bot['get_df'](bot['SYMBOL'], bot['LTF'], closed=True)
+
+    def market_structure():
+        s['bias'] = bot['market_structure'](bot['SYMBOL'], bot['HTF'], s['htf']) or "BULLISH"
+
+    def place_trade():
+        tick = bot['mt5'].symbol_info_tick(bot['SYMBOL'])
+        bot['place_trade']("BUY", tick.bid, tick.bid - 2.0)
+
+    return [
+        ("get_df", get_df),
+        ("market_structure", market_structure),
+        ("liquidity_sweep", lambda: bot['liquidity_sweep'](bot['SYMBOL'], bot['LTF'], s['ltf'], s['bias'])),
+        ("displacement", lambda: bot['displacement'](bot['SYMBOL'], bot['LTF'], s['ltf'])),
+        ("fair_value_gap", lambda: bot['fair_value_gap'](bot['SYMBOL'], bot['LTF'], s['ltf'], s['bias'])),
+        ("place_trade", place_trade),
+    ]
+
+
+def scalper_path(bot, sim):
+    s = {}
+
+    def get_df():
+        s['df'] = bot['get_df'](bot['TF'])
+
+    def place_trade():
+        direction = s['direction'] or "BUY"
+        low, high = float(s['df']['low'][-2]), float(s['df']['high'][-2])
+        tick = bot['mt5'].symbol_info_tick(bot['SYMBOL'])
+        if (direction == "BUY") == (low < tick.bid):  # Keep the stop on the valid side
+            bot['place_trade'](direction, low, high)
+
+    return [
+        ("spread_ok", lambda: bot['spread_ok']()),
+        ("get_df", get_df),
+        ("bias", lambda: s.update(direction=bot['bias'](s['df']))),
+        ("displacement", lambda: bot['displacement'](s['df'])),
+        ("place_trade", place_trade),
+    ]
+
+
+def test_path(bot, sim):
+    s = {}
+    return [
+        ("htf_trend", lambda: s.update(direction=bot['htf_trend']() or "BUY")),
+        ("ltf_entry", lambda: bot['ltf_entry'](s['direction'])),
+        ("execute_trade", lambda: bot['execute_trade'](s['direction'])),
+    ]
+
+
+PATHS = {"tjr v2": v2_path, "tjr v1": v1_path, "scalper": scalper_path, "test": test_path}
+BAR_SECONDS = {"tjr v2": 300, "tjr v1": 300, "scalper": 60, "test": 300}
+DATA_SYMBOL = "XAUUSDm"
+DATA_BARS = 500  # tjr v2.py's BARS
+
+
+# ================== DATA PATHS ==================
+# --data times the gates on bar_cache.frame() DataFrames, as the bots ran
+# them before signals.py, against the signals.py versions on the same
+# bars as bar_cache.rates() views, and counts cycles where they disagree.
+def pandas_market_structure(df):
+    h, l = df['high'], df['low']
+    if h.iloc[-3] > h.iloc[-4] and l.iloc[-3] > l.iloc[-4]:
+        return "BULLISH"
+    if l.iloc[-3] < l.iloc[-4] and h.iloc[-3] < h.iloc[-4]:
+        return "BEARISH"
+    return None
+
+
+def pandas_key_levels(df):
+    sessions = df.groupby(df['time'].dt.floor('D')).agg({'high': 'max', 'low': 'min'})
+    if len(sessions) < 2:
+        return df['high'].max(), df['low'].min()
+    return sessions['high'].iloc[-2], sessions['low'].iloc[-2]
+
+
+def pandas_liquidity_sweep(df, bias, key_high, key_low):
+    curr = df.iloc[-1]
+    if bias.startswith("BULLISH"):
+        return curr['low'] < key_low
+    return curr['high'] > key_high
+
+
+def pandas_displacement(df, window=20, mult=1.5):
+    bodies = abs(df['close'] - df['open'])
+    return bodies.iloc[-1] > bodies.rolling(window).mean().iloc[-1] * mult
+
+
+def pandas_fair_value_gap(df, bias):
+    c1, c3 = df.iloc[-3], df.iloc[-1]
+    if bias.startswith("BULLISH") and c3['low'] > c1['high']:
+        return (c1['high'], c3['low'])
+    if bias.startswith("BEARISH") and c3['high'] < c1['low']:
+        return (c3['high'], c1['low'])
+    return None
+
+
+def pandas_bias(df):
+    if df['close'].iloc[-1] > df['open'].iloc[-1]:
+        return "BUY"
+    if df['close'].iloc[-1] < df['open'].iloc[-1]:
+        return "SELL"
+    return None
+
+
+def data_path(kind, caches, s):
+    # Stage list for one path; results land in `s` for the agreement check
+    import signals
+    if kind == "pandas":
+        window = lambda tf, closed=False: caches[tf].frame(DATA_BARS, closed)
+        gates = (pandas_market_structure, pandas_key_levels, pandas_liquidity_sweep, pandas_displacement,
+                 pandas_fair_value_gap, pandas_bias)
+    else:
+        window = lambda tf, closed=False: caches[tf].window(DATA_BARS, closed)
+        gates = (signals.market_structure, signals.key_levels, signals.liquidity_sweep, signals.displacement,
+                 signals.fair_value_gap, signals.bias)
+    structure, levels, sweep, disp, fvg, candle = gates
+    htf, itf, ltf = caches
+
+    def frames():
+        s['htf'], s['itf'], s['ltf'] = window(htf), window(itf), window(ltf, closed=True)
+
+    return [
+        ("window", frames),
+        ("market_structure", lambda: s.update(structure=structure(s['htf']))),
+        ("key_levels", lambda: s.update(levels=levels(s['itf']))),
+        ("liquidity_sweep", lambda: s.update(sweep=sweep(s['ltf'], s['bias'], *s['levels']))),
+        ("displacement", lambda: s.update(displacement=disp(s['ltf']))),
+        ("fair_value_gap", lambda: s.update(fvg=fvg(s['ltf'], s['bias']))),
+        ("bias", lambda: s.update(candle=candle(s['ltf']))),
+    ]
+
+
+def measure_data(cycles, warmup=3, seed=0):
+    sim = mt5sim.Simulator(history_days=100, days=max(2, cycles * 300 // 86400 + 2), seed=seed)
+    times = {kind: defaultdict(list) for kind in ("pandas", "arrays")}
+    peaks = {kind: [] for kind in times}
+    mismatches = Counter()
+    with mt5sim.session(sim):
+        import bar_cache
+        from gateway import mt5
+        caches = {tf: bar_cache.get_cache(DATA_SYMBOL, tf, DATA_BARS + 1)
+                  for tf in (mt5.TIMEFRAME_H4, mt5.TIMEFRAME_H1, mt5.TIMEFRAME_M5)}
+        states = {kind: {} for kind in times}
+        paths = {kind: data_path(kind, caches, states[kind]) for kind in times}
+        for i in range(warmup + cycles + min(cycles, 50)):
+            sim.sleep(300)
+            mt5.new_cycle()
+            for cache in caches.values():
+                cache.update()  # Broker side is the same for both paths; keep it out of the timings
+            traced = i >= warmup + cycles  # Allocation passes come last, apart from the timings
+            for kind, stages in paths.items():
+                states[kind]['bias'] = "BULLISH" if i % 2 else "BEARISH"  # Both branches of each gate
+                if traced:
+                    tracemalloc.start()
+                total = 0.0
+                for stage, fn in stages:
+                    started = sleep.perf_counter()
+                    fn()
+                    elapsed = sleep.perf_counter() - started
+                    total += elapsed
+                    if warmup <= i and not traced:
+                        times[kind][stage].append(elapsed)
+                if traced:
+                    peaks[kind].append(tracemalloc.get_traced_memory()[1])
+                    tracemalloc.stop()
+                elif i >= warmup:
+                    times[kind]["total"].append(total)
+            if i >= warmup:
+                pandas, arrays = states["pandas"], states["arrays"]
+                mismatches.update(key for key in ("structure", "levels", "sweep", "displacement", "fvg", "candle")
+                                  if pandas[key] != arrays[key])
+    return times, peaks, mismatches
+
+
+def report_data(times, peaks, mismatches):
+    pandas, arrays = times["pandas"], times["arrays"]
+    print(f"\ndata path: {len(pandas['total'])} cycles, {DATA_BARS} bars per window; "
+          f"peak {np.mean(peaks['pandas']) / 1024:.0f} KiB (pandas) vs "
+          f"{np.mean(peaks['arrays']) / 1024:.0f} KiB (arrays) per cycle")
+    print(f"  {'stage':<18}{'pandas p50 us':>15}{'p95':>9}{'arrays p50 us':>15}{'p95':>9}{'speedup':>9}")
+    for stage in pandas:
+        p = np.percentile(np.array(pandas[stage]) * 1e6, [50, 95])
+        a = np.percentile(np.array(arrays[stage]) * 1e6, [50, 95])
+        print(f"  {stage:<18}{p[0]:>15.1f}{p[1]:>9.1f}{a[0]:>15.1f}{a[1]:>9.1f}{p[0] / a[0]:>8.0f}x")
+    if mismatches:
+        print(f"  disagreements: {dict(mismatches)}")
+        return [f"data path: pandas and arrays disagree {dict(mismatches)}"]
+    print("  both paths agree on every cycle")
+    return []
+
+
+# ================== MEASUREMENT ==================
+def measure(name, cycles, warmup=3, latency=0.0, seed=0):
+    sim = mt5sim.Simulator(history_days=100, days=max(2, cycles * BAR_SECONDS[name] // 86400 + 2),
+                           latency=latency, seed=seed)
+    times = defaultdict(list)
+    calls = defaultdict(list)
+    peaks = []
+    with mt5sim.session(sim):
+        bot = load_bot(BOTS[name])
+        bot['start']()  # Connect and warm up, as the engine does once
+        stages = PATHS[name](bot, sim)
+        gateway = bot['mt5']
+
+        def advance():
+            sim.sleep(BAR_SECONDS[name])
+            sim.positions.clear()  # Keep every cycle flat so no bot skips for an open trade
+            gateway.new_cycle()
+
+        def cycle(record):
+            total, total_calls = 0.0, 0
+            for stage, fn in stages:
+                before = sum(sim.calls.values())
+                started = sleep.perf_counter()
+                fn()
+                elapsed = sleep.perf_counter() - started
+                total += elapsed
+                if record:
+                    times[stage].append(elapsed)
+                    calls[stage].append(sum(sim.calls.values()) - before)
+                total_calls += sum(sim.calls.values()) - before
+            if record:
+                times["total"].append(total)
+                calls["total"].append(total_calls)
+
+        for _ in range(warmup):
+            advance()
+            cycle(False)
+        for _ in range(cycles):
+            advance()
+            cycle(True)
+
+        # Allocation pass, kept apart so tracing doesn't skew the timings
+        passes = min(cycles, 50)
+        own = [tracemalloc.Filter(False, mt5sim.__file__, all_frames=True)]
+        tracemalloc.start(25)
+        start = tracemalloc.take_snapshot().filter_traces(own)
+        for _ in range(passes):
+            advance()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            cycle(False)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        end = tracemalloc.take_snapshot().filter_traces(own)
+        tracemalloc.stop()
+        retained = sum(d.size_diff for d in end.compare_to(start, 'filename')) / passes
+    return times, calls, (np.mean(peaks), retained)
+
+
+def report(name, times, calls, memory):
+    budgets = BUDGETS.get(name, {})
+    failures = []
+    peak, retained = memory
+    print(f"\n{name}: {len(times['total'])} decisions, peak {peak / 1024:.0f} KiB per cycle "
+          f"(simulator included), strategy code retains {retained / 1024:+.1f} KiB per cycle")
+    print(f"  {'stage':<18}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'calls':>7}{'budget':>9}")
+    for stage, samples in times.items():
+        p50, p95, p99 = np.percentile(np.array(samples) * 1000, [50, 95, 99])
+        budget = budgets.get(stage)
+        flag = ""
+        if budget is not None and p95 > budget:
+            flag = "  OVER"
+            failures.append(f"{name}/{stage}: p95 {p95:.2f} ms > {budget} ms")
+        budget_text = f"{budget:.1f}" if budget is not None else "-"
+        print(f"  {stage:<18}{p50:>9.3f}{p95:>9.3f}{p99:>9.3f}{np.mean(calls[stage]):>7.1f}"
+              f"{budget_text:>9}{flag}")
+    return failures
+
+
+# ================== CLI ==================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Signal-to-order latency benchmark")
+    parser.add_argument("--cycles", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per broker call")
+    parser.add_argument("--bots", default=",".join(BOTS), help="Comma-separated subset of: " + ", ".join(BOTS))
+    parser.add_argument("--data", action="store_true",
+                        help="Compare the DataFrame and structured-array (signals.py) data paths instead")
+    args = parser.parse_args()
+
+    failures = []
+    if args.data:
+        failures += report_data(*measure_data(args.cycles))
+    for name in ([] if args.data else args.bots.split(",")):
+        failures += report(name, *measure(name, args.cycles, latency=args.latency))
+    if failures:
+        print("\nOver budget:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("\nAll stages within budget")
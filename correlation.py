@@ -0,0 +1,116 @@
+from gateway import mt5
+import logging
+import numpy as np
+from functools import reduce
+
+import bar_cache
+
+# ================== SETTINGS ==================
+WINDOW = 288  # Aligned bars per estimate: a day of M5
+MIN_BARS = 50  # Fewer aligned returns than this and partner() abstains
+
+
+# ================== ROLLING MATRIX ==================
+class RollingCorrelation:
+    # Rolling covariance and correlation of k symbols' log returns over the
+    # last `window` bar times they all printed. A running sum vector and
+    # cross-product matrix are updated with the return entering and the one
+    # leaving the window: O(k^2) per bar whatever the window.
+    RESYNC = 1024  # Rebuild the sums from the window now and then so float drift can't build up
+
+    def __init__(self, symbols, window=WINDOW):
+        self.symbols = list(symbols)
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        self.window = window
+        k = len(self.symbols)
+        self.returns = np.zeros((window, k))  # Ring buffer
+        self.sums = np.zeros(k)
+        self.cross = np.zeros((k, k))
+        self.count = 0
+        self.pos = 0
+        self.updates = 0
+        self.last_time = -1  # Newest aligned bar time fed
+        self.last_close = None  # Closes at last_time, the base of the next return
+
+    def update(self, r):
+        # One aligned return vector
+        if self.count == self.window:
+            old = self.returns[self.pos]
+            self.sums -= old
+            self.cross -= np.outer(old, old)
+        else:
+            self.count += 1
+        self.returns[self.pos] = r
+        self.sums += r
+        self.cross += np.outer(r, r)
+        self.pos = (self.pos + 1) % self.window
+        self.updates += 1
+        if self.updates % self.RESYNC == 0:
+            held = self.returns[:self.count]
+            self.sums, self.cross = held.sum(axis=0), held.T @ held
+
+    def feed(self, rates):
+        # Closed copy_rates rows per symbol (in self.symbols order). Only bar
+        # times every symbol has are used, so each return spans the same
+        # interval for all of them.
+        times = reduce(np.intersect1d, [np.asarray(r['time'], dtype=np.int64) for r in rates])
+        times = times[times > self.last_time]
+        if not len(times):
+            return 0
+        closes = np.column_stack([np.asarray(r['close'], dtype=np.float64)[np.searchsorted(r['time'], times)]
+                                  for r in rates])
+        if self.last_close is not None:
+            closes = np.vstack([self.last_close, closes])
+        for r in np.diff(np.log(closes), axis=0):
+            self.update(r)
+        self.last_close, self.last_time = closes[-1], int(times[-1])
+        return len(closes) - 1
+
+    # ----- Estimates -----
+    def covariance(self):
+        n = self.count
+        if n < 2:
+            return np.full(self.cross.shape, np.nan)
+        mean = self.sums / n
+        return (self.cross - n * np.outer(mean, mean)) / (n - 1)
+
+    def correlation(self):
+        cov = self.covariance()
+        std = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.clip(cov / np.outer(std, std), -1.0, 1.0)
+
+    def partner(self, symbol, mode="most", min_bars=MIN_BARS):
+        # The other symbol with the highest ("most") or lowest ("least")
+        # correlation to `symbol`, or None until min_bars returns are in
+        if self.count < min_bars or symbol not in self.index:
+            return None
+        row = self.correlation()[self.index[symbol]].copy()
+        row[self.index[symbol]] = np.nan
+        if np.isnan(row).all():
+            return None
+        i = np.nanargmax(row) if mode == "most" else np.nanargmin(row)
+        return self.symbols[i]
+
+
+# ================== REGISTRY ==================
+_trackers = {}
+
+
+def update(symbols, timeframe, window=WINDOW):
+    # Feed the basket's tracker the bars all its symbols closed since its
+    # last update, from their bar caches. Symbols the terminal doesn't
+    # offer are dropped once, when the tracker is built.
+    key = (tuple(symbols), timeframe, window)
+    tracker = _trackers.get(key)
+    if tracker is None:
+        offered = [s for s in symbols if mt5.symbol_select(s, True)]
+        if len(offered) < len(symbols):
+            logging.warning(f"Correlation basket without {sorted(set(symbols) - set(offered))}")
+        tracker = _trackers[key] = RollingCorrelation(offered, window)
+    caches = [bar_cache.get_cache(s, timeframe, window + 2) for s in tracker.symbols]
+    if len(caches) > 1 and all(cache.update() for cache in caches):
+        if tracker.last_close is not None and any(cache.rates['time'][0] > tracker.last_time for cache in caches):
+            tracker.last_close = None  # Bars since the last feed were dropped; don't span the gap with one return
+        tracker.feed([cache.since(tracker.last_time, closed=True) for cache in caches])
+    return tracker
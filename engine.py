@@ -0,0 +1,223 @@
+from gateway import mt5
+import os
+import ast
+import sys
+import logging
+
+import time as sleep
+
+import exec_analytics
+import recorder
+from scheduler import BarScheduler, timeframe_seconds
+from tick_feed import TickBars
+
+# ================== SETTINGS ==================
+HERE = os.path.dirname(os.path.abspath(__file__))
+# (script, overrides) per strategy; overrides replace the script's own
+# settings, so each instance gets its own magic and risk
+STRATEGIES = [
+    ("tjr v2.py", {"MAGIC": 55101, "RISK_PERCENT": 1.0}),
+    ("tjr v1.py", {"MAGIC": 55102, "RISK_PERCENT": 1.0}),  # Standalone it shares 55101 with v2
+    ("tjr scalpper gold.py", {"MAGIC": 55999, "RISK_PERCENT": 0.7}),
+    ("test.py", {"MAGIC": 777, "RISK_PERCENT": 0.5}),
+]
+TICK_POLL = 0.02  # Seconds between tick pulls while a strategy trades ticks
+MAX_SLEEP = 10.0  # Longest nap between passes, so open trades keep being managed
+GRACE = 0.5  # Seconds after a bar's close before polling for it
+RECORD = True  # Keep every tick and closed bar seen, for replay (recorder.py)
+EXECUTION_LOG = True  # Log every order's quote, fill, latency and retcode (exec_analytics.py)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+
+# ================== LOADING ==================
+def main_guard(node):
+    return isinstance(node, ast.If) and ast.unparse(node.test) == "__name__ == '__main__'"
+
+
+def load_script(path, overrides=None, name="strategy"):
+    # Run a whole bot script as module `name` and return its namespace:
+    # settings, init and functions. Its main loop sits under
+    # `if __name__ == "__main__":`, which doesn't fire under `name`.
+    # Overrides are in the namespace from the start and the script's own
+    # assignments to them are dropped, so wherever a setting is defined,
+    # everything built from it sees the override.
+    overrides = dict(overrides or {})
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    if not any(main_guard(node) for node in tree.body):
+        raise ValueError(f"{path}: main loop must sit under `if __name__ == \"__main__\":`")
+    settings = [node for node in tree.body if isinstance(node, ast.Assign)]
+    bound = {t.id for node in settings for t in node.targets if isinstance(t, ast.Name)}
+    missing = set(overrides) - bound
+    if missing:
+        raise ValueError(f"{path}: no top-level setting for override(s) {', '.join(sorted(missing))}")
+    for node in settings:
+        node.targets = [t for t in node.targets if not (isinstance(t, ast.Name) and t.id in overrides)]
+    tree.body = [node for node in tree.body if not (isinstance(node, ast.Assign) and not node.targets)]
+    namespace = {"__name__": name, "__file__": path, **overrides}
+    exec(compile(tree, path, "exec"), namespace)
+    return namespace
+
+
+# ================== STRATEGIES ==================
+class Strategy:
+    # A bot script as a plugin. Scripts export:
+    #   SYMBOL, MAGIC          what it trades and tags orders with
+    #   TIMEFRAMES             bars it waits on; the shortest triggers on_bar(new)
+    #   manage()               every pass; True while in a trade (no entries)
+    #   on_bar(new)            one decision pass
+    # and optionally start() (once, before the first pass: connect and warm
+    # up, since loading a script must not touch the broker), TICKS with
+    # on_tick(feed, received) and TICK_WINDOW, or POLL (seconds) to have
+    # on_bar(None) called on a timer instead of on bar closes. A `telemetry`
+    # (telemetry.Telemetry) gets the engine's broker and loop-lag timings.
+    def __init__(self, path, overrides=None, name=None):
+        self.name = name or os.path.splitext(os.path.basename(path))[0]
+        ns = self.namespace = load_script(path, overrides, self.name)
+        self.symbol, self.magic = ns['SYMBOL'], ns['MAGIC']
+        self.timeframes = sorted(ns['TIMEFRAMES'], key=timeframe_seconds)
+        self.ticks = bool(ns.get('TICKS')) and 'on_tick' in ns
+        self.poll = None if self.ticks else ns.get('POLL')
+        self.tick_window = ns.get('TICK_WINDOW', 10)
+        self.manage, self.on_bar, self.on_tick = ns['manage'], ns.get('on_bar'), ns.get('on_tick')
+        self.start = ns.get('start')
+        self.telemetry = ns.get('telemetry')
+        self.busy = False
+        self.polled = 0.0
+
+    @property
+    def on_bars(self):
+        return not self.ticks and self.poll is None
+
+    def call(self, fn, *args):
+        # One strategy failing must not stop the others
+        try:
+            return fn(*args)
+        except Exception as e:
+            logging.exception(f"{self.name}: {fn.__name__} failed: {e}")
+            return None
+
+
+# ================== ENGINE ==================
+class Engine:
+    # Every strategy in one process over one terminal link. Each pass runs
+    # the strategies' manage(), polls one BarScheduler per symbol (so a bar
+    # is fetched once however many strategies read it; their bar_cache
+    # lookups land on the same caches) and fans new bars and ticks out to
+    # the strategies subscribed to them.
+    def __init__(self, strategies, tick_poll=TICK_POLL, max_sleep=MAX_SLEEP):
+        self.strategies = strategies
+        self.tick_poll = tick_poll
+        self.max_sleep = max_sleep
+        timeframes = {}
+        for s in strategies:
+            if s.on_bars:
+                timeframes.setdefault(s.symbol, set()).update(s.timeframes)
+        self.schedulers = {symbol: BarScheduler(symbol, tfs) for symbol, tfs in timeframes.items()}
+        self.feeds = {}  # (symbol, timeframe, window) -> TickBars shared by its subscribers
+        for s in strategies:
+            if s.ticks:
+                key = (s.symbol, s.timeframes[0], s.tick_window)
+                if key not in self.feeds:
+                    self.feeds[key] = TickBars(*key[:2], window=key[2])
+        self.telemetries = [s.telemetry for s in strategies if s.telemetry is not None]
+
+    def start(self):
+        for s in self.strategies:
+            if s.start is not None:
+                s.start()
+        for key, feed in self.feeds.items():
+            if not feed.seed():
+                raise RuntimeError(f"No tick data for {key[0]}")
+        for scheduler in self.schedulers.values():
+            scheduler.prime()
+        if self.telemetries:
+            mt5.on_call = self.on_call  # The gateway has one hook slot; fan it out here
+        logging.info(f"ENGINE RUNNING {', '.join(f'{s.name} ({s.symbol}, magic {s.magic})' for s in self.strategies)}")
+
+    def step(self):
+        mt5.new_cycle()
+        for s in self.strategies:
+            s.busy = bool(s.call(s.manage))
+
+        for symbol, scheduler in self.schedulers.items():
+            new = scheduler.check()
+            if not new:
+                continue
+            lag = scheduler.server_now() - max(scheduler.last_times[tf] for tf in new)  # Close to detection
+            for s in self.strategies:
+                if s.symbol != symbol or not s.on_bars:
+                    continue
+                if s.telemetry is not None:
+                    s.telemetry.observe("lag", "bar", lag)
+                if not s.busy and s.timeframes[0] in new:
+                    s.call(s.on_bar, new)
+
+        for key, feed in self.feeds.items():
+            received = sleep.perf_counter()
+            if not feed.poll():
+                continue
+            for s in self.strategies:
+                if s.ticks and not s.busy and (s.symbol, s.timeframes[0], s.tick_window) == key:
+                    s.call(s.on_tick, feed, received)
+
+        now = sleep.time()
+        for s in self.strategies:
+            if s.poll is not None and not s.busy and now - s.polled >= s.poll:
+                s.polled = now
+                s.call(s.on_bar, None)
+
+    def next_wake(self):
+        now = sleep.time()
+        wake = now + self.max_sleep
+        for scheduler in self.schedulers.values():
+            due = min(scheduler.next_close(tf) for tf in scheduler.timeframes) - scheduler.offset + GRACE
+            wake = min(wake, due if due > now else now + scheduler.poll)  # Late bar: retry shortly
+        for s in self.strategies:
+            if s.poll is not None:
+                wake = min(wake, s.polled + s.poll)
+        if self.feeds:
+            wake = min(wake, now + self.tick_poll)
+        return wake
+
+    # ----- Telemetry -----
+    def on_call(self, name, seconds):
+        # Gateway worker thread; Telemetry.observe() takes its own lock
+        self.observe("broker", name, seconds)
+
+    def observe(self, kind, name, seconds):
+        for telemetry in self.telemetries:
+            telemetry.observe(kind, name, seconds)
+
+    def run(self):
+        self.start()
+        while True:
+            self.step()
+            target = self.next_wake()
+            delay = target - sleep.time()
+            if delay > 0:
+                sleep.sleep(delay)
+                self.observe("lag", "wake", sleep.time() - target)  # Oversleep
+
+
+# ================== MAIN LOOP ==================
+if __name__ == "__main__":
+    # python engine.py [script[:MAGIC] ...] - defaults to STRATEGIES
+    if sys.argv[1:]:
+        specs = []
+        for arg in sys.argv[1:]:
+            script, _, magic = arg.rpartition(":")
+            if not magic.isdigit():
+                script, magic = arg, None
+            specs.append((script, {"MAGIC": int(magic)} if magic else {}))
+    else:
+        specs = STRATEGIES
+    if not mt5.initialize():
+        raise RuntimeError("MT5 failed to initialize")
+    engine = Engine([Strategy(os.path.join(HERE, script), overrides) for script, overrides in specs])
+    if RECORD:
+        recorder.start()
+    if EXECUTION_LOG:
+        exec_analytics.start()
+    engine.run()
@@ -0,0 +1,256 @@
+from gateway import mt5
+import os
+import json
+import queue
+import logging
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+
+import time as sleep
+
+# ================== SETTINGS ==================
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "executions.jsonl")
+# UTC minutes; the killzones in backtest_v2.DEFAULTS
+SESSIONS = (("london", 8 * 60, 11 * 60), ("new_york", 13 * 60 + 30, 16 * 60 + 30))
+ACCEPTED = ('TRADE_RETCODE_DONE', 'TRADE_RETCODE_DONE_PARTIAL', 'TRADE_RETCODE_PLACED', 'TRADE_RETCODE_NO_CHANGES')
+REQUOTES = ('TRADE_RETCODE_REQUOTE', 'TRADE_RETCODE_PRICE_CHANGED', 'TRADE_RETCODE_PRICE_OFF')
+STOPS = (('DEAL_REASON_SL', "sl"), ('DEAL_REASON_TP', "tp"))  # Broker-side exits, priced against our levels
+PERCENTILES = (50, 95, 99)
+BATCH = 64
+
+
+# ================== LOG ==================
+def record(sent, request, result, seconds, quote):
+    # One order_send as a JSON-able dict. `sent` is the local epoch the
+    # request went out; `quote` is the gateway's newest (time_msc, bid, ask)
+    # for the symbol at that moment.
+    row = {
+        "time": round(sent, 3),  # Sent
+        "symbol": request.get("symbol"),
+        "action": int(request.get("action", 0)),
+        "type": int(request.get("type", 0)),
+        "magic": int(request.get("magic", 0)),
+        "position": int(request.get("position", 0)),
+        "volume": float(request.get("volume", 0.0)),
+        "price": float(request.get("price", 0.0)),  # Requested
+        "sl": float(request.get("sl", 0.0)),
+        "tp": float(request.get("tp", 0.0)),
+        "seconds": round(seconds, 6),  # Send to result, on the gateway worker
+        "retcode": getattr(result, 'retcode', None),
+        "order": int(getattr(result, 'order', 0)),
+        "deal": int(getattr(result, 'deal', 0)),
+        "fill": float(getattr(result, 'price', 0.0)),
+        "filled": float(getattr(result, 'volume', 0.0)),
+        "comment": getattr(result, 'comment', None) or "",
+    }
+    if quote is not None:
+        row["quote_msc"], row["bid"], row["ask"] = int(quote[0]), float(quote[1]), float(quote[2])
+    return row
+
+
+class ExecutionLog:
+    # Appends every order and SL/TP modification the gateway sends to a
+    # JSON-lines file: request, quote at send, latency, retcode, ticket.
+    # The gateway hook only queues; a writer thread does the file I/O.
+    def __init__(self, path=PATH, batch=BATCH):
+        self.path = path
+        self.batch = batch
+        self.queue = queue.SimpleQueue()
+        self.gateway = None
+        self.writer = None
+        self.written = 0
+        self.errors = 0
+
+    def attach(self, gateway):
+        self.gateway = gateway
+        gateway.on_order = self.observe
+        if self.writer is None:
+            self.writer = threading.Thread(target=self._run, name="exec-log", daemon=True)
+            self.writer.start()
+
+    def observe(self, request, result, seconds, quote):
+        # Gateway worker thread, right after the result: O(1). The request is
+        # copied because a requote retry rewrites the caller's dict in place.
+        self.queue.put((sleep.time() - seconds, dict(request), result, seconds, quote))
+
+    def flush(self, timeout=None):
+        # Block until everything queued so far is on disk
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    # ----- Writer thread -----
+    def _run(self):
+        while True:
+            items = [self.queue.get()]
+            while len(items) < self.batch:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [record(*item) for item in items if not isinstance(item, threading.Event)]
+            try:
+                if rows:
+                    with open(self.path, "a") as f:
+                        f.writelines(json.dumps(row) + "\n" for row in rows)
+                    self.written += len(rows)
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"Execution log write failed: {e}")
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+
+_log = None
+
+
+def start(path=None):
+    # The process-wide execution log, hooked into the gateway on first use
+    global _log
+    if _log is None:
+        _log = ExecutionLog(path or PATH)
+        _log.attach(mt5)
+    return _log
+
+
+# ================== ANALYSIS ==================
+def load(path=PATH):
+    return pd.read_json(path, lines=True, dtype={"symbol": str, "comment": str})
+
+
+def server_offset(records):
+    # Server time minus UTC, from the quotes logged with each order; broker
+    # servers sit on whole quarter hours
+    if "quote_msc" not in records or not records["quote_msc"].notna().any():
+        return 0
+    diff = (records["quote_msc"] / 1000 - records["time"]).dropna()
+    return int(np.median(np.round(diff / 900)) * 900)
+
+
+def deals_frame(start, end):
+    deals = mt5.history_deals_get(start, end)
+    if deals is None:
+        raise RuntimeError(f"Deal history unavailable: {mt5.last_error()}")
+    return pd.DataFrame([d._asdict() for d in deals])
+
+
+def session_of(times):
+    # Killzone name per UTC epoch, "off" outside them
+    minutes = (np.asarray(times, dtype=np.float64) % 86400) // 60
+    out = np.full(len(minutes), "off", dtype=object)
+    for name, start, end in SESSIONS:
+        out[(minutes >= start) & (minutes < end)] = name
+    return out
+
+
+def codes(names):
+    return [getattr(mt5, name) for name in names if hasattr(mt5, name)]
+
+
+def join(records, deals, points, offset=0):
+    # One row per order_send plus one per broker-side SL/TP exit of a
+    # position we opened. Fills are priced from the deal history (result.deal,
+    # else the deal of result.order), falling back to the result's price.
+    # Slippage and spread are in points; slippage is positive when the fill
+    # was worse than the price asked for (or the stop level, for sl/tp rows).
+    frame = records.copy()
+    frame["point"] = frame["symbol"].map(points).astype(float)
+    deal = frame["action"] == mt5.TRADE_ACTION_DEAL
+    frame["kind"] = np.where(frame["action"] == mt5.TRADE_ACTION_SLTP, "modify",
+                             np.where(deal & (frame["position"] > 0), "close", np.where(deal, "open", "other")))
+    frame["accepted"] = frame["retcode"].isin(codes(ACCEPTED))
+    frame["requote"] = frame["retcode"].isin(codes(REQUOTES))
+    frame["latency_ms"] = frame["seconds"] * 1000
+    frame["spread"] = (frame["ask"] - frame["bid"]) / frame["point"] if "ask" in frame else np.nan
+
+    fill, position = frame["fill"].where(frame["fill"] > 0), frame["position"].where(frame["position"] > 0)
+    if len(deals):
+        by_ticket = deals.set_index("ticket")
+        by_order = deals.drop_duplicates("order").set_index("order")
+        for ticket, index in (("order", by_order), ("deal", by_ticket)):  # The deal ticket wins
+            keys = frame[ticket].where(frame[ticket] > 0)
+            fill = fill.where(~keys.isin(index.index), keys.map(index["price"]))
+            position = position.fillna(keys.map(index["position_id"]))
+    side = np.where(frame["type"] == mt5.ORDER_TYPE_BUY, 1.0, -1.0)
+    frame["fill"] = fill
+    frame["slippage"] = np.where(deal & frame["accepted"], (fill - frame["price"]) * side / frame["point"], np.nan)
+    frame["position"] = position.fillna(0).astype(np.int64)
+    return pd.concat([frame, stop_exits(frame, deals, offset)], ignore_index=True)
+
+
+def stop_exits(frame, deals, offset):
+    # SL/TP hits priced against the level last set on the position (at open
+    # or by a modification) before the hit
+    reasons = {getattr(mt5, name): kind for name, kind in STOPS if hasattr(mt5, name)}
+    if not len(deals) or not reasons:
+        return frame.iloc[:0]
+    exits = deals[deals["reason"].isin(list(reasons)) & deals["position_id"].isin(frame["position"])].copy()
+    levels = frame[frame["accepted"] & frame["kind"].isin(("open", "modify")) & (frame["position"] > 0)]
+    if not len(exits) or not len(levels):
+        return frame.iloc[:0]
+    exits["time"] = exits["time_msc"] / 1000 - offset
+    exits["kind"] = exits["reason"].map(reasons)
+    levels = levels[["time", "position", "sl", "tp", "point"]].astype({"time": float}).rename(
+        columns={"position": "position_id"})
+    exits = pd.merge_asof(exits.sort_values("time"), levels.sort_values("time"), on="time", by="position_id")
+    level = np.where(exits["kind"] == "sl", exits["sl"], exits["tp"])
+    side = np.where(exits["type"] == mt5.DEAL_TYPE_BUY, 1.0, -1.0)
+    return pd.DataFrame({
+        "time": exits["time"], "symbol": exits["symbol"], "magic": exits["magic"], "kind": exits["kind"],
+        "position": exits["position_id"], "price": level, "fill": exits["price"], "point": exits["point"],
+        "accepted": True, "requote": False, "slippage": (exits["price"] - level) * side / exits["point"],
+    })
+
+
+def aggregate(frame, by):
+    # Order counts, reject/requote counts and slippage, spread and latency
+    # percentiles per group
+    groups = frame.groupby(by, sort=True)
+    table = groups.agg(orders=("kind", "size"), rejected=("accepted", lambda a: int((~a.astype(bool)).sum())),
+                       requotes=("requote", "sum"), spread=("spread", "mean"), slippage=("slippage", "mean"))
+    for column in ("slippage", "latency_ms"):
+        for q in PERCENTILES:
+            table[f"{column}_p{q}"] = groups[column].quantile(q / 100)
+    return table
+
+
+def analyze(records, deals, points):
+    # Joined rows tagged with their killzone and UTC hour, ready for aggregate()
+    frame = join(records, deals, points, server_offset(records))
+    frame["session"] = session_of(frame["time"])
+    frame["hour"] = ((frame["time"] % 86400) // 3600).astype(int)
+    return frame
+
+
+# ================== CLI ==================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Slippage, spread, latency and requotes of logged orders")
+    parser.add_argument("path", nargs="?", default=PATH, help="Execution log (exec_analytics.start())")
+    parser.add_argument("--magic", type=int, help="Only this strategy's orders")
+    parser.add_argument("--kind", nargs="+", default=["open", "close", "sl", "tp"],
+                        help="Rows to aggregate: open close modify sl tp")
+    parser.add_argument("--by", nargs="+", default=["symbol", "session", "hour"])
+    parser.add_argument("--out", help="Write the joined rows to this csv")
+    args = parser.parse_args()
+
+    if not mt5.initialize():
+        raise RuntimeError("MT5 failed to initialize")
+    records = load(args.path)
+    if args.magic is not None:
+        records = records[records["magic"] == args.magic]
+    if not len(records):
+        parser.error(f"no orders in {args.path}")
+    points = {s: getattr(mt5.symbol_info(s), 'point', np.nan) for s in records["symbol"].dropna().unique()}
+    deals = deals_frame(int(records["time"].min()) - 86400, int(sleep.time()) + 86400)  # Covers any server offset
+    frame = analyze(records, deals, points)
+    frame = frame[frame["kind"].isin(args.kind)]
+    if args.out:
+        frame.to_csv(args.out, index=False)
+    print(f"{len(records)} orders, {int((frame['kind'] == 'sl').sum())} stop and "
+          f"{int((frame['kind'] == 'tp').sum())} target exits; slippage and spread in points")
+    for key in args.by:
+        print(f"\nBy {key}")
+        print(aggregate(frame, key).to_string(float_format=lambda v: f"{v:.2f}"))
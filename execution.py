@@ -0,0 +1,133 @@
+from gateway import mt5
+import logging
+
+import time as sleep
+
+from telemetry import Histogram
+
+# ================== SETTINGS ==================
+REFRESH = 300.0  # Seconds before cached account/symbol state is re-read
+DEVIATION = 20  # Points: broker slippage allowance and how far a retry may chase
+RETRIES = 3
+RETRY_CODES = {'TRADE_RETCODE_REQUOTE', 'TRADE_RETCODE_PRICE_CHANGED', 'TRADE_RETCODE_PRICE_OFF'}
+# symbol_info().filling_mode flags -> ORDER_FILLING_* to send
+FILLINGS = (('SYMBOL_FILLING_FOK', 'ORDER_FILLING_FOK'), ('SYMBOL_FILLING_IOC', 'ORDER_FILLING_IOC'))
+
+
+# ================== EXECUTOR ==================
+class Executor:
+    # Order path for one symbol/magic. Account balance and the symbol's
+    # contract specs are read ahead of time by warm() and the request dict
+    # is prebuilt, so a signal costs one tick read, order_check and
+    # order_send. Requotes are retried at the new price as long as it stays
+    # within `deviation` points of the first quote.
+    def __init__(self, symbol, magic, deviation=DEVIATION, filling=None, comment="",
+                 check=True, retries=RETRIES, refresh=REFRESH):
+        self.symbol = symbol
+        self.magic = magic
+        self.deviation = deviation
+        self.filling = filling  # Preferred ORDER_FILLING_*; falls back to what the symbol allows
+        self.comment = comment
+        self.check = check
+        self.retries = retries
+        self.refresh = refresh
+        self.retry_codes = {getattr(mt5, name) for name in RETRY_CODES}
+        self.balance = None
+        self.info = None
+        self.template = None
+        self.warmed = None
+        self.latency = Histogram()  # Signal to fill, seconds
+        self.rejects = {}  # retcode -> count
+        self.on_fill = None  # Optional hook(seconds, result)
+
+    # ----- Cached state -----
+    def warm(self, force=False):
+        # Cheap when fresh; call from the idle part of the loop
+        if not force and self.warmed is not None and sleep.monotonic() - self.warmed < self.refresh:
+            return True
+        account, info = mt5.account_info(), mt5.symbol_info(self.symbol)
+        if account is None or info is None:
+            logging.error(f"Executor warm-up failed: {mt5.last_error()}")
+            return False
+        self.balance, self.info = account.balance, info
+        self.template = {
+            "action": mt5.TRADE_ACTION_DEAL,
+            "symbol": self.symbol,
+            "deviation": self.deviation,
+            "magic": self.magic,
+            "comment": self.comment,
+            "type_time": mt5.ORDER_TIME_GTC,
+            "type_filling": self._filling(info),
+        }
+        self.warmed = sleep.monotonic()
+        return True
+
+    def _filling(self, info):
+        allowed = [getattr(mt5, order) for flag, order in FILLINGS
+                   if info.filling_mode & getattr(mt5, flag, 0)]
+        if self.filling is not None and (self.filling in allowed or not allowed):
+            return self.filling
+        return allowed[0] if allowed else mt5.ORDER_FILLING_RETURN
+
+    def lot_size(self, sl_dist, risk_percent):
+        # Risk `risk_percent` of the cached balance over sl_dist, floored to
+        # the volume step; 0.0 when that is below the minimum lot
+        if (self.info is None and not self.warm()) or sl_dist <= 0:
+            return 0.0
+        info = self.info
+        volume = self.balance * (risk_percent / 100) / (sl_dist * info.trade_tick_value)
+        volume = min(int(volume / info.volume_step + 1e-9) * info.volume_step, info.volume_max)
+        return round(volume, 8) if volume >= info.volume_min else 0.0
+
+    # ----- Orders -----
+    def send(self, direction, volume, sl=0.0, tp=0.0, tick=None, signal=None):
+        # `tick` (anything with bid/ask) saves the quote read; `signal` is the
+        # perf_counter() of the decision, for signal-to-fill latency
+        signal = signal or sleep.perf_counter()
+        if self.template is None and not self.warm():  # Only if warm() was never called
+            return None
+        buy = direction == "BUY"
+        tick = tick or mt5.symbol_info_tick(self.symbol)
+        if tick is None:
+            logging.error(f"No tick for {self.symbol}")
+            return None
+        first = tick.ask if buy else tick.bid
+        request = dict(self.template, volume=volume, sl=sl, tp=tp, price=first,
+                       type=mt5.ORDER_TYPE_BUY if buy else mt5.ORDER_TYPE_SELL)
+
+        if self.check:
+            checked = mt5.order_check(request)
+            if checked is None or checked.retcode not in (0, mt5.TRADE_RETCODE_DONE):
+                self._reject(checked)
+                return checked
+
+        for attempt in range(self.retries + 1):
+            result = mt5.order_send(request)
+            if result is None or result.retcode not in self.retry_codes or attempt == self.retries:
+                break
+            tick = mt5.symbol_info_tick(self.symbol)
+            if tick is None:
+                break  # No fresh quote to retry at; the requote is reported below
+            price = tick.ask if buy else tick.bid
+            if abs(price - first) > self.deviation * self.info.point:
+                break  # Market ran away from the signal
+            request["price"] = price
+
+        if result is None or result.retcode != mt5.TRADE_RETCODE_DONE:
+            self._reject(result)
+            return result
+        seconds = sleep.perf_counter() - signal
+        self.latency.observe(seconds)
+        if self.on_fill is not None:
+            self.on_fill(seconds, result)
+        self.warmed = None  # Balance moved; the next idle warm() re-reads it
+        return result
+
+    def _reject(self, result):
+        retcode = getattr(result, 'retcode', None)
+        self.rejects[retcode] = self.rejects.get(retcode, 0) + 1
+        logging.error(f"Order on {self.symbol} rejected: "
+                      f"{getattr(result, 'comment', None) or mt5.last_error()} ({retcode})")
+        if retcode in (getattr(mt5, 'TRADE_RETCODE_INVALID_FILL', None),
+                       getattr(mt5, 'TRADE_RETCODE_INVALID_VOLUME', None)):
+            self.warmed = None  # Specs may have changed under us
@@ -0,0 +1,52 @@
+from collections import Counter
+
+import signals
+
+
+# ================== FEATURE STORE ==================
+class FeatureStore:
+    # Values live under a slot stamped with its last bar's (time, close,
+    # tick_volume). A new stamp - a new bar, or the forming bar moving -
+    # evicts everything computed for the old one.
+    def __init__(self):
+        self.stamps = {}
+        self.values = {}
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def get(self, slot, stamp, feature, params, compute):
+        if self.stamps.get(slot) != stamp:
+            self.stamps[slot] = stamp
+            self.values[slot] = {}
+        cache = self.values[slot]
+        key = (feature, params)
+        if key in cache:
+            self.hits[feature] += 1
+            return cache[key]
+        self.misses[feature] += 1
+        value = cache[key] = compute()
+        return value
+
+    def hit_rate(self, feature=None):
+        hits = self.hits[feature] if feature else sum(self.hits.values())
+        misses = self.misses[feature] if feature else sum(self.misses.values())
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    def report(self):
+        names = sorted(set(self.hits) | set(self.misses))
+        parts = [f"{name} {self.hit_rate(name):.0%}" for name in names]
+        return f"hit rate {self.hit_rate():.0%} ({', '.join(parts)})"
+
+
+FEATURES = FeatureStore()
+
+
+# ================== SIGNALS ==================
+def signal(symbol, timeframe, rates, name, *args):
+    # signals.<name>(rates, *args) on a bar_cache.rates() window, computed
+    # once per revision of its last bar and shared by every caller: a gate
+    # that runs twice in a pass (or in two strategies) is a dict lookup
+    last = rates[-1]
+    stamp = (int(last['time']), float(last['close']), int(last['tick_volume']))
+    return FEATURES.get((symbol, timeframe), stamp, name, (len(rates),) + args,
+                        lambda: getattr(signals, name)(rates, *args))
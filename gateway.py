@@ -0,0 +1,164 @@
+import MetaTrader5
+import queue
+import threading
+import logging
+from collections import Counter
+from concurrent.futures import Future
+
+import time as sleep
+
+# ================== SETTINGS ==================
+# Calls that only read terminal state; identical ones are merged
+READS = {
+    'account_info', 'terminal_info', 'symbol_info', 'symbol_info_tick', 'symbols_get',
+    'positions_get', 'positions_total', 'orders_get', 'orders_total',
+    'history_deals_get', 'history_deals_total', 'history_orders_get', 'copy_rates_from', 'copy_rates_from_pos',
+    'copy_rates_range', 'copy_ticks_from', 'copy_ticks_range',
+}
+# Tick reads whose latest quote is kept per symbol (Gateway.quotes)
+TICK_READS = {'symbol_info_tick', 'copy_ticks_from', 'copy_ticks_range'}
+# last_error() codes meaning the IPC link to the terminal is gone
+DISCONNECTED = {-10001, -10002, -10003, -10004, -10005}
+
+
+# ================== GATEWAY ==================
+class Gateway:
+    # Owns the terminal connection: every broker call runs on one worker
+    # thread, in order, so any number of strategy threads can share it.
+    def __init__(self, module=MetaTrader5, ttl=0.2, attempts=5, backoff=1.0, max_backoff=60.0):
+        self.module = module
+        self.ttl = ttl  # How long a read result is shared with duplicate callers
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.reads = {}
+        self.worker = None
+        self.init_args = ((), {})
+        self.connected = False
+        self.calls = Counter()
+        self.coalesced = Counter()
+        self.quotes = {}  # symbol -> (time_msc, bid, ask) of the newest tick any caller read
+        self.on_call = None  # Optional hook(name, seconds)
+        self.on_result = None  # Optional hook(name, args, kwargs, result); keep it O(1), it runs on the worker
+        self.on_order = None  # Optional hook(request, result, seconds, quote) after each order_send; same rules
+
+    # ----- Drop-in for the MetaTrader5 module -----
+    def __getattr__(self, name):
+        attr = getattr(self.module, name)
+        if not callable(attr):
+            return attr  # TIMEFRAME_*, ORDER_TYPE_* and other constants
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+
+    def new_cycle(self):
+        # Forget merged reads so the next loop pass sees fresh state
+        with self.lock:
+            self.reads.clear()
+
+    def stats(self):
+        return {"calls": dict(self.calls), "coalesced": dict(self.coalesced)}
+
+    # ----- Request queue -----
+    def call(self, name, *args, **kwargs):
+        if name == 'initialize' and self.connected and (args, kwargs) == self.init_args:
+            return True  # Several scripts in one process (engine.py) share the link
+        if name in READS:
+            key = (name, args, tuple(sorted(kwargs.items())))
+            now = sleep.monotonic()
+            with self.lock:
+                merged = self.reads.get(key)
+                if merged and now - merged[0] < self.ttl:
+                    self.coalesced[name] += 1
+                    return merged[1].result()
+                future = Future()
+                self.reads[key] = (now, future)
+        else:
+            future = Future()
+        self.calls[name] += 1
+        self._start()
+        self.requests.put((future, name, args, kwargs))
+        return future.result()
+
+    def _start(self):
+        if self.worker is None or not self.worker.is_alive():
+            with self.lock:
+                if self.worker is None or not self.worker.is_alive():
+                    self.worker = threading.Thread(target=self._run, name="mt5-gateway", daemon=True)
+                    self.worker.start()
+
+    def _run(self):
+        while True:
+            future, name, args, kwargs = self.requests.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self._invoke(name, args, kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            if name not in READS:
+                self.new_cycle()  # Orders/modifications change what reads would return
+
+    # ----- Worker thread only -----
+    def _invoke(self, name, args, kwargs):
+        if name == 'initialize':
+            self.init_args = (args, kwargs)
+            return self._connect()
+        if name == 'shutdown':
+            self.connected = False
+        elif not self.connected:
+            self._connect()  # Lazy: first call connects with the last initialize() arguments
+        order = self.on_order is not None and name == 'order_send' and args
+        if order:
+            quote = self.quotes.get(args[0].get("symbol"))  # What the order went out on, not the reply's
+        started = sleep.perf_counter()
+        result = getattr(self.module, name)(*args, **kwargs)
+        if result is None and name != 'shutdown' and self._dropped():
+            logging.error(f"MT5 connection lost during {name}, reconnecting")
+            if self._connect():
+                result = getattr(self.module, name)(*args, **kwargs)
+        seconds = sleep.perf_counter() - started
+        if name in TICK_READS and result is not None and len(args):
+            self._quote(args[0], result)
+        if self.on_call:
+            self.on_call(name, seconds)
+        if order:
+            self.on_order(args[0], result, seconds, quote)
+        if self.on_result and result is not None:
+            self.on_result(name, args, kwargs, result)
+        return result
+
+    def _quote(self, symbol, result):
+        if hasattr(result, 'bid'):
+            quote = (result.time_msc, result.bid, result.ask)
+        elif len(result):
+            last = result[-1]
+            quote = (int(last['time_msc']), float(last['bid']), float(last['ask']))
+        else:
+            return
+        if quote[0] >= self.quotes.get(symbol, (0,))[0]:  # A history read mustn't roll it back
+            self.quotes[symbol] = quote
+
+    def _dropped(self):
+        code = self.module.last_error()[0]
+        return code in DISCONNECTED
+
+    def _connect(self):
+        args, kwargs = self.init_args
+        delay = self.backoff
+        self.connected = False
+        for attempt in range(1, self.attempts + 1):
+            if self.module.initialize(*args, **kwargs):
+                self.connected = True
+                return True
+            logging.error(f"MT5 initialize failed ({self.module.last_error()}), "
+                          f"attempt {attempt}/{self.attempts}")
+            if attempt < self.attempts:
+                self.module.shutdown()
+                sleep.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+        return False
+
+
+# Shared by every script and helper module in the process
+mt5 = Gateway()
@@ -0,0 +1,121 @@
+import math
+from collections import deque
+
+# Streaming versions of the pandas indicator formulas (each class names the
+# one it reproduces). Seed them once by feeding history through update(),
+# then call update() once per closed bar.
+# peek() gives the value for a still-forming bar without committing it.
+
+
+# ================== ROLLING MEAN ==================
+class RollingMean:
+    RESYNC = 1024  # Re-add the window now and then so float drift can't build up
+
+    def __init__(self, period):
+        self.period = period
+        self.values = deque(maxlen=period)
+        self.total = 0.0
+        self.updates = 0
+
+    def _next_total(self, x):
+        dropped = self.values[0] if len(self.values) == self.period else 0.0
+        return self.total + x - dropped
+
+    def update(self, x):
+        self.total = self._next_total(x)
+        self.values.append(x)
+        self.updates += 1
+        if self.updates % self.RESYNC == 0:
+            self.total = math.fsum(self.values)
+        return self.value
+
+    def peek(self, x):
+        if len(self.values) + 1 < self.period:
+            return math.nan
+        return self._next_total(x) / self.period
+
+    @property
+    def value(self):
+        if len(self.values) < self.period:
+            return math.nan
+        return self.total / self.period
+
+
+# ================== EMA ==================
+class EMA:
+    # series.ewm(span=period, adjust=False).mean()
+    def __init__(self, period):
+        self.alpha = 2.0 / (period + 1)
+        self.value = math.nan
+
+    def peek(self, x):
+        if math.isnan(self.value):
+            return x
+        return self.value + self.alpha * (x - self.value)
+
+    def update(self, x):
+        self.value = self.peek(x)
+        return self.value
+
+
+# ================== RSI ==================
+def _rsi(avg_gain, avg_loss):
+    if avg_loss == 0:
+        return math.nan if avg_gain == 0 else 100.0
+    return 100 - (100 / (1 + avg_gain / avg_loss))
+
+
+class RSI:
+    # Simple-average RSI (rolling mean, not Wilder): 100 - 100 / (1 + gain.rolling(n).mean()
+    # / loss.rolling(n).mean()) over the close-to-close deltas
+    def __init__(self, period=14):
+        self.gains = RollingMean(period)
+        self.losses = RollingMean(period)
+        self.prev = None
+
+    def peek(self, close):
+        if self.prev is None:
+            return math.nan
+        delta = close - self.prev
+        avg_gain = self.gains.peek(max(delta, 0.0))
+        avg_loss = self.losses.peek(max(-delta, 0.0))
+        return math.nan if math.isnan(avg_gain) else _rsi(avg_gain, avg_loss)
+
+    def update(self, close):
+        if self.prev is not None:
+            delta = close - self.prev
+            self.gains.update(max(delta, 0.0))
+            self.losses.update(max(-delta, 0.0))
+        self.prev = close
+        return self.value
+
+    @property
+    def value(self):
+        avg_gain = self.gains.value
+        return math.nan if math.isnan(avg_gain) else _rsi(avg_gain, self.losses.value)
+
+
+# ================== ATR ==================
+class ATR:
+    # True range (high-low, |high-prev close|, |low-prev close|) averaged with
+    # a simple rolling mean: tr.rolling(n).mean()
+    def __init__(self, period=14):
+        self.ranges = RollingMean(period)
+        self.prev_close = None
+
+    def _true_range(self, high, low):
+        if self.prev_close is None:
+            return high - low
+        return max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+
+    def peek(self, high, low, close):
+        return self.ranges.peek(self._true_range(high, low))
+
+    def update(self, high, low, close):
+        self.ranges.update(self._true_range(high, low))
+        self.prev_close = close
+        return self.value
+
+    @property
+    def value(self):
+        return self.ranges.value
@@ -0,0 +1,181 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import time as sleep
+import numpy as np
+import pandas as pd
+
+import backtest_v2
+from sweep import parse_values
+
+# ================== SETTINGS ==================
+RISKS = (0.25, 0.5, 0.7, 1.0, 1.5, 2.0)  # % per trade; the bots run 0.5 to 1.0
+PATHS = 100_000
+BLOCK = 10  # Trades per block in the block bootstrap; keeps losing streaks together
+RUIN = 50.0  # % below the starting balance that counts as ruined
+CHUNK = 5_000  # Paths walked together; their state stays in cache
+PERCENTILES = (50, 95, 99)
+OUT_ENTRIES = ('DEAL_ENTRY_OUT', 'DEAL_ENTRY_INOUT', 'DEAL_ENTRY_OUT_BY')
+
+
+# ================== TRADE SERIES ==================
+def from_csv(path):
+    # Trades with an `r` column (R multiple per trade), e.g. backtest_v2's trades frame
+    return pd.read_csv(path)['r'].to_numpy(dtype=np.float64)
+
+
+def from_backtest(m5, h1, h4, corr=None, **params):
+    trades, _ = backtest_v2.run(m5, h1, h4, corr, **params)
+    trades = trades[trades['reason'] != "open"]
+    return trades['r'].to_numpy(dtype=np.float64)
+
+
+def from_deals(magic=None, days=90, risk_percent=1.0):
+    # R per closing deal from the terminal's history. Deals carry no stop, so
+    # R is net PnL over `risk_percent` of the balance before the exit: exact
+    # for the bots, which size every trade to that share of the balance.
+    from gateway import mt5  # Only this source needs a terminal
+    now = int(sleep.time())
+    deals = mt5.history_deals_get(now - days * 86400, now + 86400)
+    account = mt5.account_info()
+    if deals is None or account is None:
+        raise RuntimeError(f"Deal history unavailable: {mt5.last_error()}")
+    deals = sorted(deals, key=lambda d: d.ticket)
+    out_entries = {getattr(mt5, name) for name in OUT_ENTRIES if hasattr(mt5, name)}
+    net = np.array([d.profit + d.commission + d.swap + d.fee for d in deals], dtype=np.float64)
+    # Balance before each deal, walked back from today's (deposits included)
+    before = account.balance - np.cumsum(net[::-1])[::-1]
+    picks = [i for i, d in enumerate(deals)
+             if d.entry in out_entries and d.magic and (magic is None or d.magic == magic)]
+    return net[picks] / (before[picks] * risk_percent / 100)
+
+
+# ================== RESAMPLING ==================
+def draw(n, paths, trades, block, rng):
+    # (trades, paths) indices into the outcome series: i.i.d. when block is
+    # 1, else circular blocks of `block` consecutive trades
+    if block <= 1:
+        return rng.integers(0, n, size=(trades, paths))
+    blocks = -(-trades // block)
+    starts = rng.integers(0, n, size=(blocks, 1, paths))
+    idx = (starts + np.arange(block)[:, None]).reshape(blocks * block, paths)[:trades]
+    return idx % n
+
+
+def growth_table(r, risks):
+    # (outcomes, risks) log growth of the balance per trade; a loss can't
+    # take more than the balance
+    table = np.log1p(np.maximum(np.outer(r, np.asarray(risks, dtype=np.float64) / 100), -1 + 1e-12))
+    return table.astype(np.float32)
+
+
+def path_stats(idx, table, ruin=RUIN):
+    # Walks all paths and risk settings a trade at a time on (paths, risks)
+    # state, so nothing trades-long is ever materialized per risk. Returns
+    # per path and risk: final return %, max drawdown % of peak, ruined, and
+    # the longest stretch (trades) spent below a prior peak.
+    shape = (idx.shape[1], table.shape[1])
+    equity, peak, worst, low = (np.zeros(shape, np.float32) for _ in range(4))  # Log balance; start at 0
+    growth, gap = np.empty(shape, np.float32), np.empty(shape, np.float32)
+    below = np.empty(shape, bool)
+    run, underwater = np.zeros(shape, np.int32), np.zeros(shape, np.int32)
+    for row in idx:
+        np.take(table, row, axis=0, out=growth)
+        equity += growth
+        np.maximum(peak, equity, out=peak)
+        np.subtract(equity, peak, out=gap)
+        np.minimum(worst, gap, out=worst)
+        np.minimum(low, equity, out=low)
+        np.less(equity, peak, out=below)
+        run += 1
+        np.multiply(run, below, out=run)  # Back to 0 on a new peak
+        np.maximum(underwater, run, out=underwater)
+    final = np.expm1(equity.astype(np.float64)) * 100
+    drawdown = -np.expm1(worst.astype(np.float64)) * 100
+    return final, drawdown, low <= np.log1p(-ruin / 100), underwater
+
+
+def _chunk(args):
+    r, risks, paths, trades, block, ruin, seed = args
+    idx = draw(len(r), paths, trades, block, np.random.default_rng(seed))
+    return path_stats(idx, growth_table(r, risks), ruin)
+
+
+# ================== ANALYSIS ==================
+def simulate(r, risks=RISKS, paths=PATHS, trades=None, block=1, ruin=RUIN, seed=0, workers=None, chunk=CHUNK):
+    # One row per risk setting. Chunks get their own child seeds, so results
+    # don't depend on the worker count.
+    r = np.asarray(r, dtype=np.float64)
+    trades = trades or len(r)
+    sizes = [min(chunk, paths - start) for start in range(0, paths, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(r, tuple(risks), size, trades, block, ruin, s) for size, s in zip(sizes, seeds)]
+    if workers and workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            parts = list(pool.map(_chunk, jobs))
+    else:
+        parts = [_chunk(job) for job in jobs]
+
+    rows = []
+    for i, risk in enumerate(risks):
+        final, drawdown, ruined, underwater = (np.concatenate([part[k][:, i] for part in parts]) for k in range(4))
+        row = {"risk_percent": risk, "median_return_pct": float(np.median(final))}
+        for q in PERCENTILES:
+            row[f"dd_p{q}"] = float(np.percentile(drawdown, q))
+        row["risk_of_ruin_pct"] = float(ruined.mean() * 100)
+        for q in PERCENTILES[:2]:
+            row[f"underwater_p{q}"] = float(np.percentile(underwater, q))
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def analyze(r, risks=RISKS, paths=PATHS, trades=None, block=BLOCK, ruin=RUIN, seed=0, workers=None):
+    # Plain and block bootstrap side by side; a gap between them means the
+    # trade order (streaks) matters
+    plain = simulate(r, risks, paths, trades, 1, ruin, seed, workers)
+    blocked = simulate(r, risks, paths, trades, block, ruin, seed, workers)
+    return pd.concat([plain.assign(method="bootstrap"), blocked.assign(method=f"block{block}")],
+                     ignore_index=True)
+
+
+# ================== CLI ==================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo drawdown and risk of ruin per risk setting")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--trades", metavar="CSV", help="Trades with an r column")
+    source.add_argument("--backtest", nargs="+", metavar="CSV", help="m5.csv h1.csv h4.csv [corr.csv] for backtest_v2")
+    source.add_argument("--deals", type=int, metavar="MAGIC", help="Closed trades of this magic from the terminal")
+    parser.add_argument("--days", type=int, default=90, help="Deal history to read (--deals)")
+    parser.add_argument("--risk-used", type=float, default=1.0, help="RISK_PERCENT the deals were sized with")
+    parser.add_argument("--risk", default=",".join(map(str, RISKS)), help="Risk settings, e.g. 0.5,1 or 0.25:2:0.25")
+    parser.add_argument("--paths", type=int, default=PATHS)
+    parser.add_argument("--horizon", type=int, help="Trades per path (default: as many as the series)")
+    parser.add_argument("--block", type=int, default=BLOCK)
+    parser.add_argument("--ruin", type=float, default=RUIN, help="Drawdown from the start counted as ruin, %%")
+    parser.add_argument("--workers", type=int, default=1, help="Processes; 0 for one per core")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the table to this csv")
+    args = parser.parse_args()
+
+    if args.trades:
+        r = from_csv(args.trades)
+    elif args.backtest:
+        r = from_backtest(*(backtest_v2.load_csv(path) for path in args.backtest))
+    else:
+        from gateway import mt5
+        if not mt5.initialize():
+            raise RuntimeError("MT5 failed to initialize")
+        r = from_deals(args.deals, args.days, args.risk_used)
+    if len(r) < 2:
+        parser.error(f"need at least 2 closed trades, got {len(r)}")
+
+    started = sleep.perf_counter()
+    table = analyze(r, parse_values(args.risk), args.paths, args.horizon, args.block, args.ruin,
+                    args.seed, args.workers or os.cpu_count())
+    elapsed = sleep.perf_counter() - started
+    if args.out:
+        table.to_csv(args.out, index=False)
+    print(f"{len(r)} trades, expectancy {r.mean():.3f}R, win rate {(r > 0).mean():.1%}; "
+          f"{args.paths} paths x {args.horizon or len(r)} trades in {elapsed:.1f} s")
+    print(table.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
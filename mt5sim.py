@@ -0,0 +1,639 @@
+import os
+import sys
+import time
+import runpy
+import shutil
+import tempfile
+import argparse
+import datetime as _datetime
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+# Offline stand-in for the MetaTrader5 package. install() puts a Simulator
+# in sys.modules['MetaTrader5'] and moves time.time/sleep/datetime.now onto
+# the simulated clock, so the unchanged bots run faster than real time.
+
+# ================== RECORD TYPES ==================
+RATES = np.dtype([('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+                  ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8')])
+TICKS = np.dtype([('time', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'), ('volume', '<u8'),
+                  ('time_msc', '<i8'), ('flags', '<u4'), ('volume_real', '<f8')])
+
+Tick = namedtuple('Tick', 'time bid ask last volume time_msc flags volume_real')
+SymbolInfo = namedtuple('SymbolInfo', 'name point digits spread trade_tick_value trade_tick_size '
+                        'trade_contract_size volume_min volume_max volume_step filling_mode '
+                        'trade_stops_level bid ask visible')
+AccountInfo = namedtuple('AccountInfo', 'login balance equity profit margin margin_free leverage currency')
+TradePosition = namedtuple('TradePosition', 'ticket time time_msc type magic identifier volume price_open '
+                           'sl tp price_current profit symbol comment')
+TradeDeal = namedtuple('TradeDeal', 'ticket order time time_msc type entry magic position_id reason '
+                       'volume price commission swap profit fee symbol comment external_id')
+OrderSendResult = namedtuple('OrderSendResult', 'retcode deal order volume price bid ask comment '
+                             'request_id retcode_external request')
+OrderCheckResult = namedtuple('OrderCheckResult', 'retcode balance equity profit margin margin_free '
+                              'margin_level comment request')
+TerminalInfo = namedtuple('TerminalInfo', 'connected trade_allowed name')
+
+# Within each M1 bar: open, first extreme, second extreme, close
+TICK_OFFSETS = np.array([0, 20, 40, 59])
+
+
+class SimulationEnd(BaseException):
+    # BaseException so the bots' broad `except Exception` can't swallow it
+    pass
+
+
+# ================== DATA ==================
+def synthetic_bars(start, minutes, price=2000.0, volatility=0.0004, seed=0):
+    rng = np.random.default_rng(seed)
+    bars = np.zeros(minutes, RATES)
+    bars['time'] = start // 60 * 60 + np.arange(minutes) * 60
+    close = price * np.exp(np.cumsum(rng.standard_t(4, minutes) * volatility))
+    opens = np.r_[price, close[:-1]]
+    wick = np.abs(rng.normal(0, volatility, (2, minutes))) * close
+    bars['open'], bars['close'] = opens, close
+    bars['high'] = np.maximum(opens, close) + wick[0]
+    bars['low'] = np.minimum(opens, close) - wick[1]
+    bars['tick_volume'] = 4
+    return bars
+
+
+def load_csv(path):
+    import pandas as pd
+    df = pd.read_csv(path)
+    if not np.issubdtype(df['time'].dtype, np.number):
+        df['time'] = pd.to_datetime(df['time']).astype('int64') // 10**9
+    bars = np.zeros(len(df), RATES)
+    for name in RATES.names:
+        if name in df:
+            bars[name] = df[name].to_numpy()
+    return bars
+
+
+def aggregate(m1, period):
+    if period == 60:
+        return m1
+    shift = 3 * 86400 if period == 604800 else 0  # MT5 weeks start on Sunday
+    bucket = (m1['time'] - shift) // period * period + shift
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(m1)] - 1
+    out = np.zeros(len(starts), RATES)
+    out['time'] = bucket[starts]
+    out['open'] = m1['open'][starts]
+    out['high'] = np.maximum.reduceat(m1['high'], starts)
+    out['low'] = np.minimum.reduceat(m1['low'], starts)
+    out['close'] = m1['close'][ends]
+    out['tick_volume'] = np.add.reduceat(m1['tick_volume'], starts)
+    out['spread'] = np.minimum.reduceat(m1['spread'], starts)
+    return out
+
+
+def timeframe_seconds(timeframe):
+    if timeframe & 0xC000 == 0:
+        return timeframe * 60
+    if timeframe & 0xC000 == 0x4000:
+        return (timeframe & 0x3FFF) * 3600
+    return 7 * 86400
+
+
+def _seconds(value):
+    if isinstance(value, _datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=_datetime.timezone.utc)
+        return int(value.timestamp())
+    return int(value)
+
+
+def _api(fn):
+    # Count the call and charge the configured broker latency to the clock
+    @wraps(fn)
+    def call(self, *args, **kwargs):
+        self.calls[fn.__name__] += 1
+        if self.latency:
+            if self.real_latency:
+                self._real_sleep(self.latency)
+            self._advance(self.clock + self.latency)
+        return fn(self, *args, **kwargs)
+    return call
+
+
+# ================== SIMULATOR ==================
+class Simulator:
+    TIMEFRAME_M1, TIMEFRAME_M2, TIMEFRAME_M3, TIMEFRAME_M4, TIMEFRAME_M5 = 1, 2, 3, 4, 5
+    TIMEFRAME_M6, TIMEFRAME_M10, TIMEFRAME_M12, TIMEFRAME_M15, TIMEFRAME_M20 = 6, 10, 12, 15, 20
+    TIMEFRAME_M30, TIMEFRAME_H1, TIMEFRAME_H2, TIMEFRAME_H3, TIMEFRAME_H4 = 30, 16385, 16386, 16387, 16388
+    TIMEFRAME_H6, TIMEFRAME_H8, TIMEFRAME_H12, TIMEFRAME_D1, TIMEFRAME_W1 = 16390, 16392, 16396, 16408, 32769
+    ORDER_TYPE_BUY, ORDER_TYPE_SELL = 0, 1
+    POSITION_TYPE_BUY, POSITION_TYPE_SELL = 0, 1
+    TRADE_ACTION_DEAL, TRADE_ACTION_PENDING, TRADE_ACTION_SLTP = 1, 5, 6
+    ORDER_FILLING_FOK, ORDER_FILLING_IOC, ORDER_FILLING_RETURN = 0, 1, 2
+    SYMBOL_FILLING_FOK, SYMBOL_FILLING_IOC = 1, 2
+    ORDER_TIME_GTC = 0
+    TRADE_RETCODE_REQUOTE, TRADE_RETCODE_REJECT, TRADE_RETCODE_DONE = 10004, 10006, 10009
+    TRADE_RETCODE_INVALID, TRADE_RETCODE_INVALID_VOLUME, TRADE_RETCODE_INVALID_STOPS = 10013, 10014, 10016
+    TRADE_RETCODE_PRICE_CHANGED, TRADE_RETCODE_PRICE_OFF, TRADE_RETCODE_NO_CHANGES = 10020, 10021, 10025
+    TRADE_RETCODE_POSITION_CLOSED = 10036
+    DEAL_TYPE_BUY, DEAL_TYPE_SELL = 0, 1
+    DEAL_ENTRY_IN, DEAL_ENTRY_OUT = 0, 1
+    DEAL_REASON_EXPERT, DEAL_REASON_SL, DEAL_REASON_TP = 3, 4, 5
+    COPY_TICKS_ALL, COPY_TICKS_INFO, COPY_TICKS_TRADE = -1, 1, 2
+    TICK_FLAG_BID, TICK_FLAG_ASK = 2, 4
+
+    def __init__(self, bars=None, ticks=None, start=None, history_days=90, days=30,
+                 spread_points=20, point=0.01, tick_value=1.0, balance=10000.0,
+                 latency=0.0, real_latency=False, requotes=0.0, speed=None, seed=0):
+        self.bars = dict(bars or {})  # symbol -> M1 RATES array
+        self.recorded_ticks = dict(ticks or {})  # symbol -> TICKS array, optional
+        self.first = start if start is not None else 1_700_000_000 // 86400 * 86400
+        self.history_days = history_days
+        self.days = days
+        self.spread_points = spread_points
+        self.point = point
+        self.tick_value = tick_value
+        self.balance = balance
+        self.latency = latency
+        self.real_latency = real_latency
+        self.requotes = requotes
+        self.speed = speed  # Simulated seconds per real second; None runs flat out
+        self.rng = np.random.default_rng(seed)
+        self.seed = seed
+        self.clock = float(self.first + history_days * 86400)
+        self.end = self.first + (history_days + days) * 86400
+        self.calls = Counter()
+        self.positions = {}
+        self.deals = []
+        self.next_ticket = 1
+        self.error = (1, "Success")
+        self._frames = {}
+        self._synth = {}  # symbol -> (i0, i1, ticks), the last synthesized span
+        self._upcoming = {}  # symbol -> time_msc of the first tick after the clock
+        self._real_sleep = time.sleep
+
+    # ----- Market data internals -----
+    def _m1(self, symbol):
+        if symbol not in self.bars:
+            minutes = (self.history_days + self.days) * 1440
+            seed = self.seed + sum(map(ord, symbol))
+            bars = synthetic_bars(self.first, minutes, seed=seed)
+            bars['spread'] = self.spread_points
+            self.bars[symbol] = bars
+        return self.bars[symbol]
+
+    def _frame(self, symbol, timeframe):
+        key = (symbol, timeframe)
+        if key not in self._frames:
+            self._frames[key] = aggregate(self._m1(symbol), timeframe_seconds(timeframe))
+        return self._frames[key]
+
+    def _synth_ticks(self, symbol, i0, i1):
+        # Four ticks per M1 bar, visiting the extremes in the bar's direction.
+        # Bots poll the same span many times, so keep the last one.
+        cached = self._synth.get(symbol)
+        if cached and cached[0] == i0 and cached[1] == i1:
+            return cached[2]
+        bars = self._m1(symbol)[i0:i1]
+        up = bars['close'] >= bars['open']
+        prices = np.stack([bars['open'], np.where(up, bars['low'], bars['high']),
+                           np.where(up, bars['high'], bars['low']), bars['close']], axis=1)
+        ticks = np.zeros(len(bars) * 4, TICKS)
+        ticks['time'] = (bars['time'][:, None] + TICK_OFFSETS).ravel()
+        ticks['time_msc'] = ticks['time'] * 1000
+        ticks['bid'] = prices.ravel()
+        ticks['ask'] = ticks['bid'] + np.repeat(bars['spread'], 4) * self.point
+        ticks['last'] = ticks['bid']
+        ticks['flags'] = self.TICK_FLAG_BID | self.TICK_FLAG_ASK
+        self._synth[symbol] = (i0, i1, ticks)
+        return ticks
+
+    def _ticks(self, symbol, t0, t1):
+        # Ticks with t0 <= time_msc/1000 <= t1
+        if symbol in self.recorded_ticks:
+            ticks = self.recorded_ticks[symbol]
+            msc = ticks['time_msc']
+            return ticks[np.searchsorted(msc, t0 * 1000):np.searchsorted(msc, t1 * 1000, side='right')]
+        times = self._m1(symbol)['time']
+        i0 = max(0, np.searchsorted(times, t0, side='right') - 1)
+        i1 = np.searchsorted(times, t1, side='right')
+        ticks = self._synth_ticks(symbol, i0, i1)
+        return ticks[(ticks['time_msc'] >= t0 * 1000) & (ticks['time_msc'] <= t1 * 1000)]
+
+    def _last_tick(self, symbol):
+        if symbol in self.recorded_ticks:
+            ticks = self.recorded_ticks[symbol]
+            i = int(np.searchsorted(ticks['time_msc'], self.clock * 1000, side='right'))
+            return ticks[i - 1] if i else None
+        i = int(np.searchsorted(self._m1(symbol)['time'], self.clock, side='right'))
+        if i == 0:
+            return None
+        ticks = self._synth_ticks(symbol, i - 1, i)
+        return ticks[ticks['time'] <= self.clock][-1]
+
+    def _visible(self, symbol, timeframe):
+        # Bars up to the clock, the last one rebuilt from the ticks seen so far
+        frame = self._frame(symbol, timeframe)
+        last = int(np.searchsorted(frame['time'], self.clock, side='right'))
+        if last == 0:
+            return frame[:0], None
+        start = frame['time'][last - 1]
+        ticks = self._ticks(symbol, start, self.clock)
+        forming = frame[last - 1].copy()
+        if len(ticks):
+            forming['high'], forming['low'] = ticks['bid'].max(), ticks['bid'].min()
+            forming['close'] = ticks['bid'][-1]
+            forming['tick_volume'] = len(ticks)
+        return frame[:last - 1], forming
+
+    # ----- Clock -----
+    def _advance(self, to):
+        if to > self.end:
+            self.clock = float(self.end)
+            self._match(self.end)
+            raise SimulationEnd()
+        self._match(to)
+        self.clock = float(to)
+
+    def sleep(self, seconds):
+        if self.speed:
+            self._real_sleep(max(0.0, seconds) / self.speed)
+        self._advance(self.clock + max(0.0, seconds))
+
+    def now(self):
+        return self.clock
+
+    # ----- Matching -----
+    def _next_tick(self, symbol):
+        upcoming = self._upcoming.get(symbol)
+        if upcoming is None or upcoming <= self.clock * 1000:
+            ticks = self._ticks(symbol, self.clock, self.clock + 3600)
+            later = ticks['time_msc'][ticks['time_msc'] > self.clock * 1000]
+            upcoming = self._upcoming[symbol] = later[0] if len(later) else self.clock * 1000 + 3600_000
+        return upcoming
+
+    def _match(self, to):
+        for ticket, pos in list(self.positions.items()):
+            if self._next_tick(pos['symbol']) > to * 1000:
+                continue  # No tick before `to`, nothing can trigger
+            ticks = self._ticks(pos['symbol'], self.clock, to)
+            ticks = ticks[ticks['time_msc'] > self.clock * 1000]
+            if not len(ticks):
+                continue
+            buy = pos['type'] == self.POSITION_TYPE_BUY
+            quote = ticks['bid'] if buy else ticks['ask']
+            hit_sl = (quote <= pos['sl']) if buy else (quote >= pos['sl'])
+            hit_tp = (quote >= pos['tp']) if buy else (quote <= pos['tp'])
+            hit_sl &= pos['sl'] > 0
+            hit_tp &= pos['tp'] > 0
+            hits = np.flatnonzero(hit_sl | hit_tp)
+            if len(hits):
+                k = hits[0]
+                reason = self.DEAL_REASON_SL if hit_sl[k] else self.DEAL_REASON_TP
+                price = pos['sl'] if hit_sl[k] else pos['tp']
+                self._close(ticket, pos['volume'], price, int(ticks['time_msc'][k]), reason)
+
+    def _profit(self, pos, price, volume):
+        direction = 1 if pos['type'] == self.POSITION_TYPE_BUY else -1
+        return (price - pos['price_open']) * direction / self.point * self.tick_value * volume
+
+    def _deal(self, pos, volume, price, time_msc, entry, reason, profit=0.0, order=0):
+        deal_type = pos['type'] if entry == self.DEAL_ENTRY_IN else 1 - pos['type']
+        deal = TradeDeal(len(self.deals) + 1, order, time_msc // 1000, time_msc, deal_type, entry,
+                         pos['magic'], pos['ticket'], reason, volume, price, 0.0, 0.0, profit, 0.0,
+                         pos['symbol'], pos['comment'], "")
+        self.deals.append(deal)
+        return deal
+
+    def _close(self, ticket, volume, price, time_msc, reason, order=0):
+        pos = self.positions[ticket]
+        volume = min(volume, pos['volume'])
+        profit = round(self._profit(pos, price, volume), 2)
+        self.balance += profit
+        pos['volume'] = round(pos['volume'] - volume, 8)
+        if pos['volume'] <= 0:
+            del self.positions[ticket]
+        return self._deal(pos, volume, price, time_msc, self.DEAL_ENTRY_OUT, reason, profit, order)
+
+    # ----- Terminal -----
+    @_api
+    def initialize(self, *args, **kwargs):
+        return True
+
+    @_api
+    def shutdown(self):
+        return None
+
+    def last_error(self):
+        return self.error
+
+    def version(self):
+        return (500, 0, "mt5sim")
+
+    @_api
+    def terminal_info(self):
+        return TerminalInfo(True, True, "mt5sim")
+
+    @_api
+    def symbol_select(self, symbol, enable=True):
+        self._m1(symbol)
+        return True
+
+    @_api
+    def symbol_info(self, symbol):
+        tick = self._last_tick(symbol)
+        bid, ask = (tick['bid'], tick['ask']) if tick is not None else (0.0, 0.0)
+        return SymbolInfo(symbol, self.point, 2, self.spread_points, self.tick_value, self.point,
+                          100.0, 0.01, 100.0, 0.01, self.SYMBOL_FILLING_FOK | self.SYMBOL_FILLING_IOC,
+                          0, bid, ask, True)
+
+    @_api
+    def symbol_info_tick(self, symbol):
+        tick = self._last_tick(symbol)
+        return None if tick is None else Tick(*tick.tolist())
+
+    @_api
+    def account_info(self):
+        profit = sum(self._profit(p, self._quote(p), p['volume']) for p in self.positions.values())
+        equity = self.balance + profit
+        return AccountInfo(1, round(self.balance, 2), round(equity, 2), round(profit, 2), 0.0,
+                           round(equity, 2), 100, "USD")
+
+    # ----- Rates and ticks -----
+    @_api
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        closed, forming = self._visible(symbol, timeframe)
+        if forming is None:
+            return None
+        if start_pos == 0:
+            rates = np.concatenate([closed[max(0, len(closed) - count + 1):], [forming]]) if count else closed[:0]
+        else:
+            end = len(closed) + 1 - start_pos
+            rates = closed[max(0, end - count):max(0, end)].copy()
+        return rates
+
+    @_api
+    def copy_rates_from(self, symbol, timeframe, date_from, count):
+        closed, forming = self._visible(symbol, timeframe)
+        rates = np.concatenate([closed, [forming]]) if forming is not None else closed
+        end = int(np.searchsorted(rates['time'], _seconds(date_from), side='right'))
+        return rates[max(0, end - count):end].copy()
+
+    @_api
+    def copy_rates_range(self, symbol, timeframe, date_from, date_to):
+        closed, forming = self._visible(symbol, timeframe)
+        rates = np.concatenate([closed, [forming]]) if forming is not None else closed
+        t = rates['time']
+        return rates[(t >= _seconds(date_from)) & (t <= _seconds(date_to))].copy()
+
+    @_api
+    def copy_ticks_from(self, symbol, date_from, count, flags):
+        start = _seconds(date_from)
+        ticks = self._ticks(symbol, start, min(self.clock, start + max(60, count * 15)))
+        return ticks[:count].copy()
+
+    @_api
+    def copy_ticks_range(self, symbol, date_from, date_to, flags):
+        return self._ticks(symbol, _seconds(date_from), min(self.clock, _seconds(date_to))).copy()
+
+    # ----- Positions and history -----
+    def _quote(self, pos):
+        tick = self._last_tick(pos['symbol'])
+        return tick['bid'] if pos['type'] == self.POSITION_TYPE_BUY else tick['ask']
+
+    def _position(self, pos):
+        price = self._quote(pos)
+        return TradePosition(pos['ticket'], pos['time'], pos['time'] * 1000, pos['type'], pos['magic'],
+                             pos['ticket'], pos['volume'], pos['price_open'], pos['sl'], pos['tp'],
+                             price, round(self._profit(pos, price, pos['volume']), 2),
+                             pos['symbol'], pos['comment'])
+
+    @_api
+    def positions_get(self, symbol=None, group=None, ticket=None):
+        return tuple(self._position(p) for p in self.positions.values()
+                     if (symbol is None or p['symbol'] == symbol) and (ticket is None or p['ticket'] == ticket))
+
+    @_api
+    def positions_total(self):
+        return len(self.positions)
+
+    @_api
+    def orders_get(self, symbol=None, group=None, ticket=None):
+        return ()
+
+    @_api
+    def orders_total(self):
+        return 0
+
+    @_api
+    def history_deals_get(self, date_from=None, date_to=None, group=None, ticket=None, position=None):
+        deals = self.deals
+        if ticket is not None:
+            return tuple(d for d in deals if d.ticket == ticket)
+        if position is not None:
+            return tuple(d for d in deals if d.position_id == position)
+        start, end = _seconds(date_from), _seconds(date_to)
+        return tuple(d for d in deals if start <= d.time <= end)
+
+    @_api
+    def history_deals_total(self, date_from, date_to):
+        start, end = _seconds(date_from), _seconds(date_to)
+        return sum(1 for d in self.deals if start <= d.time <= end)
+
+    # ----- Trading -----
+    def _result(self, retcode, request, deal=0, order=0, volume=0.0, price=0.0, comment=""):
+        tick = self._last_tick(request.get("symbol", "")) if request.get("symbol") else None
+        bid, ask = (tick['bid'], tick['ask']) if tick is not None else (0.0, 0.0)
+        return OrderSendResult(retcode, deal, order, volume, price, bid, ask, comment or str(retcode),
+                               0, 0, request)
+
+    def _check(self, request):
+        action = request.get("action")
+        if action == self.TRADE_ACTION_SLTP:
+            pos = self.positions.get(request.get("position"))
+            if pos is None:
+                return self.TRADE_RETCODE_POSITION_CLOSED, "Position doesn't exist"
+            sl, tp = request.get("sl", 0.0), request.get("tp", 0.0)
+            if sl == pos['sl'] and tp == pos['tp']:
+                return self.TRADE_RETCODE_NO_CHANGES, "No changes"
+            return self._check_stops(pos['symbol'], pos['type'], sl, tp)
+        if action != self.TRADE_ACTION_DEAL:
+            return self.TRADE_RETCODE_INVALID, "Unsupported action"
+        symbol, volume = request.get("symbol"), request.get("volume", 0.0)
+        if symbol is None or self._last_tick(symbol) is None:
+            return self.TRADE_RETCODE_INVALID, "Unknown symbol"
+        steps = volume / 0.01
+        if not 0.01 <= volume <= 100.0 or abs(steps - round(steps)) > 1e-6:
+            return self.TRADE_RETCODE_INVALID_VOLUME, "Invalid volume"
+        if "position" in request:
+            if request["position"] not in self.positions:
+                return self.TRADE_RETCODE_POSITION_CLOSED, "Position doesn't exist"
+            return 0, "Done"
+        return self._check_stops(symbol, request.get("type"), request.get("sl", 0.0), request.get("tp", 0.0))
+
+    def _check_stops(self, symbol, order_type, sl, tp):
+        tick = self._last_tick(symbol)
+        if order_type == self.ORDER_TYPE_BUY:
+            bad = (sl and sl >= tick['bid']) or (tp and tp <= tick['bid'])
+        else:
+            bad = (sl and sl <= tick['ask']) or (tp and tp >= tick['ask'])
+        return (self.TRADE_RETCODE_INVALID_STOPS, "Invalid stops") if bad else (0, "Done")
+
+    @_api
+    def order_check(self, request):
+        retcode, comment = self._check(request)
+        account = self.account_info.__wrapped__(self)
+        return OrderCheckResult(retcode, account.balance, account.equity, account.profit, 0.0,
+                                account.margin_free, 0.0, comment, request)
+
+    @_api
+    def order_send(self, request):
+        retcode, comment = self._check(request)
+        if retcode:
+            return self._result(retcode, request, comment=comment)
+        action = request["action"]
+        if action == self.TRADE_ACTION_SLTP:
+            pos = self.positions[request["position"]]
+            pos['sl'], pos['tp'] = request.get("sl", 0.0), request.get("tp", 0.0)
+            return self._result(self.TRADE_RETCODE_DONE, dict(request, symbol=pos['symbol']))
+        if self.requotes and self.rng.random() < self.requotes:
+            return self._result(self.TRADE_RETCODE_REQUOTE, request, comment="Requote")
+
+        tick = self._last_tick(request["symbol"])
+        buy = request["type"] == self.ORDER_TYPE_BUY
+        price = tick['ask'] if buy else tick['bid']
+        time_msc = int(self.clock * 1000)
+        order = self.next_ticket
+        self.next_ticket += 1
+        if "position" in request:
+            deal = self._close(request["position"], request["volume"], price, time_msc,
+                               self.DEAL_REASON_EXPERT, order)
+        else:
+            pos = {"ticket": order, "time": int(self.clock), "type": request["type"],
+                   "magic": request.get("magic", 0), "volume": request["volume"], "price_open": price,
+                   "sl": request.get("sl", 0.0), "tp": request.get("tp", 0.0),
+                   "symbol": request["symbol"], "comment": request.get("comment", "")}
+            self.positions[order] = pos
+            deal = self._deal(pos, pos['volume'], price, time_msc, self.DEAL_ENTRY_IN,
+                              self.DEAL_REASON_EXPERT, order=order)
+        return self._result(self.TRADE_RETCODE_DONE, request, deal.ticket, order, request["volume"], price)
+
+    @_api
+    def position_modify(self, ticket, sl=0.0, tp=0.0):
+        # Not part of the real package; tjr v2.py calls it, so accept it here
+        return self.order_send.__wrapped__(self, {"action": self.TRADE_ACTION_SLTP, "position": ticket,
+                                                  "sl": sl, "tp": tp})
+
+
+# ================== INSTALL ==================
+_saved = {}
+
+
+def install(sim, patch_clock=True):
+    sys.modules['MetaTrader5'] = sim
+    if not patch_clock:
+        return sim
+
+    try:
+        import pandas  # C extensions check the real datetime type at import
+    except ImportError:
+        pass
+
+    class SimDatetime(_datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls.fromtimestamp(sim.clock, tz)
+
+        @classmethod
+        def utcnow(cls):
+            return cls.utcfromtimestamp(sim.clock)
+
+    _saved.update(time=time.time, sleep=time.sleep, monotonic=time.monotonic,
+                  datetime=_datetime.datetime)
+    time.time = sim.now
+    time.sleep = sim.sleep
+    time.monotonic = sim.now
+    _datetime.datetime = SimDatetime
+    return sim
+
+
+def uninstall():
+    sys.modules.pop('MetaTrader5', None)
+    if _saved:
+        time.time, time.sleep, time.monotonic = _saved['time'], _saved['sleep'], _saved['monotonic']
+        _datetime.datetime = _saved['datetime']
+        _saved.clear()
+
+
+@contextmanager
+def session(sim, patch_clock=True):
+    loaded = set(sys.modules)
+    install(sim, patch_clock)
+    scratch = tempfile.mkdtemp(prefix="mt5sim-")
+    import bar_store
+    import recorder
+    import exec_analytics
+    bar_store.DATA_DIR = scratch  # Simulated bars must not reach the real store
+    recorder.DATA_DIR = scratch
+    exec_analytics.PATH = os.path.join(scratch, "executions.jsonl")
+    try:
+        yield sim
+    finally:
+        uninstall()
+        shutil.rmtree(scratch, ignore_errors=True)
+        for name in set(sys.modules) - loaded:
+            del sys.modules[name]  # Helper modules bound to this simulator
+
+
+def load_recording(root, start=None, days=None):
+    # Simulator arguments replaying a recorder.py directory. The reader
+    # imports the gateway, so it is loaded inside a throwaway session.
+    with session(Simulator(), patch_clock=False):
+        import recorder
+        return recorder.Recording(root).replay(start, days)
+
+
+def run_script(path, sim):
+    started = time.perf_counter()
+    with session(sim):
+        try:
+            runpy.run_path(path, run_name="__main__")
+        except SimulationEnd:
+            pass
+    return time.perf_counter() - started
+
+
+# ================== CLI ==================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a bot against the simulated terminal")
+    parser.add_argument("script")
+    parser.add_argument("--days", type=int, default=None, help="Simulated trading days (default 5, or all recorded)")
+    parser.add_argument("--history-days", type=int, default=90)
+    parser.add_argument("--csv", action="append", default=[], metavar="SYMBOL=PATH",
+                        help="M1 bars for a symbol (others get synthetic data)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds charged per broker call")
+    parser.add_argument("--spread", type=int, default=20, help="Spread in points")
+    parser.add_argument("--requotes", type=float, default=0.0, help="Requote probability per order")
+    parser.add_argument("--recording", metavar="DIR", help="Replay a recorder.py directory instead")
+    parser.add_argument("--start", metavar="YYYY-MM-DD", help="First recorded day to replay (default the last)")
+    parser.add_argument("--speed", type=float, default=None, help="Pace to N x real time (default flat out)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    options = dict(spread_points=args.spread, latency=args.latency, requotes=args.requotes,
+                   speed=args.speed, seed=args.seed)
+    if args.recording:
+        sim = Simulator(**load_recording(args.recording, args.start, args.days), **options)
+    else:
+        bars = {}
+        for item in args.csv:
+            symbol, path = item.split("=", 1)
+            bars[symbol] = load_csv(path)
+        start = int(min(b['time'][0] for b in bars.values())) if bars else None
+        sim = Simulator(bars, start=start, history_days=args.history_days, days=args.days or 5, **options)
+    wall = run_script(args.script, sim)
+
+    print(f"Simulated {sim.days} days in {wall:.1f} s")
+    print(f"Broker calls: {sum(sim.calls.values())} {dict(sim.calls.most_common())}")
+    closed = [d for d in sim.deals if d.entry == sim.DEAL_ENTRY_OUT]
+    print(f"Trades closed: {len(closed)}, balance {sim.balance:.2f}")
@@ -0,0 +1,205 @@
+from gateway import mt5
+import logging
+
+import time as sleep
+
+# ================== SETTINGS ==================
+REFRESH = 60.0  # Seconds between full reloads while holding, to pick up manual SL/TP edits
+DEAL_SLACK = 86400  # Deal times are server time; widen history windows by a day
+DEVIATION = 20
+
+
+# ================== BOOK ==================
+class BookPosition:
+    __slots__ = ('ticket', 'symbol', 'type', 'magic', 'price_open', 'volume', 'initial_volume',
+                 'sl', 'tp', 'risk', 'partials')
+
+    def __init__(self, p):
+        self.ticket, self.symbol, self.type, self.magic = p.ticket, p.symbol, p.type, p.magic
+        self.price_open = p.price_open
+        self.volume = self.initial_volume = p.volume
+        self.sl, self.tp = p.sl, p.tp
+        # 1R is the distance to the stop the position opened with. Picked up
+        # after a restart with the stop already moved, R-based rules are off.
+        self.risk = abs(p.price_open - p.sl) if p.sl else 0.0
+        self.partials = 0  # Partial closes done
+
+    @property
+    def direction(self):
+        return 1 if self.type == mt5.POSITION_TYPE_BUY else -1
+
+
+class PositionManager:
+    # Local book of open positions kept in step with the terminal by events
+    # instead of a positions_get() per loop: positions_total() and the deal
+    # count are compared each sync and the book is reloaded only when one
+    # moved (or every REFRESH seconds while holding). Stop management then
+    # runs only for symbols whose quote changed, and only sends requests
+    # that actually move a stop.
+    #
+    # stages   ((trigger_r, lock_r), ...): once price is trigger_r R in profit
+    #          the stop goes to lock_r R (0 = breakeven)
+    # trail    after the last stage, trail the stop this many R behind price
+    # partials ((trigger_r, fraction), ...): close `fraction` of the opening
+    #          volume once price is trigger_r R in profit
+    def __init__(self, magic, symbol=None, stages=((1.0, 0.0),), trail=None, partials=(), refresh=REFRESH):
+        self.magic = magic
+        self.symbol = symbol
+        self.stages = tuple(sorted(stages))
+        self.trail = trail
+        self.partials = tuple(sorted(partials))
+        self.refresh = refresh
+        self.book = {}  # ticket -> BookPosition, ours only
+        self.total = None  # positions_total() at the last reload
+        self.since = int(sleep.time()) - DEAL_SLACK  # Deal window start, DEAL_SLACK behind the newest deal read
+        self.deal_count = None
+        self.last_deal = 0  # Highest deal ticket seen
+        self.last_time = None  # Its time
+        self.reloaded = 0.0
+        self.quotes = {}  # symbol -> (bid, ask) rules last ran on
+        self.info = {}
+        self.on_deal = None  # Optional hook(deal) for each new deal of ours
+        self.calls = 0  # Broker requests sent (modify/close)
+
+    # ----- Events -----
+    def sync(self):
+        # Returns True when the book was reloaded
+        total = mt5.positions_total()
+        deals = mt5.history_deals_total(self.since, int(sleep.time()) + DEAL_SLACK)
+        stale = bool(self.book) and sleep.monotonic() - self.reloaded >= self.refresh
+        if total == self.total and deals == self.deal_count and not stale:
+            return False
+        if deals != self.deal_count and self._read_deals():
+            deals = None  # The window starts at the cursor, so once it moves the count is recounted
+        self._reload()
+        self.total, self.deal_count = total, deals
+        return True
+
+    def _read_deals(self):
+        # Returns True when the window start moved
+        deals = mt5.history_deals_get(self.since, int(sleep.time()) + DEAL_SLACK)
+        for d in sorted(deals or (), key=lambda d: d.ticket):
+            if d.ticket <= self.last_deal:
+                continue
+            self.last_deal = d.ticket
+            self.last_time = max(self.last_time or d.time, d.time)
+            if d.magic == self.magic and self.on_deal is not None:
+                self.on_deal(d)
+        if self.last_time is None or self.last_time - DEAL_SLACK <= self.since:
+            return False
+        self.since = self.last_time - DEAL_SLACK
+        return True
+
+    def _reload(self):
+        positions = mt5.positions_get(symbol=self.symbol) if self.symbol else mt5.positions_get()
+        if positions is None:
+            return  # Terminal hiccup; keep the book and retry next sync
+        book = {}
+        for p in positions:
+            if p.magic != self.magic:
+                continue
+            entry = self.book.get(p.ticket) or BookPosition(p)
+            entry.volume, entry.sl, entry.tp = p.volume, p.sl, p.tp
+            book[p.ticket] = entry
+        self.book = book
+        self.reloaded = sleep.monotonic()
+
+    # ----- Queries -----
+    def open_positions(self, symbol=None):
+        return [p for p in self.book.values() if symbol is None or p.symbol == symbol]
+
+    def has_open(self, symbol=None):
+        return any(symbol is None or p.symbol == symbol for p in self.book.values())
+
+    # ----- Rules -----
+    def manage(self, tick=None):
+        # `tick` (anything with bid/ask) is used as the quote of self.symbol;
+        # other symbols are asked for only while we hold them
+        self.sync()
+        for symbol in {p.symbol for p in self.book.values()}:
+            quote = tick if tick is not None and symbol == self.symbol else mt5.symbol_info_tick(symbol)
+            if quote is None:
+                continue
+            prices = (quote.bid, quote.ask)
+            if self.quotes.get(symbol) == prices:
+                continue  # Same quote as last pass, same decisions
+            self.quotes[symbol] = prices
+            for p in self.open_positions(symbol):
+                self._apply(p, *prices)
+
+    def target_sl(self, p, price):
+        # Best stop the rules allow at `price`, or None
+        moved = (price - p.price_open) * p.direction / p.risk
+        lock = None
+        for trigger, level in self.stages:
+            if moved < trigger:
+                break
+            lock = level if lock is None else max(lock, level)
+        if self.trail is not None and (not self.stages or moved >= self.stages[-1][0]):
+            lock = moved - self.trail if lock is None else max(lock, moved - self.trail)
+        return None if lock is None else p.price_open + lock * p.risk * p.direction
+
+    def _apply(self, p, bid, ask):
+        if p.risk <= 0:
+            return
+        price = bid if p.direction > 0 else ask  # Where the position would close
+        moved = (price - p.price_open) * p.direction / p.risk
+        while p.partials < len(self.partials) and moved >= self.partials[p.partials][0]:
+            if not self._close_part(p, self.partials[p.partials][1], price):
+                break
+            p.partials += 1
+
+        sl = self.target_sl(p, price)
+        if sl is None:
+            return
+        info = self._info(p.symbol)
+        sl = round(sl, info.digits)
+        if p.sl and (sl - p.sl) * p.direction < info.point / 2:
+            return  # Never loosen, and don't resend a stop already in place
+        self._modify(p, sl)
+
+    def _info(self, symbol):
+        info = self.info.get(symbol)
+        if info is None:
+            info = self.info[symbol] = mt5.symbol_info(symbol)
+        return info
+
+    # ----- Requests -----
+    def _modify(self, p, sl):
+        self.calls += 1
+        result = mt5.order_send({
+            "action": mt5.TRADE_ACTION_SLTP,
+            "symbol": p.symbol,
+            "position": p.ticket,
+            "sl": sl,
+            "tp": p.tp,  # SLTP replaces both; leaving tp out would clear it
+        })
+        if result is not None and result.retcode in (mt5.TRADE_RETCODE_DONE, mt5.TRADE_RETCODE_NO_CHANGES):
+            p.sl = sl
+            return True
+        logging.error(f"Stop move on {p.ticket} to {sl} failed: {getattr(result, 'comment', mt5.last_error())}")
+        return False
+
+    def _close_part(self, p, fraction, price):
+        info = self._info(p.symbol)
+        step = info.volume_step
+        volume = round(int(p.initial_volume * fraction / step + 1e-9) * step, 8)
+        if volume < info.volume_min or p.volume - volume < info.volume_min - 1e-9:
+            return True  # Too small to split; count the stage as done
+        self.calls += 1
+        result = mt5.order_send({
+            "action": mt5.TRADE_ACTION_DEAL,
+            "symbol": p.symbol,
+            "position": p.ticket,
+            "volume": volume,
+            "type": mt5.ORDER_TYPE_SELL if p.direction > 0 else mt5.ORDER_TYPE_BUY,
+            "price": price,
+            "deviation": DEVIATION,
+            "magic": p.magic,
+            "type_filling": mt5.ORDER_FILLING_IOC,
+        })
+        if result is not None and result.retcode == mt5.TRADE_RETCODE_DONE:
+            p.volume = round(p.volume - volume, 8)
+            return True
+        logging.error(f"Partial close of {p.ticket} failed: {getattr(result, 'comment', mt5.last_error())}")
+        return False
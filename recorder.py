@@ -0,0 +1,312 @@
+from gateway import mt5
+import os
+import sys
+import queue
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from collections import Counter
+from datetime import datetime, timezone
+
+from bar_store import RATES, server_name, timeframe_name
+
+# ================== SETTINGS ==================
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
+# Layout returned by copy_ticks_*; symbol_info_tick() results are stored the same way
+TICKS = np.dtype([('time', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'), ('volume', '<u8'),
+                  ('time_msc', '<i8'), ('flags', '<u4'), ('volume_real', '<f8')])
+TICK_CALLS = {'symbol_info_tick', 'copy_ticks_from', 'copy_ticks_range'}
+RATE_CALLS = {'copy_rates_from', 'copy_rates_from_pos', 'copy_rates_range'}
+BATCH = 256  # Results written per flush
+UNITS = {"M": 60, "H": 3600, "D": 86400, "W": 604800}
+
+
+def day_name(day):
+    return datetime.fromtimestamp(day * 86400, timezone.utc).strftime("%Y-%m-%d")
+
+
+def parse_day(name):
+    # "YYYY-MM-DD" -> days since the epoch, None for anything else
+    try:
+        return int(datetime.strptime(name, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()) // 86400
+    except ValueError:
+        return None
+
+
+def kind_seconds(kind):
+    # Stream name -> bar length; "M5" -> 300
+    return int(kind[1:]) * UNITS[kind[0]]
+
+
+def segment_path(root, day, symbol, kind):
+    return os.path.join(root, day_name(day), f"{symbol}_{kind}.bin")
+
+
+def tick_bars(ticks, period=60):
+    # Bid bars from ticks, the way the terminal builds them
+    ticks = ticks[ticks['bid'] > 0]
+    if not len(ticks):
+        return np.zeros(0, RATES)
+    bucket = ticks['time'] // period * period
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(ticks)]
+    bid = ticks['bid']
+    out = np.zeros(len(starts), RATES)
+    out['time'] = bucket[starts]
+    out['open'] = bid[starts]
+    out['high'] = np.maximum.reduceat(bid, starts)
+    out['low'] = np.minimum.reduceat(bid, starts)
+    out['close'] = bid[ends - 1]
+    out['tick_volume'] = ends - starts
+    return out
+
+
+# ================== RECORDER ==================
+class Recorder:
+    # Keeps every tick and closed bar the gateway hands back. Rows go to
+    # daily segments <root>/<YYYY-MM-DD>/<symbol>_<ticks|TF>.bin in the
+    # terminal's own fixed-width layouts. The gateway hook only queues the
+    # result; a writer thread drops rows already on disk, so each stream is
+    # strictly increasing in time and a segment is searched by bisecting.
+    def __init__(self, root=None, batch=BATCH):
+        self.root = root or os.path.join(DATA_DIR, server_name())  # Brokers' data differ, keep them apart
+        self.batch = batch
+        self.queue = queue.SimpleQueue()
+        self.last = {}  # (symbol, kind) -> newest time written (time_msc for ticks)
+        self.files = {}  # (symbol, kind) -> (day, open segment)
+        self.rows = Counter()  # (symbol, kind) -> rows written this run
+        self.errors = 0
+        self.writer = None
+
+    def attach(self, gateway):
+        gateway.on_result = self.observe
+        if self.writer is None:
+            self.writer = threading.Thread(target=self._run, name="recorder", daemon=True)
+            self.writer.start()
+
+    def observe(self, name, args, kwargs, result):
+        # Gateway worker thread: O(1), no copies
+        if name in TICK_CALLS or name in RATE_CALLS:
+            self.queue.put((name, args, kwargs, result))
+
+    def flush(self, timeout=None):
+        # Block until everything queued so far is on disk
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    # ----- Writer thread -----
+    def _run(self):
+        while True:
+            items = [self.queue.get()]
+            while len(items) < self.batch:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            waiting = []
+            for item in items:
+                if isinstance(item, threading.Event):
+                    waiting.append(item)
+                    continue
+                try:
+                    self._write(*item)
+                except Exception as e:
+                    self.errors += 1
+                    logging.error(f"Recorder dropped a {item[0]} result: {e}")
+            for _, f in self.files.values():
+                f.flush()
+            for done in waiting:
+                done.set()
+
+    def _write(self, name, args, kwargs, result):
+        symbol = args[0] if args else kwargs['symbol']
+        if name == 'symbol_info_tick':
+            rows = np.array([tuple(getattr(result, field) for field in TICKS.names)], TICKS)
+            self._append(symbol, "ticks", rows, rows['time_msc'], 86_400_000)
+        elif name in TICK_CALLS:
+            self._append(symbol, "ticks", result, result['time_msc'], 86_400_000)
+        else:
+            timeframe = args[1] if len(args) > 1 else kwargs['timeframe']
+            start_pos = args[2] if len(args) > 2 else kwargs.get('start_pos', 0)
+            closed = result if name == 'copy_rates_from_pos' and start_pos > 0 else result[:-1]  # Last may be forming
+            self._append(symbol, timeframe_name(timeframe), closed, closed['time'], 86400)
+
+    def _append(self, symbol, kind, rows, times, day_length):
+        stream = (symbol, kind)
+        last = self.last.get(stream)
+        if last is None:
+            last = self.last[stream] = self._tail(symbol, kind)
+        if not len(times) or times[-1] <= last:
+            return 0  # Seen it all before: the common case
+        start = int(np.searchsorted(times, last, side='right'))
+        rows, times = rows[start:], times[start:]
+        dtype = TICKS if kind == "ticks" else RATES
+        if rows.dtype != dtype:
+            conformed = np.zeros(len(rows), dtype)
+            for field in dtype.names:
+                if field in rows.dtype.names:
+                    conformed[field] = rows[field]
+            rows = conformed
+        days = times // day_length
+        cuts = np.flatnonzero(days[1:] != days[:-1]) + 1
+        for chunk, day in zip(np.split(rows, cuts), days[np.r_[0, cuts]].tolist()):
+            self._segment(stream, day, dtype).write(chunk.tobytes())
+        self.last[stream] = int(times[-1])
+        self.rows[stream] += len(rows)
+        return len(rows)
+
+    def _segment(self, stream, day, dtype):
+        # Streams only move forward, so each keeps one segment open: today's
+        current = self.files.get(stream)
+        if current is not None and current[0] == day:
+            return current[1]
+        if current is not None:
+            current[1].close()
+        path = segment_path(self.root, day, *stream)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        f = open(path, "ab")
+        torn = f.tell() % dtype.itemsize
+        if torn:
+            f.truncate(f.tell() - torn)  # A crash mid-append left half a row
+        self.files[stream] = (day, f)
+        return f
+
+    def _tail(self, symbol, kind):
+        # Newest time already on disk, so a restart appends after it
+        key, dtype = ('time_msc', TICKS) if kind == "ticks" else ('time', RATES)
+        days = [parse_day(name) for name in os.listdir(self.root)] if os.path.isdir(self.root) else []
+        for day in sorted((d for d in days if d is not None), reverse=True):
+            path = segment_path(self.root, day, symbol, kind)
+            rows = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+            if rows:
+                return int(np.memmap(path, dtype, mode='r', shape=(rows,))[key][-1])
+        return -1
+
+
+# ================== REPLAY ==================
+class Recording:
+    # Reads a recorder directory back. Segments are memory-mapped and sliced
+    # by bisecting their time column, so a read pages in only the rows asked
+    # for; a segment is remapped when it has grown (safe while recording).
+    def __init__(self, root=None):
+        self.root = root or os.path.join(DATA_DIR, server_name())
+        self.maps = {}  # path -> (size, memmap)
+
+    def days(self):
+        days = [parse_day(name) for name in os.listdir(self.root)] if os.path.isdir(self.root) else []
+        return sorted(d for d in days if d is not None)
+
+    def streams(self):
+        # {symbol: {kind, ...}} over all days
+        streams = {}
+        for day in self.days():
+            for name in os.listdir(os.path.join(self.root, day_name(day))):
+                if name.endswith(".bin"):
+                    symbol, kind = name[:-4].rsplit("_", 1)
+                    streams.setdefault(symbol, set()).add(kind)
+        return streams
+
+    def _segment(self, day, symbol, kind, dtype):
+        path = segment_path(self.root, day, symbol, kind)
+        if not os.path.exists(path):
+            return None
+        size = os.path.getsize(path)
+        cached = self.maps.get(path)
+        if cached is None or cached[0] != size:
+            rows = size // dtype.itemsize
+            mapped = np.memmap(path, dtype, mode='r', shape=(rows,)) if rows else np.zeros(0, dtype)
+            cached = self.maps[path] = (size, mapped)
+        return cached[1]
+
+    def _read(self, symbol, kind, time_from, time_to):
+        # Rows with time_from <= time <= time_to (epoch seconds, either may be None)
+        key, dtype, scale = ('time_msc', TICKS, 1000) if kind == "ticks" else ('time', RATES, 1)
+        parts = []
+        for day in self.days():
+            if time_from is not None and (day + 1) * 86400 <= time_from:
+                continue
+            if time_to is not None and day * 86400 > time_to:
+                break
+            segment = self._segment(day, symbol, kind, dtype)
+            if segment is None or not len(segment):
+                continue
+            times = segment[key]
+            start = 0 if time_from is None else int(np.searchsorted(times, time_from * scale))
+            end = len(segment) if time_to is None else int(np.searchsorted(times, (time_to + 1) * scale))
+            if end > start:
+                parts.append(segment[start:end])
+        if not parts:
+            return np.zeros(0, dtype)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)  # One day stays zero-copy
+
+    def ticks(self, symbol, time_from=None, time_to=None):
+        return self._read(symbol, "ticks", time_from, time_to)
+
+    def rates(self, symbol, timeframe, time_from=None, time_to=None):
+        return self._read(symbol, timeframe_name(timeframe), time_from, time_to)
+
+    def frame(self, symbol, timeframe, time_from=None, time_to=None):
+        # The DataFrame get_df() builds, over any recorded range
+        df = pd.DataFrame(self.rates(symbol, timeframe, time_from, time_to))
+        df['time'] = pd.to_datetime(df['time'], unit='s')
+        return df
+
+    def base_bars(self, symbol):
+        # The simulator's M1 series: the finest bars recorded, continued with
+        # M1 bars built from the ticks recorded after them
+        kinds = sorted((k for k in self.streams().get(symbol, ()) if k != "ticks"), key=kind_seconds)
+        bars = self._read(symbol, kinds[0], None, None) if kinds else np.zeros(0, RATES)
+        after = int(bars['time'][-1]) + kind_seconds(kinds[0]) if len(bars) else None
+        built = tick_bars(self.ticks(symbol, after))
+        return np.concatenate([bars, built]) if len(built) else bars
+
+    def replay(self, start=None, days=None):
+        # Simulator(**kwargs) that serves the recording from `start` (epoch
+        # seconds or "YYYY-MM-DD"; default the last recorded day) for `days`
+        recorded = self.days()
+        if not recorded:
+            raise ValueError(f"Nothing recorded under {self.root}")
+        start = parse_day(start) if isinstance(start, str) else (recorded[-1] if start is None else start // 86400)
+        bars, ticks = {}, {}
+        for symbol in self.streams():
+            base = self.base_bars(symbol)
+            if len(base):
+                bars[symbol] = base
+                recorded_ticks = self.ticks(symbol)
+                if len(recorded_ticks):
+                    ticks[symbol] = recorded_ticks
+        if not bars:
+            raise ValueError(f"No bars recorded under {self.root}")
+        first = min(int(b['time'][0]) for b in bars.values()) // 86400
+        start = max(start, first)
+        return {"bars": bars, "ticks": ticks, "start": first * 86400, "history_days": start - first,
+                "days": days or recorded[-1] - start + 1}
+
+
+# ================== REGISTRY ==================
+_recorder = None
+
+
+def start(root=None):
+    # The process-wide recorder, hooked into the gateway on first use
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder(root)
+        _recorder.attach(mt5)
+    return _recorder
+
+
+# ================== CLI ==================
+if __name__ == "__main__":
+    # python recorder.py [ROOT] - summarize a recording (default: this account's server)
+    if len(sys.argv) < 2 and not mt5.initialize():
+        raise RuntimeError("MT5 failed to initialize")
+    recording = Recording(sys.argv[1] if len(sys.argv) > 1 else None)
+    days = recording.days()
+    print(f"{recording.root}: {len(days)} days" + (f", {day_name(days[0])} .. {day_name(days[-1])}" if days else ""))
+    for symbol, kinds in sorted(recording.streams().items()):
+        for kind in sorted(kinds):
+            rows = len(recording._read(symbol, kind, None, None))
+            print(f"  {symbol} {kind}: {rows} rows")
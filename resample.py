@@ -0,0 +1,39 @@
+import numpy as np
+
+# ================== BUCKETS ==================
+# MT5 bar times are server-time epochs, so flooring them lands on the same
+# boundaries the broker uses (H4 at 00/04/08.. server time, D1 at server
+# midnight) whatever the server's UTC offset or DST state.
+WEEK = 7 * 86400
+WEEK_OFFSET = 3 * 86400  # W1 bars open on Sunday; the epoch was a Thursday
+
+
+def bucket(times, seconds):
+    # Open time of the `seconds`-long bar each time falls in
+    offset = WEEK_OFFSET if seconds % WEEK == 0 else 0
+    return (times - offset) // seconds * seconds + offset
+
+
+def derivable(seconds, base_seconds):
+    return seconds > base_seconds and seconds % base_seconds == 0
+
+
+# ================== AGGREGATION ==================
+def aggregate(rates, seconds):
+    # copy_rates_* array -> higher timeframe bars in the same layout. A bar
+    # opens with its first base bar, as the broker's opens with its first tick.
+    if not len(rates):
+        return rates[:0].copy()
+    keys = bucket(rates['time'], seconds)
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    ends = np.concatenate((starts[1:], [len(rates)])) - 1
+    out = np.zeros(len(starts), rates.dtype)
+    out['time'] = keys[starts]
+    out['open'] = rates['open'][starts]
+    out['high'] = np.maximum.reduceat(rates['high'], starts)
+    out['low'] = np.minimum.reduceat(rates['low'], starts)
+    out['close'] = rates['close'][ends]
+    out['tick_volume'] = np.add.reduceat(rates['tick_volume'], starts)
+    out['spread'] = np.minimum.reduceat(rates['spread'], starts)
+    out['real_volume'] = np.add.reduceat(rates['real_volume'], starts)
+    return out
@@ -0,0 +1,169 @@
+from gateway import mt5
+import os
+import json
+import logging
+
+import time as sleep
+
+from scheduler import server_offset
+
+# ================== SETTINGS ==================
+POLL = 1.0  # Seconds between deal polls; can_trade() in between is pure memory
+SLACK = 86400  # Deal times are server time; widen history windows by a day
+RESYNC = 3600  # Seconds between server clock re-syncs
+OUT_ENTRIES = ('DEAL_ENTRY_OUT', 'DEAL_ENTRY_INOUT', 'DEAL_ENTRY_OUT_BY')
+
+
+# ================== LEDGER ==================
+class RiskLedger:
+    # Running PnL per magic number, fed by a (ticket, time) cursor over
+    # history_deals_get so each deal is read and applied once. Per magic it
+    # keeps the server day's net PnL, the day's losing streak and the last
+    # exit time; the account's day PnL gives the balance the day started on.
+    # State is saved to `path` so a restart resumes from the cursor; a cold
+    # start reads back to the start of the server day.
+    #
+    # max_daily_loss  percent of the day's opening balance
+    # max_losses      consecutive losing exits; blocks until the next day
+    # cooldown        seconds after an exit before the next entry
+    def __init__(self, symbol, path=None, max_daily_loss=None, max_losses=None, cooldown=0, poll=POLL):
+        self.symbol = symbol  # Its quotes carry the server clock
+        self.path = path
+        self.max_daily_loss = max_daily_loss
+        self.max_losses = max_losses
+        self.cooldown = cooldown
+        self.poll = poll
+        self.out_entries = {getattr(mt5, name) for name in OUT_ENTRIES if hasattr(mt5, name)}
+        self.last_ticket = 0
+        self.last_time = None
+        self.seen = None  # history_deals_total() over the cursor window at the last read
+        self.magics = {}  # magic -> {"day", "pnl", "streak", "last_exit"}
+        self.day = None
+        self.day_pnl = 0.0  # Whole account, deposits included
+        self.balance = None
+        self.offset = 0  # Server clock minus local clock
+        self.synced = None  # monotonic() of the last good sync
+        self.polled = None
+        self.reason = None  # Why the last can_trade() said no
+        self.load()
+
+    # ----- Persistence -----
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Risk ledger state unreadable, rebuilding: {e}")
+            return
+        self.last_ticket, self.last_time = state["last_ticket"], state["last_time"]
+        self.day, self.day_pnl = state["day"], state["day_pnl"]
+        self.magics = {int(magic): entry for magic, entry in state["magics"].items()}
+
+    def save(self):
+        if not self.path:
+            return
+        state = {"last_ticket": self.last_ticket, "last_time": self.last_time, "day": self.day,
+                 "day_pnl": self.day_pnl, "magics": self.magics}
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.path)  # Never leave a half-written file behind
+        except OSError as e:
+            logging.error(f"Risk ledger save failed: {e}")
+
+    # ----- Deals -----
+    def server_time(self):
+        # Local clock plus the scheduler's quarter-hour offset, re-synced every
+        # RESYNC seconds (DST shifts); stale ticks keep the last good offset
+        now = sleep.monotonic()
+        if self.synced is None or now - self.synced >= RESYNC:
+            offset = server_offset(self.symbol)
+            if offset is not None:
+                self.offset, self.synced = offset, now
+        return int(sleep.time()) + self.offset
+
+    def update(self, force=False):
+        # Apply deals newer than the cursor; one integer read when there are none
+        now = sleep.monotonic()
+        if not force and self.polled is not None and now - self.polled < self.poll:
+            return 0
+        self.polled = now
+        server_now = self.server_time()
+        before = self.last_time
+        start = (before if before is not None else server_now // 86400 * 86400) - SLACK
+        end = server_now + SLACK
+        total = mt5.history_deals_total(start, end)
+        if total is None or total == self.seen:
+            self._roll(server_now // 86400)
+            return 0
+        deals = mt5.history_deals_get(start, end) or ()
+        fresh = sorted((d for d in deals if d.ticket > self.last_ticket), key=lambda d: d.ticket)
+        for deal in fresh:
+            self.record(deal)
+        # The window starts at the cursor, so once it moves the count is recounted
+        self.seen = total if self.last_time == before else None
+        self._roll(server_now // 86400)
+        if fresh:
+            account = mt5.account_info()
+            self.balance = account.balance if account is not None else self.balance
+            self.save()
+        return len(fresh)
+
+    def record(self, deal):
+        # O(1) per deal
+        self.last_ticket = max(self.last_ticket, deal.ticket)
+        self.last_time = max(self.last_time or 0, deal.time)
+        day = deal.time // 86400
+        net = deal.profit + deal.commission + deal.swap + deal.fee
+        self._roll(day)
+        if day == self.day:
+            self.day_pnl += net
+        if not deal.magic:
+            return  # Deposits, manual trades
+        entry = self.magics.setdefault(deal.magic, {"day": day, "pnl": 0.0, "streak": 0, "last_exit": None})
+        if day > entry["day"]:
+            entry["day"], entry["pnl"], entry["streak"] = day, 0.0, 0
+        if day == entry["day"]:
+            entry["pnl"] += net
+        if deal.entry in self.out_entries:
+            entry["streak"] = entry["streak"] + 1 if net < 0 else 0 if net > 0 else entry["streak"]
+            entry["last_exit"] = max(entry["last_exit"] or 0, deal.time)
+
+    def _roll(self, day):
+        if self.day is None or day > self.day:
+            self.day, self.day_pnl = day, 0.0
+
+    def on_deal(self, deal):
+        # PositionManager.on_deal hook: an exit moves the limits, so apply it
+        # now instead of letting can_trade() answer from the last poll
+        if deal.entry in self.out_entries:
+            self.update(force=True)
+
+    # ----- Checks -----
+    def can_trade(self, magic):
+        self.update()
+        entry = self.magics.get(magic)
+        if entry is None:
+            self.reason = None
+            return True
+        server_now = self.server_time()
+        today = entry["day"] == server_now // 86400  # Else pnl and streak are yesterday's
+        if self.max_daily_loss is not None and today:
+            if self.balance is None:
+                account = mt5.account_info()
+                self.balance = account.balance if account is not None else None
+            opening = (self.balance or 0.0) - self.day_pnl
+            if opening > 0 and -entry["pnl"] >= opening * self.max_daily_loss / 100:
+                self.reason = f"daily loss {entry['pnl']:.2f}"
+                return False
+        if self.max_losses is not None and today and entry["streak"] >= self.max_losses:
+            self.reason = f"{entry['streak']} losses in a row"
+            return False
+        if self.cooldown and entry["last_exit"] is not None and server_now - entry["last_exit"] < self.cooldown:
+            self.reason = "cooling down"
+            return False
+        self.reason = None
+        return True
@@ -0,0 +1,148 @@
+from gateway import mt5
+import numpy as np
+
+import sys
+import time as sleep
+import logging
+
+import bar_cache
+
+# ================== SETTINGS ==================
+# Same chain as tjr v2.py, evaluated for the whole watchlist at once
+HTF = mt5.TIMEFRAME_H4
+ITF = mt5.TIMEFRAME_H1
+LTF = mt5.TIMEFRAME_M5
+BARS = {HTF: 200, ITF: 72, LTF: 100}  # 72 H1 bars always span the previous session
+KEY_LEVEL_PCT = 0.03
+DISP_WINDOW = 20
+DISP_MULT = 1.5
+FIELDS = ('time', 'open', 'high', 'low', 'close')
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+
+# ================== DATA ==================
+def load(symbols, timeframe, bars, closed=False):
+    # symbol -> last `bars` bars, skipping symbols without enough history
+    windows = {}
+    for symbol in symbols:
+        cache = bar_cache.get_cache(symbol, timeframe, bars + 1)
+        if not cache.update():
+            continue
+        window = cache.window(bars, closed)
+        if len(window) == bars:
+            windows[symbol] = window
+    return windows
+
+
+def stack(windows, symbols):
+    # symbol x bar matrices, one per field
+    return {f: np.stack([windows[s][f] for s in symbols]) for f in FIELDS}
+
+
+# ================== GATES ==================
+def displacement(o, c, window=DISP_WINDOW, mult=DISP_MULT):
+    bodies = np.abs(c - o)
+    avg = bodies[:, -window:].mean(axis=1)
+    strength = np.divide(bodies[:, -1], avg, out=np.zeros(len(avg)), where=avg > 0)
+    return strength > mult, strength
+
+
+def _last_two(mask, values):
+    cols = np.arange(mask.shape[1])
+    idx = np.where(mask, cols, -1)
+    last = idx.max(axis=1)
+    prev = np.where(idx == last[:, None], -1, idx).max(axis=1)
+    pick = lambda i: np.take_along_axis(values, np.maximum(i, 0)[:, None], axis=1)[:, 0]
+    return prev >= 0, pick(last), pick(prev)
+
+
+def market_structure(h, l):
+    # +1 bullish / -1 bearish / 0 none per symbol, as in tjr v2.py
+    ph = np.zeros(h.shape, dtype=bool)
+    pl = np.zeros(l.shape, dtype=bool)
+    ph[:, 1:-1] = (h[:, :-2] < h[:, 1:-1]) & (h[:, 2:] < h[:, 1:-1])
+    pl[:, 1:-1] = (l[:, :-2] > l[:, 1:-1]) & (l[:, 2:] > l[:, 1:-1])
+    ok_h, high, prev_high = _last_two(ph, h)
+    ok_l, low, prev_low = _last_two(pl, l)
+    ok = ok_h & ok_l
+    bias = np.zeros(len(h), dtype=np.int8)
+    bias[ok & (high > prev_high) & (low > prev_low)] = 1
+    bias[ok & (high < prev_high) & ((low < prev_low) | (low > prev_low))] = -1
+    return bias
+
+
+def key_levels(t, h, l):
+    # Previous server-day high/low per symbol
+    day = t // 86400
+    prev_day = np.where(day < day[:, -1:], day, -1).max(axis=1)
+    in_prev = day == prev_day[:, None]
+    key_high = np.where(in_prev, h, -np.inf).max(axis=1)
+    key_low = np.where(in_prev, l, np.inf).min(axis=1)
+    return prev_day >= 0, key_high, key_low
+
+
+def fair_value_gap(h, l, bias):
+    bull = (bias > 0) & (l[:, -1] > h[:, -3])
+    bear = (bias < 0) & (h[:, -1] < l[:, -3])
+    return bull | bear
+
+
+def liquidity_sweep(h, l, bias, key_high, key_low):
+    return ((bias > 0) & (l[:, -1] < key_low)) | ((bias < 0) & (h[:, -1] > key_high))
+
+
+# ================== SCAN ==================
+def scan(htf, itf, ltf, key_level_pct=KEY_LEVEL_PCT):
+    # Arguments are stacks with the same symbol order; returns per-symbol masks
+    bias = market_structure(htf['high'], htf['low'])
+    ok_levels, key_high, key_low = key_levels(itf['time'], itf['high'], itf['low'])
+    price = itf['close'][:, -1]
+    band = (key_high - key_low) * key_level_pct
+    disp, strength = displacement(ltf['open'], ltf['close'])
+    gates = {
+        "bias": bias != 0,
+        "near_key_level": ok_levels & ((np.abs(price - key_high) < band) | (np.abs(price - key_low) < band)),
+        "sweep": liquidity_sweep(ltf['high'], ltf['low'], bias, key_high, key_low),
+        "displacement": disp,
+        "fvg": fair_value_gap(ltf['high'], ltf['low'], bias),
+    }
+    passed = np.logical_and.reduce(list(gates.values()))
+    return passed, bias, strength, gates
+
+
+def rank(symbols):
+    # Ranked (symbol, direction, displacement strength) for every symbol passing all gates
+    htf = load(symbols, HTF, BARS[HTF])
+    itf = load(symbols, ITF, BARS[ITF])
+    ltf = load(symbols, LTF, BARS[LTF], closed=True)
+    ready = [s for s in symbols if s in htf and s in itf and s in ltf]
+    if not ready:
+        return []
+    passed, bias, strength, _ = scan(stack(htf, ready), stack(itf, ready), stack(ltf, ready))
+    hits = [(ready[i], "BUY" if bias[i] > 0 else "SELL", float(strength[i]))
+            for i in np.flatnonzero(passed)]
+    return sorted(hits, key=lambda hit: hit[2], reverse=True)
+
+
+# ================== MAIN LOOP ==================
+if __name__ == "__main__":
+    from scheduler import BarScheduler
+
+    watchlist = sys.argv[1:]
+    if not watchlist:
+        print("usage: python scanner.py SYMBOL [SYMBOL ...]")
+        sys.exit(1)
+    if not mt5.initialize():
+        raise RuntimeError("MT5 failed to initialize")
+    scheduler = BarScheduler(watchlist[0], [LTF])
+    logging.info(f"SCANNING {len(watchlist)} SYMBOLS")
+
+    while True:
+        scheduler.wait()
+        started = sleep.perf_counter()
+        hits = rank(watchlist)
+        elapsed = (sleep.perf_counter() - started) * 1000
+        logging.info(f"Scan took {elapsed:.1f} ms, {len(hits)} setups")
+        for symbol, direction, strength in hits:
+            logging.info(f"{symbol} {direction} displacement x{strength:.2f}")
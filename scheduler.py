@@ -0,0 +1,169 @@
+from gateway import mt5
+from datetime import datetime, timedelta, timezone
+
+import time as sleep
+
+import resample
+
+# ================== TIMEFRAMES ==================
+def timeframe_seconds(timeframe):
+    # MT5 packs the unit into the high bits: 0x4000 = hours, 0x8000 = weeks
+    if timeframe & 0xC000 == 0:
+        return timeframe * 60
+    if timeframe & 0xC000 == 0x4000:
+        return (timeframe & 0x3FFF) * 3600
+    if timeframe == mt5.TIMEFRAME_W1:
+        return 7 * 86400
+    raise ValueError(f"Unsupported timeframe {timeframe}")
+
+
+# ================== SERVER CLOCK ==================
+SYNC_TOLERANCE = 60  # Seconds a fresh tick may sit off a whole quarter-hour offset
+
+
+def server_offset(symbol, tolerance=SYNC_TOLERANCE):
+    # Server time minus local epoch from the symbol's last tick. Broker
+    # servers sit on whole quarter-hour offsets from UTC, so a tick further
+    # than `tolerance` from one is stale (market closed, feed stalled): None.
+    tick = mt5.symbol_info_tick(symbol)
+    if tick is None or not tick.time:
+        return None
+    diff = tick.time - sleep.time()
+    offset = int(round(diff / 900.0)) * 900
+    if abs(diff - offset) > tolerance:
+        return None
+    return offset
+
+
+# ================== WINDOWS ==================
+def _localize(tz, day, t):
+    naive = datetime.combine(day, t)
+    if hasattr(tz, "localize"):  # pytz zones
+        return tz.localize(naive)
+    return naive.replace(tzinfo=tz)
+
+
+def in_windows(windows, tz, now=None):
+    now = now or datetime.now(tz)
+    return any(start <= now.time() <= end for start, end in windows)
+
+
+def next_window_open(windows, tz, now=None):
+    now = now or datetime.now(tz)
+    for days in range(8):
+        day = now.date() + timedelta(days=days)
+        opens = sorted(_localize(tz, day, start) for start, _ in windows)
+        for dt in opens:
+            if dt > now:
+                return dt
+    return None
+
+
+# ================== SCHEDULER ==================
+class BarScheduler:
+    def __init__(self, symbol, timeframes, windows=None, tz=timezone.utc,
+                 grace=0.5, poll=0.5, max_poll=30.0):
+        self.symbol = symbol
+        self.timeframes = sorted(timeframes, key=timeframe_seconds)  # Base (shortest) first
+        self.windows = windows
+        self.tz = tz
+        self.grace = grace
+        self.poll = poll
+        self.max_poll = max_poll
+        self.last_times = {}
+        self.offset = 0  # server time - local epoch, in seconds
+        self.on_lag = None  # Optional hook(kind, seconds): "wake" oversleep, "bar" close-to-detection
+
+    def _sync_offset(self):
+        offset = server_offset(self.symbol)
+        if offset is not None:  # Keep the last good offset over a stale tick
+            self.offset = offset
+
+    def server_now(self):
+        return sleep.time() + self.offset
+
+    def next_close(self, timeframe):
+        # Server-time epoch at which the current bar of `timeframe` closes
+        last = self.last_times.get(timeframe)
+        period = timeframe_seconds(timeframe)
+        if last is None:
+            return (self.server_now() // period + 1) * period
+        return last + period
+
+    def check(self, force=False):
+        # Poll only the timeframes whose close is due, return those with a new bar.
+        # A higher timeframe opens with its first base bar, so when the base was
+        # just polled its bar time is derived instead of fetched.
+        now = self.server_now()
+        new = set()
+        base, base_time = timeframe_seconds(self.timeframes[0]), None
+        for tf in self.timeframes:
+            if not force and tf in self.last_times and self.next_close(tf) > now:
+                continue
+            seconds = timeframe_seconds(tf)
+            if base_time is not None and resample.derivable(seconds, base):
+                bar_time = int(resample.bucket(base_time, seconds))
+            else:
+                rates = mt5.copy_rates_from_pos(self.symbol, tf, 0, 1)
+                if rates is None or len(rates) == 0:
+                    continue
+                bar_time = int(rates[-1]['time'])
+                if tf == self.timeframes[0]:
+                    base_time = bar_time
+            if self.last_times.get(tf) != bar_time:
+                self.last_times[tf] = bar_time
+                new.add(tf)
+        return new
+
+    def prime(self):
+        # For callers that poll check() themselves instead of wait(): learn
+        # the server offset and the current bars without reporting them
+        self._sync_offset()
+        self.check(force=True)
+
+    def _sleep_until(self, wake, deadline):
+        target = wake if deadline is None else min(wake, deadline)
+        delay = target - sleep.time()
+        if delay > 0:
+            sleep.sleep(delay)
+            if self.on_lag:
+                self.on_lag("wake", sleep.time() - target)
+
+    def wait(self, max_wait=None):
+        # Block until a watched timeframe prints a new bar inside the windows.
+        # Returns the set of timeframes with a new bar, or an empty set when
+        # `max_wait` seconds pass first.
+        deadline = None if max_wait is None else sleep.time() + max_wait
+        backoff = self.poll
+        first = not self.last_times
+        if first:
+            self._sync_offset()
+
+        while True:
+            if self.windows and not in_windows(self.windows, self.tz):
+                opening = next_window_open(self.windows, self.tz)
+                self._sleep_until(opening.timestamp(), deadline)
+                if deadline is not None and sleep.time() >= deadline:
+                    return set()
+                self._sync_offset()
+                self.check(force=True)  # don't fire on bars formed while closed
+                continue
+
+            new = self.check(force=first)
+            if new:
+                if self.on_lag and not first:
+                    self.on_lag("bar", self.server_now() - max(self.last_times[tf] for tf in new))
+                return new
+            first = False
+
+            due = min(self.next_close(tf) for tf in self.timeframes) - self.offset
+            if due + self.grace > sleep.time():
+                wake = due + self.grace
+                backoff = self.poll
+            else:
+                # Bar is late (broker lag, market closed): back off gradually
+                wake = sleep.time() + backoff
+                backoff = min(backoff * 2, self.max_poll)
+            self._sleep_until(wake, deadline)
+            if deadline is not None and sleep.time() >= deadline:
+                return set()
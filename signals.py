@@ -0,0 +1,77 @@
+import numpy as np
+
+# The bots' per-cycle gates on a bar window from bar_cache.rates(): a
+# zero-copy view of the cache's structured array, whose fields are views
+# too. Each gate reads only the bars it needs and returns plain floats and
+# bools, so a cycle builds no DataFrame, row Series or datetime column.
+# scanner.py runs the same gates across a watchlist, backtest_v2.py over
+# a whole series.
+
+# ================== SETTINGS ==================
+DISP_WINDOW = 20
+DISP_MULT = 1.5
+
+
+# ================== GATES ==================
+def bias(rates):
+    # Direction of the last bar (the scalper's micro structure)
+    o, c = rates['open'][-1], rates['close'][-1]
+    if c > o:
+        return "BUY"
+    if c < o:
+        return "SELL"
+    return None
+
+
+def market_structure(rates):
+    # Higher high and higher low (or lower both) of bar -3 against bar -4
+    if len(rates) < 4:
+        return None
+    h, l = rates['high'], rates['low']
+    if h[-3] > h[-4] and l[-3] > l[-4]:
+        return "BULLISH"
+    if l[-3] < l[-4] and h[-3] < h[-4]:
+        return "BEARISH"
+    return None
+
+
+def displacement(rates, window=DISP_WINDOW, mult=DISP_MULT):
+    # Last body above `mult` times the mean body of the last `window` bars
+    if len(rates) < window:
+        return False
+    bodies = np.abs(rates['close'][-window:] - rates['open'][-window:])
+    return bool(bodies[-1] > bodies.mean() * mult)
+
+
+def liquidity_sweep(rates, bias, key_high=None, key_low=None):
+    # Last bar trading through a key level; without levels, through the
+    # previous bar's extreme
+    if key_high is None:
+        key_high, key_low = rates['high'][-2], rates['low'][-2]
+    if bias.startswith("BULLISH"):
+        return bool(rates['low'][-1] < key_low)
+    if bias.startswith("BEARISH"):
+        return bool(rates['high'][-1] > key_high)
+    return False
+
+
+def fair_value_gap(rates, bias):
+    # (low, high) of the gap between bars -3 and -1 in the bias direction
+    h, l = rates['high'], rates['low']
+    if bias.startswith("BULLISH") and l[-1] > h[-3]:
+        return (float(h[-3]), float(l[-1]))
+    if bias.startswith("BEARISH") and h[-1] < l[-3]:
+        return (float(h[-1]), float(l[-3]))
+    return None
+
+
+def key_levels(rates):
+    # High and low of the previous server day in the window, or of the
+    # whole window when it holds a single day. Day boundaries come from the
+    # epoch seconds; no datetime conversion.
+    day = rates['time'] // 86400
+    today = int(np.searchsorted(day, day[-1]))
+    if today == 0:
+        return float(rates['high'].max()), float(rates['low'].min())
+    start = int(np.searchsorted(day, day[today - 1]))
+    return float(rates['high'][start:today].max()), float(rates['low'][start:today].min())
@@ -0,0 +1,155 @@
+import numpy as np
+from collections import deque
+
+import bar_cache
+
+# ================== SETTINGS ==================
+# Bias codes stored per bar; labels as market_structure() in tjr v2.py returns them
+LABELS = (None, "BULLISH_BOS", "BEARISH_BOS", "BEARISH_CHOCH")
+HIGH, LOW = 1, -1
+
+
+# ================== HISTORY ==================
+class History:
+    # Append-only columns backed by numpy arrays that double when full
+    def __init__(self, capacity=256, **dtypes):
+        self.n = 0
+        self.columns = {name: np.zeros(capacity, dtype) for name, dtype in dtypes.items()}
+
+    def append(self, **values):
+        if self.n == len(next(iter(self.columns.values()))):
+            for name, col in self.columns.items():
+                self.columns[name] = np.concatenate((col, np.zeros_like(col)))
+        for name, value in values.items():
+            self.columns[name][self.n] = value
+        self.n += 1
+
+    def last(self, count=None):
+        # Views of the newest `count` rows (all when None)
+        start = 0 if count is None else max(0, self.n - count)
+        return {name: col[start:self.n] for name, col in self.columns.items()}
+
+    def __len__(self):
+        return self.n
+
+
+# ================== TRACKER ==================
+class StructureTracker:
+    # Fed closed bars one at a time. A swing high at bar i is confirmed once
+    # the `right` bars after it have closed with lower highs (and the `left`
+    # before it were lower too); swing lows likewise. The bias after each bar
+    # is kept so backtests can ask for it at any bar index.
+    def __init__(self, left=1, right=1):
+        self.left = left
+        self.right = right
+        self.count = 0  # Bars fed
+        self.last_time = -1
+        self.window = deque(maxlen=left + right + 1)  # (time, high, low), oldest first
+        self.swing_highs = [None, None]  # Prices of the previous and last confirmed swing high
+        self.swing_lows = [None, None]
+        self.open_high = None  # (price, index) of the last swing high not yet broken
+        self.open_low = None
+        self.trend = 0  # Direction of the last structure break
+        self.code = 0
+        self.swings = History(index='i8', time='i8', price='f8', kind='i1')
+        self.breaks = History(index='i8', time='i8', level='f8', direction='i1', choch='?')
+        self.codes = History(capacity=1024, code='i1')
+
+    # ----- Feeding -----
+    def feed(self, rates):
+        # copy_rates_* rows or dict of columns; bars at or before last_time are skipped
+        times = np.asarray(rates['time'], dtype=np.int64)
+        start = int(np.searchsorted(times, self.last_time, side='right'))
+        rows = zip(times[start:].tolist(), *(np.asarray(rates[k], dtype=np.float64)[start:].tolist()
+                                             for k in ('high', 'low', 'close')))
+        for time, high, low, close in rows:
+            self.update(time, high, low, close)
+        return len(times) - start
+
+    def update(self, time, high, low, close):
+        window = self.window
+        window.append((time, high, low))
+        index = self.count
+        self.count += 1
+        self.last_time = time
+
+        if len(window) == window.maxlen:
+            pivot_time, h, l = window[self.left]  # Candidate sits `right` bars back
+            others = [bar for i, bar in enumerate(window) if i != self.left]
+            if all(h > bar[1] for bar in others):
+                self._swing(HIGH, index - self.right, pivot_time, h)
+            if all(l < bar[2] for bar in others):
+                self._swing(LOW, index - self.right, pivot_time, l)
+
+        # A close through the last unbroken swing is a structure break:
+        # BOS with the prevailing trend, CHOCH against it
+        if self.open_high is not None and close > self.open_high[0]:
+            self._break(index, time, self.open_high[0], 1)
+            self.open_high = None
+        if self.open_low is not None and close < self.open_low[0]:
+            self._break(index, time, self.open_low[0], -1)
+            self.open_low = None
+
+        self.codes.append(code=self.code)
+
+    def _swing(self, kind, index, time, price):
+        self.swings.append(index=index, time=time, price=price, kind=kind)
+        if kind == HIGH:
+            self.swing_highs = [self.swing_highs[1], price]
+            self.open_high = (price, index)
+        else:
+            self.swing_lows = [self.swing_lows[1], price]
+            self.open_low = (price, index)
+        self.code = self._classify()
+
+    def _break(self, index, time, level, direction):
+        self.breaks.append(index=index, time=time, level=level, direction=direction,
+                           choch=self.trend != 0 and direction != self.trend)
+        self.trend = direction
+
+    def _classify(self):
+        (h0, h1), (l0, l1) = self.swing_highs, self.swing_lows
+        if h0 is None or l0 is None:
+            return 0
+        if h1 > h0 and l1 > l0:
+            return 1
+        if l1 < l0 and h1 < h0:
+            return 2
+        if h1 < h0 and l1 > l0:
+            return 3
+        return 0
+
+    # ----- Queries -----
+    @property
+    def bias(self):
+        return LABELS[self.code]
+
+    def bias_at(self, index):
+        # Bias once bar `index` (0 = first bar fed) had closed
+        return LABELS[self.codes.columns['code'][index]] if 0 <= index < self.count else None
+
+    def bias_codes(self):
+        # Code per bar fed (see LABELS), for vectorized backtest lookups
+        return self.codes.last()['code']
+
+    def last_swings(self, count=2):
+        return self.swings.last(count)
+
+    def last_breaks(self, count=1):
+        return self.breaks.last(count)
+
+
+# ================== REGISTRY ==================
+_trackers = {}
+
+
+def update(symbol, timeframe, bars, left=1, right=1):
+    # Feed the (symbol, timeframe) tracker the bars closed since its last
+    # update, from the cache bar_cache.rates(symbol, timeframe, bars) refreshed
+    tracker = _trackers.get((symbol, timeframe, left, right))
+    if tracker is None:
+        tracker = _trackers[(symbol, timeframe, left, right)] = StructureTracker(left, right)
+    cache = bar_cache.get_cache(symbol, timeframe, bars + 1)
+    if cache.count:
+        tracker.feed(cache.since(tracker.last_time, closed=True))
+    return tracker
@@ -0,0 +1,167 @@
+import os
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import time as sleep
+import numpy as np
+import pandas as pd
+
+import backtest_v2
+from backtest_v2 import DEFAULTS, load_csv
+
+# ================== SETTINGS ==================
+FIELDS = ('time', 'open', 'high', 'low', 'close')
+FRAMES = ('m5', 'h1', 'h4', 'corr')
+MIN_TRADES = 10  # Combinations with fewer trades rank last
+# Killzone bounds are swept as offsets (minutes) applied to DEFAULTS["killzones"]
+KILLZONE_KEYS = ('killzone_shift', 'killzone_pad')
+
+
+# ================== SHARED BARS ==================
+def share(bars):
+    # Copy the OHLC columns into one shared block: int64 time, then four float64 columns
+    n = len(bars['time'])
+    shm = shared_memory.SharedMemory(create=True, size=max(1, n * 8 * len(FIELDS)))
+    for i, (field, dtype) in enumerate(zip(FIELDS, (np.int64,) + (np.float64,) * 4)):
+        np.ndarray(n, dtype, shm.buf, offset=i * n * 8)[:] = np.asarray(bars[field], dtype=dtype)
+    return shm, (shm.name, n)
+
+
+def attach(spec):
+    # dict-of-arrays view over a shared block; backtest_v2._columns reads it without copying
+    name, n = spec
+    shm = shared_memory.SharedMemory(name=name)  # Workers share the parent's tracker, which unlinks it
+    columns = {field: np.ndarray(n, dtype, shm.buf, offset=i * n * 8)
+               for i, (field, dtype) in enumerate(zip(FIELDS, (np.int64,) + (np.float64,) * 4))}
+    return shm, columns
+
+
+# ================== WORKERS ==================
+_blocks = []
+_frames = {}
+
+
+def _init_worker(specs):
+    for key, spec in specs.items():
+        if spec is None:
+            _frames[key] = None
+            continue
+        shm, columns = attach(spec)
+        _blocks.append(shm)  # Views die with the mapping, keep it open
+        _frames[key] = columns
+
+
+def to_params(combo):
+    params = {k: v for k, v in combo.items() if k not in KILLZONE_KEYS}
+    shift, pad = combo.get('killzone_shift', 0), combo.get('killzone_pad', 0)
+    if shift or pad:
+        params['killzones'] = tuple((start + shift - pad, end + shift + pad)
+                                    for start, end in DEFAULTS['killzones'])
+    return params
+
+
+def evaluate(combo):
+    _, result = backtest_v2.run(_frames['m5'], _frames['h1'], _frames['h4'], _frames['corr'],
+                                **to_params(combo))
+    result.pop('gates')
+    return dict(combo, **result)
+
+
+# ================== GRID ==================
+def parse_values(text):
+    # "1.5,2,3" or inclusive "start:stop:step"; ints stay ints, true/false become bools
+    def number(v):
+        if v.lower() in ('true', 'false'):
+            return v.lower() == 'true'
+        f = float(v)
+        return int(f) if f.is_integer() and '.' not in v else f
+
+    if ':' in text:
+        start, stop, step = (number(v) for v in text.split(':'))
+        if all(isinstance(v, int) for v in (start, stop, step)):
+            return list(range(start, stop + 1, step))
+        return np.round(np.arange(start, stop + step / 2, step), 10).tolist()
+    return [number(v) for v in text.split(',')]
+
+
+def combinations(grid, samples=None, seed=0):
+    # Full product, or `samples` distinct points drawn from it without materializing it
+    keys = list(grid)
+    sizes = [len(grid[k]) for k in keys]
+    total = int(np.prod(sizes))
+    if samples is None or samples >= total:
+        return [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+    picks = np.random.default_rng(seed).choice(total, size=samples, replace=False)
+    return [{k: grid[k][i] for k, i in zip(keys, idx)}
+            for idx in zip(*np.unravel_index(picks, sizes))]
+
+
+def rank(results, min_trades=MIN_TRADES):
+    # Best expectancy first, shallower drawdown breaking ties
+    table = pd.DataFrame(results)
+    table['enough_trades'] = table['trades'] >= min_trades
+    table = table.sort_values(['enough_trades', 'expectancy_r', 'max_drawdown_pct'],
+                              ascending=[False, False, True])
+    return table.drop(columns='enough_trades').reset_index(drop=True)
+
+
+# ================== SWEEP ==================
+def sweep(frames, combos, workers=None, chunksize=None):
+    workers = workers or os.cpu_count()
+    blocks, specs = [], {}
+    for key in FRAMES:
+        if frames.get(key) is None:
+            specs[key] = None
+            continue
+        shm, specs[key] = share(frames[key])
+        blocks.append(shm)
+    try:
+        chunksize = chunksize or max(1, len(combos) // (workers * 4))
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(specs,)) as pool:
+            return list(pool.map(evaluate, combos, chunksize=chunksize))
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+
+# ================== CLI ==================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel parameter sweep over backtest_v2")
+    parser.add_argument("m5")
+    parser.add_argument("h1")
+    parser.add_argument("h4")
+    parser.add_argument("--corr", help="Correlated symbol M5 csv for the SMT gate")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=VALUES",
+                        help="e.g. min_rr=1.5,2,3 or disp_window=10:30:5; names from backtest_v2.DEFAULTS "
+                             "plus killzone_shift/killzone_pad in minutes")
+    parser.add_argument("--samples", type=int, help="Random sample of this many grid points")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--min-trades", type=int, default=MIN_TRADES)
+    parser.add_argument("--out", default="sweep_results.csv")
+    args = parser.parse_args()
+
+    grid = {}
+    for item in args.param:
+        name, values = item.split("=", 1)
+        if name not in DEFAULTS and name not in KILLZONE_KEYS:
+            parser.error(f"unknown parameter {name}")
+        grid[name] = parse_values(values)
+    if not grid:
+        parser.error("give at least one --param")
+
+    frames = {"m5": load_csv(args.m5), "h1": load_csv(args.h1), "h4": load_csv(args.h4),
+              "corr": load_csv(args.corr) if args.corr else None}
+    combos = combinations(grid, args.samples, args.seed)
+    started = sleep.perf_counter()
+    results = sweep(frames, combos, args.workers)
+    elapsed = sleep.perf_counter() - started
+
+    table = rank(results, args.min_trades)
+    table.to_csv(args.out, index=False)
+    print(f"{len(combos)} combinations in {elapsed:.1f} s ({len(combos) / elapsed:.1f}/s), "
+          f"results in {args.out}")
+    print(table.head(10).to_string(index=False))
@@ -0,0 +1,174 @@
+import os
+import json
+import logging
+import threading
+from bisect import bisect_left
+from collections import Counter
+
+import time as sleep
+
+# ================== SETTINGS ==================
+# Histogram upper bounds in seconds (Prometheus style, +Inf implied)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PREFIX = "tjr"
+
+
+# ================== HISTOGRAM ==================
+class Histogram:
+    __slots__ = ('counts', 'count', 'sum', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {"count": self.count, "sum": round(self.sum, 6), "max": round(self.max, 6),
+                "p50": self.quantile(0.5), "p95": self.quantile(0.95), "p99": self.quantile(0.99),
+                "buckets": list(self.counts)}
+
+
+# ================== TELEMETRY ==================
+class Telemetry:
+    # Gate pass/reject counters and latency histograms for one bot's loop.
+    # A cycle is begin() followed by gate() calls in order; each gate also
+    # times the stage that produced its input (time since the previous mark).
+    # Output is a JSON-lines file rotated at `max_bytes`, or a Prometheus
+    # text file when `path` ends in .prom; written every `interval` seconds.
+    def __init__(self, bot, path=None, interval=60.0, max_bytes=10_000_000, backups=3):
+        self.bot = bot
+        self.path = path
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lock = threading.Lock()  # Broker timings arrive on the gateway thread
+        self.passed = Counter()
+        self.rejected = Counter()
+        self.histograms = {}
+        self.cycles = 0
+        self.started = None
+        self.mark = None
+        self.flushed = sleep.monotonic()
+
+    def attach(self, gateway=None, scheduler=None):
+        if gateway is not None:
+            gateway.on_call = lambda name, seconds: self.observe("broker", name, seconds)
+        if scheduler is not None:
+            scheduler.on_lag = lambda kind, seconds: self.observe("lag", kind, seconds)
+
+    def observe(self, kind, name, seconds):
+        key = (kind, name)
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(seconds)
+
+    # ----- Loop markers -----
+    def poll(self):
+        # Write when `interval` has passed; call from the idle part of the
+        # loop too, so a bot waiting outside its windows still reports
+        if self.path and sleep.monotonic() - self.flushed >= self.interval:
+            self.flush()
+
+    def begin(self):
+        self.poll()
+        self.cycles += 1
+        self.started = self.mark = sleep.perf_counter()
+
+    def gate(self, name, ok):
+        now = sleep.perf_counter()
+        self.observe("stage", name, now - self.mark)
+        self.mark = now
+        if ok:
+            self.passed[name] += 1
+        else:
+            self.rejected[name] += 1
+            self.observe("cycle", "rejected", now - self.started)
+        return ok
+
+    def done(self, name):
+        # Stage after the last gate (order send); closes the cycle
+        now = sleep.perf_counter()
+        self.observe("stage", name, now - self.mark)
+        self.observe("cycle", "traded", now - self.started)
+
+    # ----- Export -----
+    def snapshot(self):
+        with self.lock:
+            histograms = {f"{kind}.{name}": h.snapshot() for (kind, name), h in self.histograms.items()}
+        gates = {name: {"passed": self.passed[name], "rejected": self.rejected[name]}
+                 for name in {**self.passed, **self.rejected}}
+        return {"ts": round(sleep.time(), 3), "bot": self.bot, "cycles": self.cycles,
+                "gates": gates, "histograms": histograms}
+
+    def report(self):
+        # One-line funnel: gate passed/total
+        return " ".join(f"{name} {g['passed']}/{g['passed'] + g['rejected']}"
+                        for name, g in self.snapshot()["gates"].items())
+
+    def flush(self):
+        self.flushed = sleep.monotonic()
+        if not self.path:
+            return
+        try:
+            if self.path.endswith(".prom"):
+                self._write_prometheus()
+            else:
+                self._write_jsonl()
+        except OSError as e:
+            logging.error(f"Telemetry write failed: {e}")
+
+    def _write_jsonl(self):
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            for i in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{i}"):
+                    os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        with open(self.path, "a") as f:
+            f.write(json.dumps(self.snapshot()) + "\n")
+
+    def _write_prometheus(self):
+        snap = self.snapshot()
+        bot = f'bot="{self.bot}"'
+        lines = [f"# TYPE {PREFIX}_cycles_total counter", f"{PREFIX}_cycles_total{{{bot}}} {snap['cycles']}",
+                 f"# TYPE {PREFIX}_gate_total counter"]
+        for name, g in snap["gates"].items():
+            for result in ("passed", "rejected"):
+                lines.append(f'{PREFIX}_gate_total{{{bot},gate="{name}",result="{result}"}} {g[result]}')
+        lines.append(f"# TYPE {PREFIX}_seconds histogram")
+        for key, h in snap["histograms"].items():
+            kind, name = key.split(".", 1)
+            labels = f'{bot},kind="{kind}",name="{name}"'
+            seen = 0
+            for bound, n in zip(BUCKETS + (float('inf'),), h["buckets"]):
+                seen += n
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f'{PREFIX}_seconds_bucket{{{labels},le="{le}"}} {seen}')
+            lines.append(f"{PREFIX}_seconds_sum{{{labels}}} {h['sum']}")
+            lines.append(f"{PREFIX}_seconds_count{{{labels}}} {h['count']}")
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, self.path)  # Scrapers never see a half-written file
@@ -1,10 +1,18 @@
-import MetaTrader5 as mt5
-import pandas as pd
+from gateway import mt5
 import numpy as np
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, time as dt_time
 import pytz
 
+import bar_cache
+import exec_analytics
+import recorder
+from execution import Executor
+from positions import PositionManager
+from risk_ledger import RiskLedger
+from indicators import ATR, EMA, RSI, RollingMean
+from scheduler import BarScheduler
+
 # ================= CONFIG =================
 SYMBOL = "XAUUSDm"
 HTF = mt5.TIMEFRAME_M15
@@ -14,47 +22,49 @@ RISK_PERCENT = 0.5
 RR = 1.5
 MAX_SPREAD = 30  # points
 ATR_MULTIPLIER = 1.2
+MAGIC = 777
 
-MAX_DAILY_LOSS = 2.0
+MAX_DAILY_LOSS = 2.0  # % of the day's opening balance
 MAX_CONSECUTIVE_LOSSES = 3
 COOLDOWN_MINUTES = 15
+LEDGER_PATH = "test_risk.json"
+RECORD = True  # Keep every tick and closed bar seen, for replay (recorder.py)
+EXECUTION_LOG = True  # Log every order's quote, fill, latency and retcode (exec_analytics.py)
 
 LONDON_START = 7
 NY_START = 13
 SESSION_END = 20
 
 TIMEZONE = pytz.timezone("Europe/London")
+SESSION_WINDOWS = [(dt_time(LONDON_START), dt_time(SESSION_END, 59, 59))]
+
+SEED_BARS = 1000  # History fed to the streaming indicators once at startup
+
+# ================= STATE =================
+HTF_EMA50, HTF_EMA200 = EMA(50), EMA(200)
+LTF_EMA50, LTF_RSI, LTF_ATR = EMA(50), RSI(14), ATR(14)
+LTF_ATR_MEAN = RollingMean(200)  # Mean of the last 200 ATR values, the ATR filter's baseline
+last_fed = {}
+EXECUTOR = Executor(SYMBOL, MAGIC, deviation=10, filling=mt5.ORDER_FILLING_FOK, comment="HTF-LTF Scalper")
+LEDGER = RiskLedger(SYMBOL, LEDGER_PATH, MAX_DAILY_LOSS, MAX_CONSECUTIVE_LOSSES, COOLDOWN_MINUTES * 60)
+POSITIONS = PositionManager(MAGIC, SYMBOL, stages=())  # Own positions only, no stop rules
+POSITIONS.on_deal = LEDGER.on_deal  # Exits reach the risk limits before the next entry check
 
 def connect():
     if not mt5.initialize():
         raise RuntimeError("MT5 init failed")
     if not mt5.symbol_select(SYMBOL, True):
         raise RuntimeError("Symbol not available")
+    EXECUTOR.warm()
 
-def get_rates(tf, bars=200):
-    rates = mt5.copy_rates_from_pos(SYMBOL, tf, 0, bars)
-    df = pd.DataFrame(rates)
-    df['time'] = pd.to_datetime(df['time'], unit='s')
-    return df
-
-def ema(series, period):
-    return series.ewm(span=period, adjust=False).mean()
-
-def rsi(series, period=14):
-    delta = series.diff()
-    gain = delta.clip(lower=0)
-    loss = -delta.clip(upper=0)
-    avg_gain = gain.rolling(period).mean()
-    avg_loss = loss.rolling(period).mean()
-    rs = avg_gain / avg_loss
-    return 100 - (100 / (1 + rs))
-
-def atr(df, period=14):
-    high_low = df['high'] - df['low']
-    high_close = abs(df['high'] - df['close'].shift())
-    low_close = abs(df['low'] - df['close'].shift())
-    tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-    return tr.rolling(period).mean()
+def new_closed_bars(tf):
+    # Closed bars the streaming indicators haven't seen yet (all of them on the first call)
+    cache = bar_cache.get_cache(SYMBOL, tf, SEED_BARS + 1)
+    cache.update()
+    bars = cache.since(last_fed.get(tf, -1), closed=True)
+    if len(bars):
+        last_fed[tf] = bars['time'][-1]
+    return bars, cache
 
 def in_session():
     now = datetime.now(TIMEZONE).hour
@@ -62,100 +72,109 @@ def in_session():
 
 def spread_ok():
     tick = mt5.symbol_info_tick(SYMBOL)
-    spread = (tick.ask - tick.bid) / mt5.symbol_info(SYMBOL).point
+    spread = (tick.ask - tick.bid) / EXECUTOR.info.point
     return spread <= MAX_SPREAD
 
 def htf_trend():
-    df = get_rates(HTF)
-    df['ema50'] = ema(df['close'], 50)
-    df['ema200'] = ema(df['close'], 200)
-    if df['ema50'].iloc[-1] > df['ema200'].iloc[-1]:
+    bars, cache = new_closed_bars(HTF)
+    for close in bars['close']:
+        HTF_EMA50.update(close)
+        HTF_EMA200.update(close)
+    forming = cache.window(1)['close'][0]
+    ema50, ema200 = HTF_EMA50.peek(forming), HTF_EMA200.peek(forming)
+    if ema50 > ema200:
         return "BUY"
-    if df['ema50'].iloc[-1] < df['ema200'].iloc[-1]:
+    if ema50 < ema200:
         return "SELL"
     return None
 
 def ltf_entry(direction):
-    df = get_rates(LTF)
-    df['ema50'] = ema(df['close'], 50)
-    df['ema200'] = ema(df['close'], 200)
-    df['rsi'] = rsi(df['close'])
-    df['atr'] = atr(df)
+    bars, cache = new_closed_bars(LTF)  # Up to the bar that just closed
+    for bar in bars:
+        LTF_EMA50.update(bar['close'])
+        LTF_RSI.update(bar['close'])
+        atr_val = LTF_ATR.update(bar['high'], bar['low'], bar['close'])
+        if not np.isnan(atr_val):  # Skip the warm-up bars
+            LTF_ATR_MEAN.update(atr_val)
 
-    last = df.iloc[-1]
+    close = cache.window(1, closed=True)['close'][0]
 
-    if last['atr'] < df['atr'].mean():
+    if LTF_ATR.value < LTF_ATR_MEAN.value:
         return False
 
     if direction == "BUY":
         return (
-            last['close'] > last['ema50'] and
-            last['rsi'] > 55
+            close > LTF_EMA50.value and
+            LTF_RSI.value > 55
         )
 
     if direction == "SELL":
         return (
-            last['close'] < last['ema50'] and
-            last['rsi'] < 45
+            close < LTF_EMA50.value and
+            LTF_RSI.value < 45
         )
 
     return False
 
 def lot_size(sl_points):
-    acc = mt5.account_info()
-    risk_amount = acc.balance * (RISK_PERCENT / 100)
-    tick_value = mt5.symbol_info(SYMBOL).trade_tick_value
-    return round(risk_amount / (sl_points * tick_value), 2)
+    return EXECUTOR.lot_size(sl_points, RISK_PERCENT)
 
-def execute_trade(direction):
+def execute_trade(direction, signal=None):
     tick = mt5.symbol_info_tick(SYMBOL)
     price = tick.ask if direction == "BUY" else tick.bid
 
-    df = get_rates(LTF)
-    atr_val = atr(df).iloc[-1]
+    atr_val = LTF_ATR.value  # Already advanced to the closed bar by ltf_entry()
     sl_dist = atr_val * ATR_MULTIPLIER
     tp_dist = sl_dist * RR
 
     sl = price - sl_dist if direction == "BUY" else price + sl_dist
     tp = price + tp_dist if direction == "BUY" else price - tp_dist
 
-    volume = lot_size(sl_dist / mt5.symbol_info(SYMBOL).point)
-
-    request = {
-        "action": mt5.TRADE_ACTION_DEAL,
-        "symbol": SYMBOL,
-        "volume": volume,
-        "type": mt5.ORDER_TYPE_BUY if direction == "BUY" else mt5.ORDER_TYPE_SELL,
-        "price": price,
-        "sl": sl,
-        "tp": tp,
-        "deviation": 10,
-        "magic": 777,
-        "comment": "HTF-LTF Scalper",
-        "type_time": mt5.ORDER_TIME_GTC,
-        "type_filling": mt5.ORDER_FILLING_FOK,
-    }
-
-    return mt5.order_send(request)
+    volume = lot_size(sl_dist / EXECUTOR.info.point)
+    if volume <= 0:
+        return None
+
+    return EXECUTOR.send(direction, volume, sl, tp, tick=tick, signal=signal)
+
+# ================= STRATEGY =================
+# Plugin interface shared with engine.py: TIMEFRAMES, start(), manage(), on_bar()
+TIMEFRAMES = [HTF, LTF]
+start = connect
+
+def manage():
+    # True while this strategy has a position open
+    POSITIONS.manage()
+    if POSITIONS.has_open():
+        return True
+    EXECUTOR.warm()
+    return False
+
+def on_bar(new):
+    signal = time.perf_counter()
+    if not in_session() or not LEDGER.can_trade(MAGIC) or not spread_ok():
+        return
+
+    direction = htf_trend()
+    if direction and ltf_entry(direction):
+        execute_trade(direction, signal)
 
 def run():
     connect()
     print("XAUUSD SCALPER RUNNING")
+    if RECORD:
+        recorder.start()
+    if EXECUTION_LOG:
+        exec_analytics.start()
+    scheduler = BarScheduler(SYMBOL, TIMEFRAMES, windows=SESSION_WINDOWS, tz=TIMEZONE)
 
     while True:
-        if not in_session() or not spread_ok():
-            time.sleep(30)
-            continue
-
-        if mt5.positions_total() > 0:
+        mt5.new_cycle()
+        if manage():
             time.sleep(10)
             continue
 
-        direction = htf_trend()
-        if direction and ltf_entry(direction):
-            execute_trade(direction)
-            time.sleep(60)
-
-        time.sleep(5)
+        on_bar(scheduler.wait())  # Next bar close inside the session
 
-run()
+# ================= MAIN LOOP =================
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,91 @@
+from gateway import mt5
+from collections import deque
+
+from scheduler import timeframe_seconds
+
+
+# ================== BARS ==================
+class Bar:
+    __slots__ = ('time', 'open', 'high', 'low', 'close')
+
+    def __init__(self, time, open, high, low, close):
+        self.time, self.open, self.high, self.low, self.close = time, open, high, low, close
+
+    @property
+    def body(self):
+        return abs(self.close - self.open)
+
+
+# ================== TICK FEED ==================
+class TickBars:
+    # Builds the forming bar and a rolling body average from the tick stream,
+    # pulling only ticks newer than the last one seen
+    def __init__(self, symbol, timeframe, window=10, batch=1000):
+        self.symbol = symbol
+        self.period = timeframe_seconds(timeframe)
+        self.timeframe = timeframe
+        self.window = window
+        self.batch = batch
+        self.bodies = deque(maxlen=window - 1)  # Closed bars; the forming one completes the window
+        self.bar = None
+        self.prev = None  # Last closed bar
+        self.bid = self.ask = None
+        self.last_msc = 0
+
+    def seed(self):
+        rates = mt5.copy_rates_from_pos(self.symbol, self.timeframe, 0, self.window)
+        tick = mt5.symbol_info_tick(self.symbol)
+        if rates is None or len(rates) == 0 or tick is None:
+            return False
+        bars = [Bar(int(r['time']), r['open'], r['high'], r['low'], r['close']) for r in rates]
+        for bar in bars[:-1]:
+            self._close(bar)
+        self.bar = bars[-1]
+        self.bid, self.ask, self.last_msc = tick.bid, tick.ask, tick.time_msc
+        return True
+
+    def poll(self):
+        # Apply new ticks, return how many arrived
+        ticks = mt5.copy_ticks_from(self.symbol, self.last_msc // 1000, self.batch, mt5.COPY_TICKS_ALL)
+        if ticks is None or len(ticks) == 0:
+            return 0
+        fresh = ticks[ticks['time_msc'] > self.last_msc]
+        for tick in fresh:
+            self._on_tick(tick)
+        if len(fresh):
+            self.last_msc = int(fresh['time_msc'][-1])
+        return len(fresh)
+
+    def _close(self, bar):
+        self.bodies.append(bar.body)
+        self.prev = bar
+
+    def _on_tick(self, tick):
+        if tick['ask'] > 0:
+            self.ask = tick['ask']
+        bid = tick['bid']
+        if bid <= 0:
+            return
+        self.bid = bid
+        start = int(tick['time']) // self.period * self.period
+        if self.bar is None or start > self.bar.time:
+            if self.bar is not None:
+                self._close(self.bar)
+            self.bar = Bar(start, bid, bid, bid, bid)  # Bars are built from bid, like the terminal's
+            return
+        bar = self.bar
+        bar.close = bid
+        if bid > bar.high:
+            bar.high = bid
+        elif bid < bar.low:
+            bar.low = bid
+
+    # ----- Views used by the tick-mode signal -----
+    def avg_body(self):
+        # Rolling mean over the last `window` bodies including the forming bar
+        if self.bar is None or len(self.bodies) < self.window - 1:
+            return float('nan')
+        return (sum(self.bodies) + self.bar.body) / self.window
+
+    def spread(self):
+        return self.ask - self.bid
@@ -1,7 +1,15 @@
-import MetaTrader5 as mt5
-import pandas as pd
+from gateway import mt5
 import time
 
+import bar_cache
+import exec_analytics
+import features
+import recorder
+from execution import Executor
+from positions import PositionManager
+from risk_ledger import RiskLedger
+from tick_feed import TickBars
+
 # ================== SETTINGS ==================
 SYMBOL = "XAUUSDm"
 TF = mt5.TIMEFRAME_M1
@@ -9,54 +17,54 @@ TF = mt5.TIMEFRAME_M1
 RISK_PERCENT = 0.7
 RR = 0.8
 MAX_SPREAD = 60
-COOLDOWN = 20
+COOLDOWN = 20  # Seconds after an exit, from the risk ledger so it survives restarts
 MAGIC = 55999
+LEDGER_PATH = "scalper_risk.json"
+BE_STAGES = ((0.3, 0.0),)  # (R in profit, R locked): breakeven at 0.3R
+TICK_MODE = True  # Decide on every tick instead of re-reading M1 bars
+TICK_POLL = 0.02  # Seconds between tick pulls when nothing new arrived
+RECORD = True  # Keep every tick and closed bar seen, for replay (recorder.py)
+EXECUTION_LOG = True  # Log every order's quote, fill, latency and retcode (exec_analytics.py)
 
-last_trade_time = 0
 
 # ================== INIT ==================
-if not mt5.initialize():
-    raise RuntimeError("MT5 init failed")
+EXECUTOR = Executor(SYMBOL, MAGIC, filling=mt5.ORDER_FILLING_IOC)
+LEDGER = RiskLedger(SYMBOL, LEDGER_PATH, cooldown=COOLDOWN)
+
+def connect():
+    # Broker work happens here, not at import; warm() also reads the symbol's point
+    if not mt5.initialize():
+        raise RuntimeError("MT5 init failed")
+    if not EXECUTOR.warm():
+        raise RuntimeError(f"No symbol info for {SYMBOL}")
 
 # ================== DATA ==================
 def get_df(tf, bars=100):
-    rates = mt5.copy_rates_from_pos(SYMBOL, tf, 0, bars)
-    df = pd.DataFrame(rates)
-    return df
+    return bar_cache.rates(SYMBOL, tf, bars)  # Structured array view, no DataFrame
 
 # ================== SPREAD ==================
 def spread_ok():
     tick = mt5.symbol_info_tick(SYMBOL)
-    return (tick.ask - tick.bid) <= MAX_SPREAD * mt5.symbol_info(SYMBOL).point
+    return (tick.ask - tick.bid) <= MAX_SPREAD * EXECUTOR.info.point
 
 # ================== MICRO STRUCTURE ==================
 def bias(df):
-    if df.close.iloc[-1] > df.open.iloc[-1]:
-        return "BUY"
-    if df.close.iloc[-1] < df.open.iloc[-1]:
-        return "SELL"
-    return None
+    return features.signal(SYMBOL, TF, df, 'bias')
 
 # ================== DISPLACEMENT ==================
 def displacement(df):
-    body = abs(df.close.iloc[-1] - df.open.iloc[-1])
-    avg = abs(df.close - df.open).rolling(10).mean().iloc[-1]
-    return body > avg * 1.1
+    return features.signal(SYMBOL, TF, df, 'displacement', 10, 1.1)
 
 # ================== LOT ==================
 def lot_size(sl_dist):
-    acc = mt5.account_info()
-    risk = acc.balance * (RISK_PERCENT / 100)
-    tick_val = mt5.symbol_info(SYMBOL).trade_tick_value
-    return round(risk / (sl_dist * tick_val), 2)
+    return EXECUTOR.lot_size(sl_dist, RISK_PERCENT)
 
 # ================== EXECUTION ==================
-def place_trade(direction):
-    tick = mt5.symbol_info_tick(SYMBOL)
+def place_trade(direction, prev_low, prev_high, tick=None, signal=None):
+    tick = tick or mt5.symbol_info_tick(SYMBOL)
     entry = tick.ask if direction == "BUY" else tick.bid
 
-    df = get_df(TF)
-    sl = df.low.iloc[-2] if direction == "BUY" else df.high.iloc[-2]
+    sl = prev_low if direction == "BUY" else prev_high
 
     risk = abs(entry - sl)
     if risk == 0:
@@ -64,84 +72,116 @@ def place_trade(direction):
 
     tp = entry + risk * RR if direction == "BUY" else entry - risk * RR
     vol = lot_size(risk)
+    if vol <= 0:
+        return
 
-    request = {
-        "action": mt5.TRADE_ACTION_DEAL,
-        "symbol": SYMBOL,
-        "volume": vol,
-        "type": mt5.ORDER_TYPE_BUY if direction == "BUY" else mt5.ORDER_TYPE_SELL,
-        "price": entry,
-        "sl": sl,
-        "tp": tp,
-        "magic": MAGIC,
-        "type_filling": mt5.ORDER_FILLING_IOC,
-        "type_time": mt5.ORDER_TIME_GTC
-    }
-
-    mt5.order_send(request)
+    return EXECUTOR.send(direction, vol, sl, tp, tick=tick, signal=signal)
 
 # ================== FAST BE ==================
-def manage_be():
-    positions = mt5.positions_get()
-    if not positions:
-        return
+POSITIONS = PositionManager(MAGIC, SYMBOL, stages=BE_STAGES)
+POSITIONS.on_deal = LEDGER.on_deal  # Exits reach the risk limits before the next entry check
 
-    tick = mt5.symbol_info_tick(SYMBOL)
+def manage_be(tick=None):
+    POSITIONS.manage(tick)
 
-    for p in positions:
-        if p.magic != MAGIC:
-            continue
-
-        r = abs(p.price_open - p.sl)
+# ================== TICK MODE ==================
+def tick_bias(bar):
+    if bar.close > bar.open:
+        return "BUY"
+    if bar.close < bar.open:
+        return "SELL"
+    return None
 
-        if p.type == mt5.ORDER_TYPE_BUY and tick.bid >= p.price_open + r * 0.3:
-            mt5.order_send({
-                "action": mt5.TRADE_ACTION_SLTP,
-                "position": p.ticket,
-                "sl": p.price_open
-            })
+def tick_displacement(feed):
+    return feed.bar.body > feed.avg_body() * 1.1
+
+def tick_spread_ok(feed):
+    return feed.spread() <= MAX_SPREAD * EXECUTOR.info.point
+
+# ================== STRATEGY ==================
+# Plugin interface shared with engine.py; start() connects. With TICKS the
+# engine calls on_tick() for each batch of new ticks on a shared
+# TickBars(SYMBOL, TIMEFRAMES[0], TICK_WINDOW); otherwise on_bar() every
+# POLL seconds, as the bar loop below runs it, on the forming bar.
+TIMEFRAMES = [TF]
+start = connect
+TICKS = TICK_MODE
+TICK_WINDOW = 10
+POLL = 1.0
+
+def manage():
+    EXECUTOR.warm()
+    manage_be()
+    return POSITIONS.has_open()
 
-        if p.type == mt5.ORDER_TYPE_SELL and tick.ask <= p.price_open - r * 0.3:
-            mt5.order_send({
-                "action": mt5.TRADE_ACTION_SLTP,
-                "position": p.ticket,
-                "sl": p.price_open
-            })
+def on_tick(feed, received):
+    manage_be(feed)  # Feed's latest quote, no extra tick request
+    if POSITIONS.has_open():
+        return
 
-# ================== MAIN LOOP ==================
-print("AGGRESSIVE XAUUSD SCALPER RUNNING")
+    if not LEDGER.can_trade(MAGIC):
+        return
 
-while True:
-    manage_be()
+    if not tick_spread_ok(feed):
+        return
 
-    now = time.time()
-    positions = mt5.positions_get()
-    positions = [p for p in positions if p.magic == MAGIC]
+    direction = tick_bias(feed.bar)
+    if not direction or not tick_displacement(feed):
+        return
 
-    if positions:
-        time.sleep(3)
-        continue
+    # Latest tick is the entry quote; the executor times signal-to-fill from `received`
+    place_trade(direction, feed.prev.low, feed.prev.high, feed, received)
 
-    if now - last_trade_time < COOLDOWN:
-        time.sleep(1)
-        continue
+def on_bar(new):
+    # True when an order went out
+    if not LEDGER.can_trade(MAGIC):
+        return False
 
     if not spread_ok():
-        time.sleep(1)
-        continue
+        return False
 
     df = get_df(TF)
 
     direction = bias(df)
     if not direction:
-        time.sleep(1)
-        continue
+        return False
 
     if not displacement(df):
-        time.sleep(1)
-        continue
+        return False
+
+    place_trade(direction, float(df['low'][-2]), float(df['high'][-2]))  # SL beyond the last closed bar
+    return True
 
-    place_trade(direction)
-    last_trade_time = time.time()
+def run_ticks():
+    feed = TickBars(SYMBOL, TF, window=TICK_WINDOW)
+    if not feed.seed():
+        raise RuntimeError("No tick data")
+
+    while True:
+        if not feed.poll():
+            EXECUTOR.warm()  # Between ticks, never on the signal path
+            time.sleep(TICK_POLL)
+            continue
+        received = time.perf_counter()
+        mt5.new_cycle()
+        on_tick(feed, received)
+
+# ================== MAIN LOOP ==================
+if __name__ == "__main__":
+    connect()
+    print("AGGRESSIVE XAUUSD SCALPER RUNNING")
+    if RECORD:
+        recorder.start()
+    if EXECUTION_LOG:
+        exec_analytics.start()
+
+    if TICK_MODE:
+        run_ticks()
+
+    while True:
+        mt5.new_cycle()
+        if manage():
+            time.sleep(3)
+            continue
 
-    time.sleep(2)
+        time.sleep(2 if on_bar(None) else 1)
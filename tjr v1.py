@@ -1,10 +1,18 @@
-import MetaTrader5 as mt5
-import pandas as pd
-import numpy as np
+from gateway import mt5
 from datetime import datetime, time, timezone
 
 import time as sleep
 
+import bar_cache
+import exec_analytics
+import features
+import recorder
+from execution import Executor
+from positions import PositionManager
+from risk_ledger import RiskLedger
+from scheduler import BarScheduler
+from telemetry import Telemetry
+
 # ================== SETTINGS ==================
 SYMBOL = "US30m"
 HTF = mt5.TIMEFRAME_M15
@@ -12,168 +20,132 @@ LTF = mt5.TIMEFRAME_M5
 RISK_PERCENT = 1.0
 RR = 2.0
 MAGIC = 55101
+BE_STAGES = ((1.0, 0.0),)  # (R in profit, R locked): breakeven at 1R
+KILLZONES = [(time(8, 0), time(11, 0)), (time(13, 30), time(16, 30))]  # UTC
+TELEMETRY_PATH = "tjr_v1_telemetry.jsonl"  # .prom for a Prometheus textfile
+MAX_DAILY_LOSS = 3.0  # % of the day's opening balance
+MAX_CONSECUTIVE_LOSSES = 3  # Losing exits in a row before standing down for the day
+COOLDOWN_MINUTES = 0
+LEDGER_PATH = "tjr_v1_risk.json"
+RECORD = True  # Keep every tick and closed bar seen, for replay (recorder.py)
+EXECUTION_LOG = True  # Log every order's quote, fill, latency and retcode (exec_analytics.py)
 
 # ================== MT5 INIT ==================
-if not mt5.initialize():
-    raise RuntimeError("MT5 failed to initialize")
+EXECUTOR = Executor(SYMBOL, MAGIC, filling=mt5.ORDER_FILLING_IOC)
+LEDGER = RiskLedger(SYMBOL, LEDGER_PATH, MAX_DAILY_LOSS, MAX_CONSECUTIVE_LOSSES, COOLDOWN_MINUTES * 60)
+
+def connect():
+    # Broker work happens here, not at import, so loading the plugin stays offline
+    if not mt5.initialize():
+        raise RuntimeError("MT5 failed to initialize")
+    EXECUTOR.warm()
 
 # ================== UTILS ==================
-def get_df(symbol, timeframe, bars=200):
-    rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, bars)
-    df = pd.DataFrame(rates)
-    df['time'] = pd.to_datetime(df['time'], unit='s')
-    return df
+def get_df(symbol, timeframe, bars=200, closed=False):
+    return bar_cache.rates(symbol, timeframe, bars, closed)  # Structured array view, no DataFrame
 
 def in_killzone():
     now = datetime.now(timezone.utc).time()
-    return (
-        time(8, 0) <= now <= time(11, 0) or
-        time(13, 30) <= now <= time(16, 30)
-    )
+    return any(start <= now <= end for start, end in KILLZONES)
 # ================== STRUCTURE ==================
-def market_structure(df):
-    highs = df['high']
-    lows = df['low']
-
-    hh = highs.iloc[-3] > highs.iloc[-4]
-    hl = lows.iloc[-3] > lows.iloc[-4]
-    ll = lows.iloc[-3] < lows.iloc[-4]
-    lh = highs.iloc[-3] < highs.iloc[-4]
-
-    if hh and hl:
-        return "BULLISH"
-    if ll and lh:
-        return "BEARISH"
-    return None
+def market_structure(symbol, timeframe, df):
+    return features.signal(symbol, timeframe, df, 'market_structure')
 
 # ================== LIQUIDITY ==================
-def liquidity_sweep(df, bias):
-    prev = df.iloc[-2]
-    curr = df.iloc[-1]
-
-    if bias == "BULLISH":
-        return curr.low < prev.low
-    if bias == "BEARISH":
-        return curr.high > prev.high
-    return False
+def liquidity_sweep(symbol, timeframe, df, bias):
+    return features.signal(symbol, timeframe, df, 'liquidity_sweep', bias)  # Through the previous bar's low/high
 
 # ================== DISPLACEMENT ==================
-def displacement(df):
-    bodies = abs(df['close'] - df['open'])
-    avg = bodies.rolling(20).mean().iloc[-1]
-    return bodies.iloc[-1] > avg * 1.5
+def displacement(symbol, timeframe, df):
+    return features.signal(symbol, timeframe, df, 'displacement', 20, 1.5)
 
 # ================== FVG ==================
-def fair_value_gap(df, bias):
-    c1, c2, c3 = df.iloc[-3], df.iloc[-2], df.iloc[-1]
-
-    if bias == "BULLISH" and c3.low > c1.high:
-        return (c1.high, c3.low)
-
-    if bias == "BEARISH" and c3.high < c1.low:
-        return (c3.high, c1.low)
-
-    return None
+def fair_value_gap(symbol, timeframe, df, bias):
+    return features.signal(symbol, timeframe, df, 'fair_value_gap', bias)
 
 # ================== RISK ==================
 def lot_size(sl_pips):
-    acc = mt5.account_info()
-    risk_money = acc.balance * (RISK_PERCENT / 100)
-    tick = mt5.symbol_info(SYMBOL).trade_tick_value
-    return round(risk_money / (sl_pips * tick), 2)
+    return EXECUTOR.lot_size(sl_pips, RISK_PERCENT)
 
 # ================== EXECUTION ==================
-def place_trade(direction, entry, sl):
+def place_trade(direction, entry, sl, signal=None):
     risk = abs(entry - sl)
     tp = entry + risk * RR if direction == "BUY" else entry - risk * RR
     volume = lot_size(risk)
-
-    tick = mt5.symbol_info_tick(SYMBOL)
-
-    request = {
-        "action": mt5.TRADE_ACTION_DEAL,
-        "symbol": SYMBOL,
-        "volume": volume,
-        "type": mt5.ORDER_TYPE_BUY if direction == "BUY" else mt5.ORDER_TYPE_SELL,
-        "price": tick.ask if direction == "BUY" else tick.bid,
-        "sl": sl,
-        "tp": tp,
-        "magic": MAGIC,
-        "type_filling": mt5.ORDER_FILLING_IOC
-    }
-
-    mt5.order_send(request)
-
-# ================== BREAKEVEN ==================
-def manage_be():
-    positions = mt5.positions_get()
-    if positions is None:
+    if volume <= 0:
         return
 
-    tick = mt5.symbol_info_tick(SYMBOL)
-
-    for p in positions:
-        if p.magic != MAGIC or p.sl == 0:
-            continue
-
-        if p.type == mt5.ORDER_TYPE_BUY:
-            r = p.price_open - p.sl
-            if tick.bid >= p.price_open + r:
-                mt5.order_send({
-                    "action": mt5.TRADE_ACTION_SLTP,
-                    "position": p.ticket,
-                    "sl": p.price_open,
-                    "tp": p.tp
-                })
-
-        if p.type == mt5.ORDER_TYPE_SELL:
-            r = p.sl - p.price_open
-            if tick.ask <= p.price_open - r:
-                mt5.order_send({
-                    "action": mt5.TRADE_ACTION_SLTP,
-                    "position": p.ticket,
-                    "sl": p.price_open,
-                    "tp": p.tp
-                })
+    EXECUTOR.send(direction, volume, sl, tp, signal=signal)
 
-# ================== MAIN LOOP ==================
-print("TJR BOOTCAMP BOT RUNNING")
+# ================== BREAKEVEN ==================
+POSITIONS = PositionManager(MAGIC, SYMBOL, stages=BE_STAGES)
+POSITIONS.on_deal = LEDGER.on_deal  # Exits reach the risk limits before the next entry check
 
-while True:
+def manage_be():
+    POSITIONS.manage()
+
+# ================== STRATEGY ==================
+# Plugin interface shared with engine.py: TIMEFRAMES, start(), manage() and on_bar()
+TIMEFRAMES = [HTF, LTF]  # The shortest triggers on_bar()
+start = connect
+telemetry = Telemetry("tjr_v1", TELEMETRY_PATH)
+EXECUTOR.on_fill = lambda seconds, result: telemetry.observe("exec", "signal_to_fill", seconds)
+gate = telemetry.gate
+
+def manage():
+    # Every pass: breakeven, telemetry, and cached state while idle; True while in a trade
+    telemetry.poll()
     manage_be()
+    if POSITIONS.has_open():
+        return True
+    EXECUTOR.warm()
+    return False
 
-    positions = [p for p in mt5.positions_get() if p.magic == MAGIC]
-    if positions:
-        sleep.sleep(10)
-        continue
-
-    if not in_killzone():
-        sleep.sleep(10)
-        continue
+def on_bar(new):
+    telemetry.begin()
+    if not gate("killzone", in_killzone()):
+        return
+    if not gate("risk", LEDGER.can_trade(MAGIC)):
+        return
 
     htf = get_df(SYMBOL, HTF)
-    bias = market_structure(htf)
-    if not bias:
-        sleep.sleep(10)
-        continue
+    bias = market_structure(SYMBOL, HTF, htf)
+    if not gate("bias", bias):
+        return
 
-    ltf = get_df(SYMBOL, LTF)
-    if not liquidity_sweep(ltf, bias):
-        sleep.sleep(10)
-        continue
+    ltf = get_df(SYMBOL, LTF, closed=True)  # Bar that just closed
+    if not gate("sweep", liquidity_sweep(SYMBOL, LTF, ltf, bias)):
+        return
 
-    if not displacement(ltf):
-        sleep.sleep(10)
-        continue
+    if not gate("displacement", displacement(SYMBOL, LTF, ltf)):
+        return
 
-    fvg = fair_value_gap(ltf, bias)
-    if not fvg:
-        sleep.sleep(10)
-        continue
+    fvg = fair_value_gap(SYMBOL, LTF, ltf, bias)
+    if not gate("fvg", fvg):
+        return
 
     entry = sum(fvg) / 2
-    sl = ltf.low.iloc[-2] if bias == "BULLISH" else ltf.high.iloc[-2]
+    sl = float(ltf['low'][-2] if bias == "BULLISH" else ltf['high'][-2])
 
-    place_trade("BUY" if bias == "BULLISH" else "SELL", entry, sl)
+    place_trade("BUY" if bias == "BULLISH" else "SELL", entry, sl, telemetry.started)
+    telemetry.done("order")
 
-    sleep.sleep(30)
+# ================== MAIN LOOP ==================
+if __name__ == "__main__":
+    connect()
+    print("TJR BOOTCAMP BOT RUNNING")
+    scheduler = BarScheduler(SYMBOL, TIMEFRAMES, windows=KILLZONES)
+    telemetry.attach(mt5, scheduler)
+    if RECORD:
+        recorder.start()
+    if EXECUTION_LOG:
+        exec_analytics.start()
+
+    while True:
+        mt5.new_cycle()
+        if manage():
+            sleep.sleep(10)
+            continue
+        new = scheduler.wait(telemetry.interval)  # Next bar close inside a killzone, or time for manage()
+        if new:
+            on_bar(new)
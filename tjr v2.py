@@ -1,37 +1,67 @@
-import MetaTrader5 as mt5
-import pandas as pd
-import numpy as np
+from gateway import mt5
 from datetime import datetime, time, timezone
 
 import time as sleep
 import logging
 
+import bar_cache
+import correlation
+import exec_analytics
+import features
+import recorder
+import structure
+import zones
+from execution import Executor
+from positions import PositionManager
+from risk_ledger import RiskLedger
+from scheduler import BarScheduler, timeframe_seconds
+from telemetry import Telemetry
+
 # ================== SETTINGS ==================
 SYMBOL = "XAUUSDm"
-CORRELATED_SYMBOL = "XAUUSDm"  # For SMT divergence
+CORRELATED_SYMBOL = "XAGUSDm"  # SMT partner until the correlations below have MIN_BARS
+SMT_CANDIDATES = ["XAGUSDm", "EURUSDm", "DXYm"]  # Partner picked by rolling LTF return correlation
+SMT_PARTNER = "most"  # "most" (highest) or "least" (lowest, e.g. an inverse pair) correlated
+CORRELATION_WINDOW = 288  # LTF bars: a day of M5
+SMT_BARS = 21  # Partner bars displacement() needs
 HTF = mt5.TIMEFRAME_H4  # Macro bias (TJR: 4H for structure)
 ITF = mt5.TIMEFRAME_H1  # Intermediate for key levels (TJR: 1H sessions)
 LTF = mt5.TIMEFRAME_M5  # Execution
 RISK_PERCENT = 1.0
 MIN_RR = 2.0  # Minimum, but dynamic preferred
 MAGIC = 55101
+BE_STAGES = ((1.0, 0.0),)  # (R in profit, R locked): breakeven at 1R
 BARS = 500  # More data for accuracy
+KILLZONES = [(time(8, 0), time(11, 0)), (time(13, 30), time(16, 30))]  # UTC
+TELEMETRY_PATH = "tjr_v2_telemetry.jsonl"  # .prom for a Prometheus textfile
+MAX_DAILY_LOSS = 3.0  # % of the day's opening balance
+MAX_CONSECUTIVE_LOSSES = 3  # Losing exits in a row before standing down for the day
+COOLDOWN_MINUTES = 0
+LEDGER_PATH = "tjr_v2_risk.json"
+RECORD = True  # Keep every tick and closed bar seen, for replay (recorder.py)
+EXECUTION_LOG = True  # Log every order's quote, fill, latency and retcode (exec_analytics.py)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 
 # ================== MT5 INIT ==================
-if not mt5.initialize():
-    raise RuntimeError("MT5 failed to initialize")
+EXECUTOR = Executor(SYMBOL, MAGIC, filling=mt5.ORDER_FILLING_IOC)
+LEDGER = RiskLedger(SYMBOL, LEDGER_PATH, MAX_DAILY_LOSS, MAX_CONSECUTIVE_LOSSES, COOLDOWN_MINUTES * 60)
+
+
+
+def connect():
+    # Broker work happens here, not at import, so loading the plugin stays offline
+    if not mt5.initialize():
+        raise RuntimeError("MT5 failed to initialize")
+    EXECUTOR.warm()
 
 
 # ================== UTILS ==================
-def get_df(symbol, timeframe, bars=BARS):
+def get_df(symbol, timeframe, bars=BARS, closed=False):
     try:
-        rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, bars)
-        if rates is None or len(rates) < bars:
+        df = bar_cache.rates(symbol, timeframe, bars, closed)  # Structured array view, no DataFrame
+        if df is None or len(df) < bars:
             raise ValueError(f"Insufficient data for {symbol} on {timeframe}")
-        df = pd.DataFrame(rates)
-        df['time'] = pd.to_datetime(df['time'], unit='s')
         return df
     except Exception as e:
         logging.error(f"Data fetch error: {e}")
@@ -40,124 +70,108 @@ def get_df(symbol, timeframe, bars=BARS):
 
 def in_killzone():
     now = datetime.now(timezone.utc).time()
-    return (
-        time(8, 0) <= now <= time(11, 0) or
-        time(13, 30) <= now <= time(16, 30)
-    )
+    return any(start <= now <= end for start, end in KILLZONES)
 
 
 # ================== KEY LEVELS (1H Sessions) ==================
-def get_key_levels(df_itf):
+def get_key_levels(symbol, timeframe, df):
     # Previous session highs/lows as liquidity pools
-    df_itf['session'] = df_itf['time'].dt.floor('D')  # Group by day
-    sessions = df_itf.groupby('session').agg({'high': 'max', 'low': 'min'})
-    prev_high = sessions['high'].iloc[-2] if len(sessions) > 1 else df_itf['high'].max()
-    prev_low = sessions['low'].iloc[-2] if len(sessions) > 1 else df_itf['low'].min()
-    return prev_high, prev_low
+    return features.signal(symbol, timeframe, df, 'key_levels')
 
 
 # ================== STRUCTURE (BOS/CHOCH on 4H) ==================
-def market_structure(df):
-    # Pivot-based: Find recent swing highs/lows
-    pivots_high = (df['high'].shift(1) < df['high']) & (df['high'].shift(-1) < df['high'])
-    pivots_low = (df['low'].shift(1) > df['low']) & (df['low'].shift(-1) > df['low'])
-    recent_highs = df['high'][pivots_high].tail(2)
-    recent_lows = df['low'][pivots_low].tail(2)
-
-    if len(recent_highs) >= 2 and len(recent_lows) >= 2:
-        if recent_highs.iloc[-1] > recent_highs.iloc[-2] and recent_lows.iloc[-1] > recent_lows.iloc[-2]:
-            return "BULLISH_BOS"
-        if recent_lows.iloc[-1] < recent_lows.iloc[-2] and recent_highs.iloc[-1] < recent_highs.iloc[-2]:
-            return "BEARISH_BOS"
-        if recent_highs.iloc[-1] < recent_highs.iloc[-2] and recent_lows.iloc[-1] > recent_lows.iloc[-2]:
-            return "BEARISH_CHOCH"
-        if recent_lows.iloc[-1] > recent_lows.iloc[-2] and recent_highs.iloc[-1] > recent_highs.iloc[-2]:
-            return "BULLISH_CHOCH"
-    return None
+def market_structure(symbol, timeframe):
+    # Last two swing highs/lows, confirmed incrementally as HTF bars close
+    # (see structure.py) from the cache get_df() just refreshed
+    return structure.update(symbol, timeframe, BARS).bias
 
 
 # ================== SMT DIVERGENCE ==================
-def smt_divergence(ltf_main, ltf_corr, bias):
-    main_disp = displacement(ltf_main)
-    corr_disp = displacement(ltf_corr)
+correlations_due = 0  # Server time of the next LTF close to feed the correlations
+
+
+def track_correlations():
+    # From manage(), every pass: once per LTF close, whatever the gates said,
+    # so the rolling correlations advance bar by bar instead of catching up
+    # over a gap the next time an SMT partner is needed
+    global correlations_due
+    now = LEDGER.server_time()
+    if now < correlations_due:
+        return
+    period = timeframe_seconds(LTF)
+    correlations_due = (now // period + 1) * period + 1  # Just after the next close
+    correlation.update([SYMBOL] + SMT_CANDIDATES, LTF, CORRELATION_WINDOW)
+
+
+def smt_partner():
+    # Rolling correlations catch up on the LTF bars closed since the last
+    # call (O(k^2) each, see correlation.py)
+    tracker = correlation.update([SYMBOL] + SMT_CANDIDATES, LTF, CORRELATION_WINDOW)
+    return tracker.partner(SYMBOL, SMT_PARTNER) or CORRELATED_SYMBOL
+
+
+def smt_divergence(partner, ltf_main, ltf_corr, bias):
+    # Shared with the displacement gate through the feature store
+    main_disp = displacement(SYMBOL, LTF, ltf_main)
+    corr_disp = displacement(partner, LTF, ltf_corr)
     # Divergence: Main displaces in bias direction, corr doesn't
+    candle = features.signal(SYMBOL, LTF, ltf_main, 'bias')
     if bias.startswith("BULLISH"):
-        return main_disp and ltf_main['close'].iloc[-1] > ltf_main['open'].iloc[-1] and not corr_disp
+        return main_disp and candle == "BUY" and not corr_disp
     if bias.startswith("BEARISH"):
-        return main_disp and ltf_main['close'].iloc[-1] < ltf_main['open'].iloc[-1] and not corr_disp
+        return main_disp and candle == "SELL" and not corr_disp
     return False
 
 
 # ================== LIQUIDITY SWEEP ==================
-def liquidity_sweep(df, bias, key_high, key_low):
-    curr = df.iloc[-1]
-    if bias.startswith("BULLISH") and curr['low'] < key_low:
-        return True  # Swept low liquidity
-    if bias.startswith("BEARISH") and curr['high'] > key_high:
-        return True  # Swept high liquidity
-    return False
+def liquidity_sweep(symbol, timeframe, df, bias, key_high, key_low):
+    # Swept low (longs) or high liquidity
+    return features.signal(symbol, timeframe, df, 'liquidity_sweep', bias, key_high, key_low)
 
 
 # ================== DISPLACEMENT ==================
-def displacement(df):
-    bodies = abs(df['close'] - df['open'])
-    avg_body = bodies.rolling(20).mean().iloc[-1]
-    return bodies.iloc[-1] > avg_body * 1.5
+def displacement(symbol, timeframe, df):
+    return features.signal(symbol, timeframe, df, 'displacement', 20, 1.5)
 
 
 # ================== FVG ==================
-def fair_value_gap(df, bias):
-    c1, c2, c3 = df.iloc[-3], df.iloc[-2], df.iloc[-1]
-    if bias.startswith("BULLISH") and c3['low'] > c1['high']:
-        return (c1['high'], c3['low'])
-    if bias.startswith("BEARISH") and c3['high'] < c1['low']:
-        return (c3['high'], c1['low'])
-    return None
+def fair_value_gap(symbol, timeframe, df, bias):
+    return features.signal(symbol, timeframe, df, 'fair_value_gap', bias)
 
 
 # ================== ORDER BLOCK ==================
-def order_block(df, bias):
-    # Last strong reversal candle as OB
-    bodies = abs(df['close'] - df['open'])
-    strong = bodies > bodies.rolling(10).mean() * 1.5
-    if bias.startswith("BULLISH"):
-        bull_ob = df[(strong) & (df['close'] > df['open'])].tail(1)
-        if not bull_ob.empty:
-            return (bull_ob['low'].iloc[0], bull_ob['high'].iloc[0])  # Discount OB
-    if bias.startswith("BEARISH"):
-        bear_ob = df[(strong) & (df['close'] < df['open'])].tail(1)
-        if not bear_ob.empty:
-            return (bear_ob['low'].iloc[0], bear_ob['high'].iloc[0])  # Premium OB
-    return None
+def order_block(symbol, timeframe, bias):
+    # Newest strong reversal candle price hasn't fully traded back through
+    # (zones are kept across cycles, see zones.py)
+    direction = zones.BULL if bias.startswith("BULLISH") else zones.BEAR
+    ob = zones.update(symbol, timeframe, BARS).newest("OB", direction)
+    return (ob.low, ob.high) if ob else None
 
 
 # ================== RETRACE CHECK ==================
-def in_retrace(df, zone, bias):
-    curr_price = df['close'].iloc[-1]
-    low_zone, high_zone = min(zone), max(zone)
-    if bias.startswith("BULLISH"):
-        return low_zone <= curr_price <= high_zone  # Retraced into discount
-    if bias.startswith("BEARISH"):
-        return low_zone <= curr_price <= high_zone  # Retraced into premium
-    return False
+def in_retrace(symbol, timeframe, price, bias):
+    # Newest active OB, else FVG, in the bias direction that `price` sits in:
+    # discount zones for longs, premium for shorts
+    direction = zones.BULL if bias.startswith("BULLISH") else zones.BEAR
+    hits = zones.update(symbol, timeframe, BARS).containing(price, direction)
+    for kind in ("OB", "FVG"):
+        for zone in hits:
+            if zone.kind == kind:
+                return (zone.low, zone.high)
+    return None
 
 
 # ================== RISK ==================
 def lot_size(sl_pips):
     try:
-        acc = mt5.account_info()
-        if acc is None:
-            raise ValueError("Account info unavailable")
-        risk_money = acc.balance * (RISK_PERCENT / 100)
-        tick = mt5.symbol_info(SYMBOL).trade_tick_value
-        return round(risk_money / (sl_pips * tick), 2)
+        return EXECUTOR.lot_size(sl_pips, RISK_PERCENT)  # Cached balance and tick value
     except Exception as e:
         logging.error(f"Lot size error: {e}")
         return 0.0
 
 
 # ================== EXECUTION ==================
-def place_trade(direction, entry, sl, tp):
+def place_trade(direction, entry, sl, tp, signal=None):
     try:
         risk = abs(entry - sl)
         if risk == 0 or tp is None:
@@ -165,130 +179,125 @@ def place_trade(direction, entry, sl, tp):
         volume = lot_size(risk)
         if volume <= 0:
             return
-        tick = mt5.symbol_info_tick(SYMBOL)
-        if tick is None:
-            raise ValueError("Tick info unavailable")
-        request = {
-            "action": mt5.TRADE_ACTION_DEAL,
-            "symbol": SYMBOL,
-            "volume": volume,
-            "type": mt5.ORDER_TYPE_BUY if direction == "BUY" else mt5.ORDER_TYPE_SELL,
-            "price": tick.ask if direction == "BUY" else tick.bid,
-            "sl": sl,
-            "tp": tp,
-            "magic": MAGIC,
-            "type_filling": mt5.ORDER_FILLING_IOC
-        }
-        result = mt5.order_send(request)
-        if result.retcode != mt5.TRADE_RETCODE_DONE:
-            logging.error(f"Order failed: {result.comment}")
+        EXECUTOR.send(direction, volume, sl, tp, signal=signal)  # Logs its own rejects
     except Exception as e:
         logging.error(f"Trade placement error: {e}")
 
 
 # ================== BREAKEVEN ==================
+POSITIONS = PositionManager(MAGIC, SYMBOL, stages=BE_STAGES)
+POSITIONS.on_deal = LEDGER.on_deal  # Exits reach the risk limits before the next entry check
+
+
 def manage_be():
     try:
-        positions = mt5.positions_get(symbol=SYMBOL)
-        if positions is None:
-            return
-        tick = mt5.symbol_info_tick(SYMBOL)
-        for p in positions:
-            if p.magic != MAGIC or p.sl == 0:
-                continue
-            if p.type == mt5.POSITION_TYPE_BUY:
-                r = p.price_open - p.sl
-                if tick.bid >= p.price_open + r:
-                    mt5.position_modify(p.ticket, sl=p.price_open, tp=p.tp)
-            if p.type == mt5.POSITION_TYPE_SELL:
-                r = p.sl - p.price_open
-                if tick.ask <= p.price_open - r:
-                    mt5.position_modify(p.ticket, sl=p.price_open, tp=p.tp)
+        POSITIONS.manage()
     except Exception as e:
         logging.error(f"BE management error: {e}")
 
 
-# ================== MAIN LOOP ==================
-logging.info("100% TJR BOOTCAMP BOT RUNNING")
+# ================== STRATEGY ==================
+# Plugin interface shared with engine.py: TIMEFRAMES, start(), manage() and on_bar()
+TIMEFRAMES = [HTF, ITF, LTF]  # Bars this strategy waits on; the shortest triggers on_bar()
+start = connect
+telemetry = Telemetry("tjr_v2", TELEMETRY_PATH)
+EXECUTOR.on_fill = lambda seconds, result: telemetry.observe("exec", "signal_to_fill", seconds)
+gate = telemetry.gate
 
-while True:
+
+def manage():
+    # Every pass, bar or not: trail stops and refresh cached state while
+    # idle. True while a position is open (no new entries).
+    telemetry.poll()
+    track_correlations()
     manage_be()
+    if POSITIONS.has_open():
+        return True
+    EXECUTOR.warm()
+    return False
 
-    positions = mt5.positions_get(symbol=SYMBOL)
-    if positions and any(p.magic == MAGIC for p in positions):
-        sleep.sleep(60)  # Wait longer if open
-        continue
 
-    if not in_killzone():
-        sleep.sleep(60)
-        continue
+def on_bar(new):
+    # One decision pass on the bar that just closed
+    telemetry.begin()
+    logging.debug(f"Gates {telemetry.report()}, feature cache {features.FEATURES.report()}")
+    if not gate("killzone", in_killzone()):
+        return
+    if not gate("risk", LEDGER.can_trade(MAGIC)):
+        return
 
     htf = get_df(SYMBOL, HTF)
-    if htf is None:
-        sleep.sleep(60)
-        continue
-    bias = market_structure(htf)
-    if not bias:
-        sleep.sleep(60)
-        continue
+    if not gate("htf_data", htf is not None):
+        return
+    bias = market_structure(SYMBOL, HTF)
+    if not gate("bias", bias):
+        return
 
     itf = get_df(SYMBOL, ITF)
-    if itf is None:
-        sleep.sleep(60)
-        continue
-    key_high, key_low = get_key_levels(itf)
-    curr_price = itf['close'].iloc[-1]
+    if not gate("itf_data", itf is not None):
+        return
+    key_high, key_low = get_key_levels(SYMBOL, ITF, itf)
+    curr_price = itf['close'][-1]
     range_size = key_high - key_low
     near_key_level = abs(curr_price - key_high) < range_size * 0.03 or abs(curr_price - key_low) < range_size * 0.03
-    if not near_key_level:
-        sleep.sleep(60)
-        continue
-
-    ltf_main = get_df(SYMBOL, LTF)
-    ltf_corr = get_df(CORRELATED_SYMBOL, LTF)
-    if ltf_main is None or ltf_corr is None:
-        sleep.sleep(60)
-        continue
-
-    if not smt_divergence(ltf_main, ltf_corr, bias):
-        sleep.sleep(60)
-        continue
-
-    if not liquidity_sweep(ltf_main, bias, key_high, key_low):
-        sleep.sleep(60)
-        continue
-
-    if not displacement(ltf_main):
-        sleep.sleep(60)
-        continue
-
-    fvg = fair_value_gap(ltf_main, bias)
-    ob = order_block(ltf_main, bias)
-    if not fvg or not ob:
-        sleep.sleep(60)
-        continue
-
-    # Use OB as primary zone if available, else FVG
-    entry_zone = ob if ob else fvg
-    if not in_retrace(ltf_main, entry_zone, bias):
-        sleep.sleep(60)
-        continue
+    if not gate("near_key_level", near_key_level):
+        return
+
+    # Scheduler wakes on the LTF close: judge the bar that just closed
+    ltf_main = get_df(SYMBOL, LTF, closed=True)
+    partner = smt_partner()
+    ltf_corr = get_df(partner, LTF, SMT_BARS, closed=True)
+    if not gate("ltf_data", ltf_main is not None and ltf_corr is not None):
+        return
+
+    if not gate("smt", smt_divergence(partner, ltf_main, ltf_corr, bias)):
+        return
+
+    if not gate("sweep", liquidity_sweep(SYMBOL, LTF, ltf_main, bias, key_high, key_low)):
+        return
+
+    if not gate("displacement", displacement(SYMBOL, LTF, ltf_main)):  # Hit: smt_divergence() computed it
+        return
+
+    fvg = fair_value_gap(SYMBOL, LTF, ltf_main, bias)
+    ob = order_block(SYMBOL, LTF, bias)
+    if not gate("fvg_ob", fvg and ob):
+        return
+
+    # Any still-active OB (else FVG) the close has retraced into
+    entry_zone = in_retrace(SYMBOL, LTF, ltf_main['close'][-1], bias)
+    if not gate("retrace", entry_zone):
+        return
 
     entry = (min(entry_zone) + max(entry_zone)) / 2
     sl = min(entry_zone) if bias.startswith("BULLISH") else max(entry_zone)  # Invalidation at OB/FVG edge
     risk = abs(entry - sl)
     tp = key_high if bias.startswith("BULLISH") else key_low  # Next liquidity
     tp_dist = abs(entry - tp)
-    if tp_dist / risk < MIN_RR:
+    if not gate("rr", tp_dist / risk >= MIN_RR):
         logging.info("Skipped: RR too low")
-        sleep.sleep(60)
-        continue
-
-    place_trade("BUY" if bias.startswith("BULLISH") else "SELL", entry, sl, tp)
-
-    sleep.sleep(300)  # Wait for next potential bar
-
-
+        return
 
+    place_trade("BUY" if bias.startswith("BULLISH") else "SELL", entry, sl, tp, telemetry.started)
+    telemetry.done("order")
 
 
+# ================== MAIN LOOP ==================
+if __name__ == "__main__":
+    connect()
+    logging.info("100% TJR BOOTCAMP BOT RUNNING")
+    scheduler = BarScheduler(SYMBOL, TIMEFRAMES, windows=KILLZONES)
+    telemetry.attach(mt5, scheduler)
+    if RECORD:
+        recorder.start()
+    if EXECUTION_LOG:
+        exec_analytics.start()
+
+    while True:
+        mt5.new_cycle()
+        if manage():
+            sleep.sleep(60)  # Wait longer if open
+            continue
+        new = scheduler.wait(telemetry.interval)  # Next bar close inside a killzone, or time for manage()
+        if new:
+            on_bar(new)
@@ -0,0 +1,219 @@
+import math
+import heapq
+import numpy as np
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+
+import bar_cache
+from indicators import RollingMean
+from scheduler import timeframe_seconds
+
+# ================== SETTINGS ==================
+OB_WINDOW = 10  # Body mean window for a "strong" candle, as order_block() in tjr v2.py
+OB_MULT = 1.5
+BULL, BEAR = 1, -1
+
+
+# ================== ZONES ==================
+class Zone:
+    __slots__ = ('id', 'kind', 'direction', 'low', 'high', 'time', 'timeframe', 'expires', 'filled')
+
+    def __init__(self, id, kind, direction, low, high, time, timeframe, expires):
+        self.id, self.kind, self.direction = id, kind, direction
+        self.low, self.high = low, high
+        self.time = time  # Close of the bar that completed it
+        self.timeframe = timeframe
+        self.expires = expires
+        self.filled = 0.0  # Share of the zone price has traded back into
+
+    def contains(self, price):
+        return self.low <= price <= self.high
+
+
+class WidthBucket:
+    # Zones of one width class, indexed by low. Removed ids stay in `lows`
+    # until they outnumber the live ones, then the list is rebuilt, so a
+    # removal is amortized O(1) instead of a list delete.
+    __slots__ = ('bound', 'lows', 'live')
+
+    def __init__(self, bound):
+        self.bound = bound  # No zone here is wider
+        self.lows = []  # Sorted (low, id)
+        self.live = 0
+
+
+def width_class(width):
+    # Power-of-two class: every zone in class k is narrower than 2**k
+    return math.frexp(width)[1] if width > 0 else None
+
+
+class ZoneRegistry:
+    # Active (not fully mitigated, not expired) zones of one symbol across
+    # timeframes, bucketed by width class. A zone of class k holding a price
+    # has its low within [price - 2**k, price], so a lookup is two bisects
+    # per non-empty class plus that slice, and one wide zone only widens
+    # the scan of its own class. A class is dropped with its last zone.
+    def __init__(self):
+        self.zones = {}  # id -> Zone, oldest first
+        self.buckets = {}  # width class -> WidthBucket
+        self.expiry = []  # Heap of (expires, id); ids already removed are skipped
+        self.next_id = 0
+
+    def add(self, kind, direction, low, high, time, timeframe, expires):
+        zone = Zone(self.next_id, kind, direction, low, high, time, timeframe, expires)
+        self.next_id += 1
+        self.zones[zone.id] = zone
+        k = width_class(high - low)
+        bucket = self.buckets.get(k)
+        if bucket is None:
+            bucket = self.buckets[k] = WidthBucket(math.ldexp(1.0, k) if k is not None else 0.0)
+        insort(bucket.lows, (low, zone.id))
+        bucket.live += 1
+        heapq.heappush(self.expiry, (expires, zone.id))
+        return zone
+
+    def remove(self, zone):
+        zones = self.zones
+        del zones[zone.id]
+        k = width_class(zone.high - zone.low)
+        bucket = self.buckets[k]
+        bucket.live -= 1
+        if not bucket.live:
+            del self.buckets[k]
+        elif len(bucket.lows) > 2 * bucket.live:
+            bucket.lows = [entry for entry in bucket.lows if entry[1] in zones]
+
+    def overlapping(self, low, high):
+        # Zones intersecting [low, high]
+        zones, hits = self.zones, []
+        for bucket in self.buckets.values():
+            lows = bucket.lows
+            start = bisect_left(lows, (low - bucket.bound,))
+            end = bisect_right(lows, (high, float('inf')))
+            for _, i in lows[start:end]:
+                zone = zones.get(i)
+                if zone is not None and zone.high >= low:
+                    hits.append(zone)
+        return hits
+
+    # ----- Lifecycle -----
+    def mitigate(self, time, high, low, timeframe=None):
+        # Apply a bar opened at `time` to the zones that existed by then (of
+        # `timeframe` only, when given). Bullish zones fill from the top down,
+        # bearish from the bottom up; full = gone.
+        for zone in self.overlapping(low, high):
+            if zone.time > time or (timeframe is not None and zone.timeframe != timeframe):
+                continue
+            width = zone.high - zone.low
+            if zone.direction == BULL:
+                filled = 1.0 if low <= zone.low or not width else (zone.high - low) / width
+            else:
+                filled = 1.0 if high >= zone.high or not width else (high - zone.low) / width
+            if filled >= 1.0:
+                self.remove(zone)
+            elif filled > zone.filled:
+                zone.filled = filled
+
+    def expire(self, now):
+        expiry, zones = self.expiry, self.zones
+        while expiry and expiry[0][0] <= now:
+            _, zone_id = heapq.heappop(expiry)
+            if zone_id in zones:
+                self.remove(zones[zone_id])
+
+    # ----- Queries -----
+    def containing(self, price, direction=None, kind=None, timeframe=None):
+        # Active zones holding `price`, newest first
+        hits = [z for z in self.overlapping(price, price)
+                if (direction is None or z.direction == direction)
+                and (kind is None or z.kind == kind)
+                and (timeframe is None or z.timeframe == timeframe)]
+        return sorted(hits, key=lambda z: z.id, reverse=True)
+
+    def newest(self, kind=None, direction=None, timeframe=None):
+        for zone_id in reversed(self.zones):
+            zone = self.zones[zone_id]
+            if ((kind is None or zone.kind == kind) and (direction is None or zone.direction == direction)
+                    and (timeframe is None or zone.timeframe == timeframe)):
+                return zone
+        return None
+
+    def __len__(self):
+        return len(self.zones)
+
+
+# ================== DETECTION ==================
+class ZoneDetector:
+    # Finds FVGs and order blocks on one timeframe as its bars close and
+    # mitigates the registry's zones of that timeframe with each bar
+    def __init__(self, registry, timeframe, max_age, ob_window=OB_WINDOW, ob_mult=OB_MULT):
+        self.registry = registry
+        self.timeframe = timeframe
+        self.period = timeframe_seconds(timeframe)
+        self.max_age = max_age
+        self.ob_mult = ob_mult
+        self.bars = deque(maxlen=3)  # (high, low) of the last three bars
+        self.body_mean = RollingMean(ob_window)
+        self.last_time = -1
+
+    def feed(self, rates):
+        # Closed copy_rates_* rows; bars at or before last_time are skipped
+        times = np.asarray(rates['time'], dtype=np.int64)
+        start = int(np.searchsorted(times, self.last_time, side='right'))
+        rows = zip(times[start:].tolist(), *(np.asarray(rates[k], dtype=np.float64)[start:].tolist()
+                                             for k in ('open', 'high', 'low', 'close')))
+        for row in rows:
+            self.update(*row)
+        return len(times) - start
+
+    def update(self, time, open, high, low, close):
+        registry = self.registry
+        registry.mitigate(time, high, low, self.timeframe)
+        closed = time + self.period
+        expires = closed + self.max_age
+
+        bars = self.bars
+        bars.append((high, low))
+        if len(bars) == 3:
+            c1_high, c1_low = bars[0]
+            if low > c1_high:
+                registry.add("FVG", BULL, c1_high, low, closed, self.timeframe, expires)
+            elif high < c1_low:
+                registry.add("FVG", BEAR, high, c1_low, closed, self.timeframe, expires)
+
+        body = abs(close - open)
+        if body > self.body_mean.update(body) * self.ob_mult:  # NaN until the window fills
+            if close > open:
+                registry.add("OB", BULL, low, high, closed, self.timeframe, expires)
+            elif close < open:
+                registry.add("OB", BEAR, low, high, closed, self.timeframe, expires)
+
+        registry.expire(closed)
+        self.last_time = time
+
+
+# ================== REGISTRY ==================
+_registries = {}
+_detectors = {}
+
+
+def get_registry(symbol):
+    registry = _registries.get(symbol)
+    if registry is None:
+        registry = _registries[symbol] = ZoneRegistry()
+    return registry
+
+
+def update(symbol, timeframe, bars):
+    # Feed the (symbol, timeframe) detector the bars closed since its last
+    # update, from the cache bar_cache.rates(symbol, timeframe, bars)
+    # refreshed. Zones live for `bars` bars, the window the old scan saw.
+    registry = get_registry(symbol)
+    detector = _detectors.get((symbol, timeframe))
+    if detector is None:
+        detector = _detectors[(symbol, timeframe)] = ZoneDetector(
+            registry, timeframe, bars * timeframe_seconds(timeframe))
+    cache = bar_cache.get_cache(symbol, timeframe, bars + 1)
+    if cache.count:
+        detector.feed(cache.since(detector.last_time, closed=True))
+    return registry